@@ -0,0 +1,71 @@
+from typing import Callable, NamedTuple, Tuple, Union
+from PIL import Image, ImageFont
+
+from .FontRegistry import FontEntry
+from .LRUCache import LRUCache
+
+
+class CaptionLayer(NamedTuple):
+    """ A caption rendered once onto a transparent layer. """
+    # The RGBA layer, cropped to the caption's ink.
+    image: Image.Image
+    # The offset of the layer from the caption's text anchor.
+    offset: Tuple[int, int]
+
+
+class CaptionCache(LRUCache):
+    """ A bounded, in-memory LRU cache of rendered caption layers.
+
+    Entries are keyed by (text, font path, font size, line length),
+    everything that affects how a caption is wrapped and rasterized.
+    A layer does not depend on the image it is drawn on, so the same
+    caption on many images is shaped and rasterized only once, then
+    alpha-composited onto each image. The cache enforces a budget on
+    the total number of bytes of layer pixel data it holds, evicting
+    the least recently used entries first.
+
+    Cached layers must not be modified; they are only composited.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024) -> None:
+        """ Construct a new CaptionCache with the given byte budget.
+
+        :param max_bytes: the maximum total size in bytes of the
+                          layers held in the cache
+        """
+        super().__init__(max_bytes)
+
+    def get(self,
+            text: str,
+            font: Union[ImageFont.FreeTypeFont, FontEntry],
+            line_length: int,
+            renderer: Callable[[str, int], CaptionLayer]
+            ) -> CaptionLayer:
+        """ Return the layer of a caption, rendering it with the
+        supplied renderer on a cache miss.
+
+        :param text: the caption text, before wrapping
+        :param font: the font of the caption
+        :param line_length: the number of pixels of space for a line
+        :param renderer: a callable taking (text, line_length) and
+                         returning the caption layer
+        :return: the caption layer, which must not be modified
+        """
+        key = (text, str(font.path), font.size, line_length)
+
+        with self._lock:
+            layer = self._lookup(key)
+        if layer is not None:
+            return layer
+
+        layer = renderer(text, line_length)
+
+        with self._lock:
+            self._insert(key, layer)
+
+        return layer
+
+    @staticmethod
+    def _size_of(layer: CaptionLayer) -> int:
+        """ Return the size in bytes of the layer's pixel data. """
+        return layer.image.width * layer.image.height * 4
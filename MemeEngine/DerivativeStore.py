@@ -0,0 +1,213 @@
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+from PIL import Image
+import hashlib
+import mmap
+import os
+import pathlib
+import struct
+import threading
+
+# Derivative file header: magic, mode, width, height, and the source
+# file's modification time and size when the derivative was made.
+HEADER = struct.Struct('<4s8sIIqq')
+MAGIC = b'MEMD'
+# Modes that Pillow can map directly onto a buffer without a copy.
+# RGB images are stored as RGBX, which has the same pixel layout as
+# Pillow's RGB images in memory. Other modes are stored as RGBA.
+SHARED_MODES = ('L', 'RGBX', 'RGBA', 'CMYK')
+
+
+class DerivativeStore():
+    """ A persistent store of pre-resized images, shared between
+    processes.
+
+    For each source image and configured width, the store keeps a
+    derivative file holding the resized image's raw pixels. Images are
+    memory-mapped from these files, so every worker process shares
+    the same page cache copy of the pixels instead of decoding and
+    holding its own. A derivative records the modification time and
+    size of its source, and is rebuilt when the source changes.
+
+    Only images in the source directory have derivatives. Files are
+    written to a temporary name and renamed into place, so processes
+    never see a partly written derivative.
+    """
+
+    def __init__(self,
+                 directory: Union[str, pathlib.Path],
+                 source_dir: Union[str, pathlib.Path],
+                 widths: Iterable[int] = (500,)) -> None:
+        """ Construct a new DerivativeStore.
+
+        :param directory: the directory to keep derivatives in
+        :param source_dir: the directory of the source images
+        :param widths: the widths to make derivatives for, defaults
+                       to 500
+        """
+        self.directory = pathlib.Path(directory)
+        self.source_dir = pathlib.Path(source_dir).resolve()
+        self.widths = tuple(widths)
+        self.hits = 0
+        self.builds = 0
+        self._maps: Dict[pathlib.Path, Tuple[Tuple[int, int],
+                                             Image.Image]] = {}
+        self._lock = threading.Lock()
+
+    def covers(self, path: Union[str, pathlib.Path], width: int) -> bool:
+        """ Return whether the store keeps a derivative of an image at
+        the given width.
+
+        :param path: the path to the source image
+        :param width: the resize width
+        :return: whether the store has the derivative
+        """
+        if width not in self.widths:
+            return False
+        return pathlib.Path(path).resolve().parent == self.source_dir
+
+    def get(self,
+            path: Union[str, pathlib.Path],
+            width: int,
+            loader: Callable[[pathlib.Path, int], Image.Image],
+            variant: str = '') -> Optional[Image.Image]:
+        """ Return a copy of the derivative of an image, building or
+        rebuilding it with the loader if it is missing or stale.
+
+        :param path: the path to the source image
+        :param width: the resize width
+        :param loader: a callable taking (path, width) and returning
+                       the resized image
+        :param variant: a name for the loader's settings, so that
+                        differently made derivatives are kept apart
+        :return: a copy of the resized image, safe to draw on, or None
+                 if the store does not cover the image
+        """
+        if not self.covers(path, width):
+            return None
+        path = pathlib.Path(path)
+        st = os.stat(path)
+        source = (st.st_mtime_ns, st.st_size)
+        derivative = self.derivative_path(path, width, variant)
+
+        with self._lock:
+            mapped = self._maps.get(derivative)
+        if mapped is None or mapped[0] != source:
+            mapped = self._map(derivative)
+            if mapped is None or mapped[0] != source:
+                self.build(path, width, loader, variant)
+                mapped = self._map(derivative)
+            with self._lock:
+                self._maps[derivative] = mapped
+        else:
+            with self._lock:
+                self.hits += 1
+
+        im = mapped[1]
+        return im.convert('RGB') if im.mode == 'RGBX' else im.copy()
+
+    def build(self,
+              path: Union[str, pathlib.Path],
+              width: int,
+              loader: Callable[[pathlib.Path, int], Image.Image],
+              variant: str = '') -> pathlib.Path:
+        """ Resize an image with the loader and write its derivative.
+
+        :param path: the path to the source image
+        :param width: the resize width
+        :param loader: a callable taking (path, width) and returning
+                       the resized image
+        :param variant: a name for the loader's settings
+        :return: the path of the derivative file
+        """
+        path = pathlib.Path(path)
+        st = os.stat(path)
+        im = loader(path, width)
+        if im.mode == 'RGB':
+            im = im.convert('RGBX')
+        elif im.mode not in SHARED_MODES:
+            im = im.convert('RGBA')
+        header = HEADER.pack(MAGIC, im.mode.encode('ascii'),
+                             im.width, im.height,
+                             st.st_mtime_ns, st.st_size)
+
+        derivative = self.derivative_path(path, width, variant)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = derivative.with_name(
+            f'.{derivative.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                f.write(im.tobytes())
+            os.replace(tmp_path, derivative)
+        finally:
+            if tmp_path.exists():
+                os.remove(tmp_path)
+        with self._lock:
+            self.builds += 1
+        return derivative
+
+    def build_all(self,
+                  paths: Iterable[Union[str, pathlib.Path]],
+                  loader: Callable[[pathlib.Path, int], Image.Image],
+                  variant: str = '') -> int:
+        """ Make sure every image has an up to date derivative at each
+        width, building only those that are missing or stale.
+
+        :param paths: the paths to the source images
+        :param loader: a callable taking (path, width) and returning
+                       the resized image
+        :param variant: a name for the loader's settings
+        :return: the number of derivatives built
+        """
+        builds = self.builds
+        for path in paths:
+            for width in self.widths:
+                if not self.covers(path, width):
+                    continue
+                try:
+                    self.get(path, width, loader, variant)
+                except Exception as e:
+                    print(f'Derivative Error:  {path}: {e}')
+        return self.builds - builds
+
+    def derivative_path(self,
+                        path: Union[str, pathlib.Path],
+                        width: int,
+                        variant: str = '') -> pathlib.Path:
+        """ Return the path of the derivative file for an image.
+
+        :param path: the path to the source image
+        :param width: the resize width
+        :param variant: a name for the loader's settings
+        :return: the derivative file path
+        """
+        name = pathlib.Path(path).resolve().name
+        key = hashlib.sha256(f'{name}\0{variant}'.encode('utf-8'))
+        return self.directory.joinpath(
+            f'{key.hexdigest()[:16]}-{width}.raw')
+
+    @staticmethod
+    def _map(derivative: pathlib.Path
+             ) -> Optional[Tuple[Tuple[int, int], Image.Image]]:
+        """ Memory-map a derivative file, returning the source mtime and
+        size it was made from and the image, or None if it is missing
+        or unreadable.
+        """
+        try:
+            with open(derivative, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(mapped) < HEADER.size:
+            return None
+        magic, mode, width, height, mtime, size = HEADER.unpack_from(mapped)
+        mode = mode.rstrip(b'\0').decode('ascii')
+        if magic != MAGIC:
+            return None
+        pixels = memoryview(mapped)[HEADER.size:]
+        try:
+            im = Image.frombuffer(mode, (width, height), pixels,
+                                  'raw', mode, 0, 1)
+        except ValueError:
+            return None
+        return (mtime, size), im
@@ -0,0 +1,120 @@
+from typing import Dict, Tuple, Union
+from PIL import ImageFont
+import pathlib
+import string
+import threading
+
+from constants import FONTS_DIR
+
+
+class FontEntry():
+    """ A loaded TrueType font at a fixed size, with a table of
+    per-character advance widths.
+
+    Text made up of characters in the table is measured by summing
+    advance widths plus the kerning adjustment of each adjacent pair,
+    instead of laying the text out again with FreeType. Kerning pairs
+    are measured once, the first time they are seen. Fonts using a
+    complex layout engine (raqm), or text containing characters
+    outside the table, fall back to FreeType measurement.
+    """
+
+    # Characters whose advance widths are precomputed.
+    table_chars = string.ascii_letters + string.digits \
+        + string.punctuation + ' '
+
+    def __init__(self, path: pathlib.Path, size: int) -> None:
+        """ Load the font file and precompute its advance widths.
+
+        :param path: the path to the TrueType font file
+        :param size: the font size in points
+        """
+        self.path = path
+        self.size = size
+        self.font = ImageFont.truetype(str(path), size)
+        self.advances = {c: self.font.getlength(c)
+                         for c in self.table_chars}
+        self.kerning: Dict[str, float] = {}
+        # Summing advances only matches the basic layout engine;
+        # raqm may apply shaping the table cannot model.
+        self.use_table = \
+            self.font.layout_engine == ImageFont.Layout.BASIC
+
+    def getlength(self, text: str) -> float:
+        """ Return the rendered length of the text in pixels. Mirrors
+        FreeTypeFont.getlength().
+
+        :param text: the text to measure
+        :return: the length of the text in pixels
+        """
+        advances = self.advances
+        if not self.use_table or not all(c in advances for c in text):
+            return self.font.getlength(text)
+
+        length = sum(advances[c] for c in text)
+        for i in range(len(text) - 1):
+            length += self.kern(text[i], text[i + 1])
+        return length
+
+    def kern(self, left: str, right: str) -> float:
+        """ Return the kerning adjustment between two adjacent
+        characters, measuring and caching it on first use.
+
+        :param left: the first character
+        :param right: the character following it
+        :return: the kerning adjustment in pixels
+        """
+        pair = left + right
+        adjustment = self.kerning.get(pair)
+        if adjustment is None:
+            adjustment = (self.font.getlength(pair)
+                          - self.advances[left] - self.advances[right])
+            self.kerning[pair] = adjustment
+        return adjustment
+
+
+class FontRegistry():
+    """ A process-wide registry of loaded fonts.
+
+    Fonts are keyed by (font path, size) and each is loaded from disk
+    only once. Relative font paths are resolved against FONTS_DIR, so
+    fonts are found regardless of the current working directory.
+    """
+
+    _fonts: Dict[Tuple[pathlib.Path, int], FontEntry] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls,
+            font: Union[str, pathlib.Path],
+            size: int) -> FontEntry:
+        """ Return the loaded font entry for the given font and size,
+        loading it on first use.
+
+        :param font: a font file name in FONTS_DIR, or a path
+        :param size: the font size in points
+        :return: the font entry
+        """
+        key = (cls.resolve(font), size)
+        entry = cls._fonts.get(key)
+        if entry is None:
+            with cls._lock:
+                entry = cls._fonts.get(key)
+                if entry is None:
+                    entry = FontEntry(*key)
+                    cls._fonts[key] = entry
+        return entry
+
+    @staticmethod
+    def resolve(font: Union[str, pathlib.Path]) -> pathlib.Path:
+        """ Resolve a font name or path to an absolute path.
+
+        :param font: a font file name in FONTS_DIR, or a path
+        :return: the absolute path to the font file
+        """
+        path = pathlib.Path(font)
+        if not path.is_absolute():
+            path = FONTS_DIR.joinpath(path)
+        if not path.is_file():
+            raise Exception(f'Font file not found: {path}')
+        return path.resolve()
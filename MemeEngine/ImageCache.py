@@ -0,0 +1,101 @@
+from typing import Callable, Dict, Hashable, Tuple, Union
+from PIL import Image
+import os
+import pathlib
+
+from .LRUCache import LRUCache
+
+
+class ImageCache(LRUCache):
+    """ A bounded, in-memory LRU cache of decoded and resized images.
+
+    Entries are keyed by (path, mtime, width). A lookup stats the
+    source file, so an entry is invalidated as soon as the file on
+    disk changes. The cache enforces a budget on the total number of
+    bytes of decoded pixel data it holds, evicting the least recently
+    used entries first.
+
+    Cached images must not be modified; callers receive a copy of the
+    cached image to draw on.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        """ Construct a new ImageCache with the given byte budget.
+
+        :param max_bytes: the maximum total size in bytes of the
+                          decoded images held in the cache
+        """
+        super().__init__(max_bytes)
+        self.invalidations = 0
+        # Latest mtime seen for each (path, width), used to drop
+        # entries whose source file has since changed.
+        self._mtimes: Dict[Tuple[str, int], int] = {}
+
+    def get(self,
+            path: Union[str, pathlib.Path],
+            width: int,
+            loader: Callable[[pathlib.Path, int], Image.Image]
+            ) -> Image.Image:
+        """ Return a copy of the image at path resized to width,
+        loading it with the supplied loader on a cache miss.
+
+        :param path: the path to the image on disk
+        :param width: the resize width of the image
+        :param loader: a callable taking (path, width) and returning
+                       the resized image
+        :return: a copy of the resized image, safe to draw on
+        """
+        path = pathlib.Path(path)
+        mtime = os.stat(path).st_mtime_ns
+        key = (str(path), mtime, width)
+
+        with self._lock:
+            im = self._lookup(key)
+        if im is not None:
+            return im.copy()
+
+        im = loader(path, width)
+        im.load()
+
+        with self._lock:
+            self._invalidate(str(path), width, mtime)
+            self._insert(key, im)
+
+        return im.copy()
+
+    def clear(self) -> None:
+        """ Remove all entries from the cache. """
+        with self._lock:
+            self._mtimes.clear()
+        super().clear()
+
+    def stats(self) -> Dict[str, int]:
+        """ Return the cache counters and current occupancy.
+
+        :return: a dictionary of cache statistics
+        """
+        return {**super().stats(), 'invalidations': self.invalidations}
+
+    def _invalidate(self, path: str, width: int, mtime: int) -> None:
+        """ Drop the entry for (path, width) if it was loaded from an
+        older version of the file. Must be called with the lock held.
+        """
+        old_mtime = self._mtimes.get((path, width))
+        if old_mtime is not None and old_mtime != mtime:
+            if self._discard((path, old_mtime, width)):
+                self.invalidations += 1
+        self._mtimes[(path, width)] = mtime
+
+    def _evicted(self, key: Hashable, im: Image.Image) -> None:
+        """ Forget the mtime of an evicted image, if it was the latest.
+        Must be called with the lock held.
+        """
+        path, mtime, width = key
+        if self._mtimes.get((path, width)) == mtime:
+            del self._mtimes[(path, width)]
+
+    @staticmethod
+    def _size_of(im: Image.Image) -> int:
+        """ Return the approximate size in bytes of the decoded image.
+        """
+        return im.width * im.height * len(im.getbands())
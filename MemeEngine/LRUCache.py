@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import threading
+
+
+class LRUCache():
+    """ A bounded, in-memory LRU cache with a byte budget.
+
+    The cache enforces a budget on the total number of bytes of the
+    entries it holds, evicting the least recently used entries first.
+    It is the base of the engine's caches, which define how their
+    entries are keyed and sized, and are safe to use across threads.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        """ Construct a new LRUCache with the given byte budget.
+
+        :param max_bytes: the maximum total size in bytes of the
+                          entries held in the cache
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """ Return the number of cached entries. """
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """ Remove all entries from the cache. """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """ Return the cache counters and current occupancy.
+
+        :return: a dictionary of cache statistics
+        """
+        with self._lock:
+            return {'entries': len(self._entries),
+                    'bytes': self.current_bytes,
+                    'max_bytes': self.max_bytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
+
+    def _lookup(self, key: Hashable) -> Optional[Any]:
+        """ Return the entry for key, marking it as most recently
+        used, or None on a miss. Must be called with the lock held.
+        """
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _insert(self, key: Hashable, value: Any) -> None:
+        """ Add an entry, unless another thread added it first, then
+        evict down to the budget. Must be called with the lock held.
+        """
+        if key not in self._entries:
+            self._entries[key] = value
+            self.current_bytes += self._size_of(value)
+            self._evict()
+
+    def _discard(self, key: Hashable) -> bool:
+        """ Remove the entry for key, if any. Must be called with the
+        lock held.
+
+        :return: whether an entry was removed
+        """
+        value = self._entries.pop(key, None)
+        if value is None:
+            return False
+        self.current_bytes -= self._size_of(value)
+        return True
+
+    def _evict(self) -> None:
+        """ Evict least recently used entries until the cache is
+        within its byte budget. Must be called with the lock held.
+        """
+        while self.current_bytes > self.max_bytes and self._entries:
+            key, value = self._entries.popitem(last=False)
+            self.current_bytes -= self._size_of(value)
+            self.evictions += 1
+            self._evicted(key, value)
+
+    def _evicted(self, key: Hashable, value: Any) -> None:
+        """ Called with the lock held after an entry is evicted. """
+
+    @staticmethod
+    def _size_of(value: Any) -> int:
+        """ Return the size in bytes of an entry. """
+        raise NotImplementedError
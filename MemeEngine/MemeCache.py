@@ -0,0 +1,45 @@
+from typing import Optional
+
+from .LRUCache import LRUCache
+
+
+class MemeCache(LRUCache):
+    """ A bounded, in-memory LRU cache of encoded memes.
+
+    Entries are keyed by the meme's content-addressed output name, so
+    memes rendered in memory are deduplicated like memes saved to the
+    output directory, without writing them to disk. The cache
+    enforces a budget on the total number of bytes of encoded memes
+    it holds, evicting the least recently used entries first.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024) -> None:
+        """ Construct a new MemeCache with the given byte budget.
+
+        :param max_bytes: the maximum total size in bytes of the
+                          encoded memes held in the cache
+        """
+        super().__init__(max_bytes)
+
+    def get(self, name: str) -> Optional[bytes]:
+        """ Return the encoded meme with the given output name.
+
+        :param name: the meme's output name
+        :return: the encoded meme, or None if it is not cached
+        """
+        with self._lock:
+            return self._lookup(name)
+
+    def put(self, name: str, data: bytes) -> None:
+        """ Add an encoded meme to the cache.
+
+        :param name: the meme's output name
+        :param data: the encoded meme
+        """
+        with self._lock:
+            self._insert(name, data)
+
+    @staticmethod
+    def _size_of(data: bytes) -> int:
+        """ Return the size in bytes of the encoded meme. """
+        return len(data)
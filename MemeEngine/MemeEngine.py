@@ -1,7 +1,31 @@
-from typing import Union
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, \
+                   Optional, Tuple, Union
 from PIL import Image, ImageFont, ImageDraw
+import functools
+import hashlib
+import io
+import os
 import random
 import pathlib
+import threading
+
+import metrics
+from .CaptionCache import CaptionCache, CaptionLayer
+from .DerivativeStore import DerivativeStore
+from .FontRegistry import FontEntry, FontRegistry
+from .ImageCache import ImageCache
+from .MemeCache import MemeCache
+from .OutputStore import OutputStore
+from .TextWrapper import TextWrapper
+
+# An image to make a meme from: a path to the image on disk, the image
+# file content as bytes, a file-like object or a PIL image.
+ImageSource = Union[str, pathlib.Path, bytes, BinaryIO, Image.Image]
+# Output encoder settings: the name of a preset in
+# MemeEngine.encoder_presets, or Pillow save options including the
+# format, such as {'format': 'JPEG', 'quality': 85}.
+Encoder = Union[str, Dict[str, Any]]
 
 
 class MemeEngine():
@@ -14,72 +38,648 @@ class MemeEngine():
     image.
 
     The MemeEngine saves created memes at the location stored in its
-    output_dir attribute, set upon initialisation of the object.
+    output_dir attribute, set upon initialisation of the object. An
+    OutputStore can be supplied to bound the size and age of the
+    saved memes.
+
+    Decoded and resized base images are kept in an in-memory LRU
+    cache, so repeated memes from the same image only copy the cached
+    image and draw on the copy. Large JPEGs are decoded at a reduced
+    scale, and other images are reduced before they are resampled to
+    the target width. Images over max_pixels are rejected before they
+    are decoded. A DerivativeStore can be supplied to share
+    pre-resized images between processes through memory-mapped files.
+
+    Captions are rendered once onto transparent layers, kept in an
+    in-memory LRU cache, and composited onto each image, so the same
+    quote on many images is only wrapped and rasterized once. The
+    make_memes() batch API puts one caption on many images.
+
+    Generated memes are named by a hash of their content and render
+    settings, so identical memes are rendered once and then served
+    from the existing file. Memes can also be rendered entirely in
+    memory with make_meme_bytes(), from images supplied as bytes,
+    file-like objects or PIL images, and are then deduplicated in an
+    in-memory cache instead. Callers that want repeated requests
+    deduplicated pass a seed, such as caption_seed() of the quote.
+
+    Memes are encoded as PNG by default. The format and its options
+    can be set for the engine or for each meme, either directly or
+    by naming one of the encoder presets.
     """
+    # Named encoder settings, trading encode time against file size.
+    encoder_presets = {
+        'png': {'format': 'PNG'},
+        'fast': {'format': 'JPEG', 'quality': 85},
+        'balanced': {'format': 'JPEG', 'quality': 80, 'optimize': True},
+        'small': {'format': 'WEBP', 'quality': 75, 'method': 6},
+    }
+    # Images are first reduced by an integer factor to within this
+    # multiple of the target size, then resampled. Higher is slower
+    # but closer to resampling the full image.
+    reducing_gap = 3.0
 
     def __init__(self,
-                 output_dir: Union[str, pathlib.Path]) -> None:
+                 output_dir: Union[str, pathlib.Path],
+                 cache_bytes: int = 64 * 1024 * 1024,
+                 font: Union[str, pathlib.Path] = 'LilitaOne-Regular.ttf',
+                 font_size: int = 22,
+                 store: Optional[OutputStore] = None,
+                 encoder: Encoder = 'png',
+                 resample: Union[int, str] = 'lanczos',
+                 max_pixels: Optional[int] = 50_000_000,
+                 derivatives: Optional[DerivativeStore] = None,
+                 caption_bytes: int = 16 * 1024 * 1024,
+                 meme_bytes: int = 16 * 1024 * 1024) -> None:
         """ Construct a new MemeEngine with the specified output
         directory for any generated memes.
 
         :param output_dir: The location to save generated memes
+        :param cache_bytes: The byte budget of the resized image
+                            cache, defaults to 64 MiB
+        :param font: The caption font, as a file name in FONTS_DIR
+                     or a path, defaults to LilitaOne-Regular.ttf
+        :param font_size: The caption font size, defaults to 22
+        :param store: The store that bounds the generated memes,
+                      defaults to None for an unbounded store in
+                      output_dir. A store's own directory takes the
+                      place of output_dir.
+        :param encoder: The output encoder preset name or settings,
+                        defaults to 'png'
+        :param resample: The resampling filter for resizing images, as
+                         a Pillow filter or its name, such as
+                         'nearest', 'bilinear', 'bicubic' or
+                         'lanczos', defaults to 'lanczos'
+        :param max_pixels: The largest number of pixels in an image
+                           that will be decoded, defaults to 50
+                           million. None for no limit.
+        :param derivatives: The store of pre-resized images to use
+                            for images it covers, defaults to None
+        :param caption_bytes: The byte budget of the caption layer
+                              cache, defaults to 16 MiB
+        :param meme_bytes: The byte budget of the cache of memes
+                           rendered in memory, defaults to 16 MiB
         """
-        self.output_dir = pathlib.Path(output_dir)
+        self.store = store or OutputStore(output_dir)
+        self.output_dir = self.store.directory
+        self.font = FontRegistry.get(font, font_size)
+        self.text_wrapper = TextWrapper()
+        self.image_cache = ImageCache(cache_bytes)
+        self.caption_cache = CaptionCache(caption_bytes)
+        self.meme_cache = MemeCache(meme_bytes)
+        self.encoder_settings = self.encoder_options(encoder)
+        if isinstance(resample, str):
+            resample = Image.Resampling[resample.upper()]
+        self.resample = Image.Resampling(resample)
+        self.max_pixels = max_pixels
+        self.derivatives = derivatives
+        self.renders = 0
+        self.dedup_hits = 0
+        # The content hash of each image file by path, with the mtime
+        # and size it was taken at.
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._inflight_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
 
     def make_meme(self,
-                  img_path: Union[str, pathlib.Path],
+                  img_path: ImageSource,
                   text: str,
                   author: str,
-                  width: int = 500) -> pathlib.Path:
+                  width: int = 500,
+                  cache: bool = True,
+                  seed: Optional[int] = None,
+                  encoder: Optional[Encoder] = None) -> pathlib.Path:
         """ Create a meme image from the supplied components.
 
-        :param img_path: the path to the image on disk
+        The output file is named by a hash of everything that affects
+        the rendered meme, so a meme that has already been made is
+        served from the existing file without rendering it again.
+
+        :param img_path: the image, as a path to the image on disk,
+                         the image file content as bytes, a file-like
+                         object or a PIL image
         :param text: the body of the quote for the caption
         :param author: the author of the quote for the caption
         :param width: the resize width of the image, defaults to 500
+        :param cache: whether to keep the resized image in the image
+                      cache, defaults to True. Pass False for one-off
+                      images such as user uploads. Only images on
+                      disk are cached.
+        :param seed: the seed for the random caption position,
+                     defaults to None for a new random position
+        :param encoder: the output encoder preset name or settings,
+                        defaults to None for the engine's settings
         :return: the generated image path as a string
         """
-        # Load image file from disk.
-        with Image.open(img_path) as im:
-            
-            # Resize the image
-            resize_ratio = width/im.width
-            im = im.resize((width, int(im.height * resize_ratio)),
-                           Image.NEAREST)
-
-            # Set a random text anchor position for the caption
-            text_y = random.uniform(0.1, 0.7) * im.height
-            text_x = random.uniform(0.1, 0.3) * im.width
-            text_anchor = (text_x, text_y)
-
-            # Set the text width and wrap the caption to fit
-            caption = f'{text} - {author}'            
-            font = ImageFont.truetype('./fonts/LilitaOne-Regular.ttf', 22)
-            text_width = (im.width - text_x) * 0.8
-            caption = self.get_wrapped_text(caption, font, text_width)
-
-            # Draw the caption
-            draw = ImageDraw.Draw(im)  
-            draw.text(text_anchor, caption, fill='white', font=font)
-
-            # Save the file to the chosen output directory
-            out_file = f'{random.randint(0,100000000)}.png'
-            out_path = self.output_dir.joinpath(out_file)
-            im.save(out_path, format='PNG')
+        img_path = self._read_source(img_path)
+        if seed is None:
+            # Seed from the OS rather than the shared module-level
+            # generator, so concurrent threads and forked workers
+            # never share random state.
+            seed = int.from_bytes(os.urandom(4), 'big')
+        settings = self.encoder_options(encoder)
+
+        out_file = self.output_name(img_path, text, author,
+                                    width, seed, cache, settings)
+        out_path = self.store.path(out_file)
+
+        # Concurrent identical requests wait for a single render.
+        with self._render_lock(out_file):
+            if self.store.touch(out_path):
+                self._count('dedup_hits')
+                metrics.inc('meme_dedup_hits_total')
+            else:
+                with self.render(img_path, text, author, width,
+                                 seed, cache) as im:
+                    self._save(im, out_path, settings)
+                self._count('renders')
+                metrics.inc('meme_renders_total')
+                self.store.add(out_path)
 
         return out_path
 
-    # Function shared by Chris Collett on StackOverflow, Apr 21, 2021
-    # https://stackoverflow.com/a/67203353
+    def make_memes(self,
+                   imgs: List[ImageSource],
+                   text: str,
+                   author: str,
+                   width: int = 500,
+                   cache: bool = True,
+                   seed: Optional[int] = None,
+                   encoder: Optional[Encoder] = None
+                   ) -> List[pathlib.Path]:
+        """ Create memes with the same caption on many images.
+
+        The caption is placed at the same relative position on every
+        image, so images of the same width share one wrapped and
+        rasterized caption layer.
+
+        :param imgs: the images, each as a path to the image on
+                     disk, the image file content as bytes, a
+                     file-like object or a PIL image
+        :param text: the body of the quote for the caption
+        :param author: the author of the quote for the caption
+        :param width: the resize width of the images, defaults to 500
+        :param cache: whether to keep the resized images in the image
+                      cache, defaults to True
+        :param seed: the seed for the random caption position,
+                     defaults to None for a new random position
+        :param encoder: the output encoder preset name or settings,
+                        defaults to None for the engine's settings
+        :return: the generated image paths, in the order of imgs
+        """
+        if seed is None:
+            seed = int.from_bytes(os.urandom(4), 'big')
+        return [self.make_meme(img, text, author, width, cache, seed,
+                               encoder)
+                for img in imgs]
+
+    def make_meme_bytes(self,
+                        img: ImageSource,
+                        text: str,
+                        author: str,
+                        width: int = 500,
+                        seed: Optional[int] = None,
+                        encoder: Optional[Encoder] = None) -> io.BytesIO:
+        """ Create a meme and return it encoded in memory, without
+        writing anything to disk. The meme can then be sent to the
+        client or to any storage backend.
+
+        Given a seed, the meme is named like make_meme() names it, and
+        kept in the in-memory meme cache, so an identical meme is
+        served from the cache without rendering it again, and
+        concurrent identical requests are coalesced into one render.
+
+        :param img: the image, as a path to the image on disk, the
+                    image file content as bytes, a file-like object
+                    or a PIL image
+        :param text: the body of the quote for the caption
+        :param author: the author of the quote for the caption
+        :param width: the resize width of the image, defaults to 500
+        :param seed: the seed for the random caption position,
+                     defaults to None for a new random position
+        :param encoder: the output encoder preset name or settings,
+                        defaults to None for the engine's settings
+        :return: a buffer holding the encoded meme, at position 0
+        """
+        settings = self.encoder_options(encoder)
+        if seed is None:
+            return self._render_bytes(img, text, author, width, seed,
+                                      settings)
+
+        img = self._read_source(img)
+        out_file = self.output_name(img, text, author, width, seed,
+                                    False, settings)
+        with self._render_lock(out_file):
+            data = self.meme_cache.get(out_file)
+            if data is not None:
+                self._count('dedup_hits')
+                metrics.inc('meme_dedup_hits_total')
+                return io.BytesIO(data)
+            buffer = self._render_bytes(img, text, author, width, seed,
+                                        settings)
+            self.meme_cache.put(out_file, buffer.getvalue())
+        return buffer
+
+    @staticmethod
+    def caption_seed(text: str, author: str) -> int:
+        """ Return a seed for the caption position derived from the
+        caption, so that the same image and quote always make the
+        same meme, and repeated requests for it are deduplicated.
+
+        :param text: the body of the quote for the caption
+        :param author: the author of the quote for the caption
+        :return: the seed
+        """
+        key = f'{text}\0{author}'.encode('utf-8')
+        return int.from_bytes(hashlib.sha256(key).digest()[:4], 'big')
+
+    @property
+    def mime_type(self) -> str:
+        """ The MIME type of the memes produced by the engine. """
+        return Image.MIME[self.encoder_settings['format']]
+
+    def encoder_options(self,
+                        encoder: Optional[Encoder] = None) -> Dict[str, Any]:
+        """ Return the Pillow save options for an encoder.
+
+        :param encoder: the encoder preset name or settings, defaults
+                        to None for the engine's settings
+        :return: the save options, including the upper case format
+        """
+        if encoder is None:
+            return self.encoder_settings
+        if isinstance(encoder, str):
+            if encoder not in self.encoder_presets:
+                raise Exception(f'Unknown encoder preset: {encoder}')
+            encoder = self.encoder_presets[encoder]
+        if 'format' not in encoder:
+            raise Exception('Encoder settings must include a format')
+        return {**encoder, 'format': encoder['format'].upper()}
+
+    @staticmethod
+    def encode(im: Image.Image,
+               fp: Union[str, pathlib.Path, BinaryIO],
+               settings: Dict[str, Any]) -> None:
+        """ Encode a meme with the given save options.
+
+        :param im: the meme image
+        :param fp: the file path or file object to write to
+        :param settings: the Pillow save options, including the format
+        """
+        # JPEG has no alpha channel or palette.
+        with metrics.stage('encode'):
+            if settings['format'] == 'JPEG' and im.mode not in ('RGB', 'L'):
+                im = im.convert('RGB')
+            im.save(fp, **settings)
+
+    def output_name(self,
+                    img_path: ImageSource,
+                    text: str,
+                    author: str,
+                    width: int,
+                    seed: int,
+                    cache: bool = True,
+                    settings: Optional[Dict[str, Any]] = None) -> str:
+        """ Return the content-addressed file name of a meme.
+
+        The name is a hash of the image content, caption, author,
+        width, seed, font, resampling filter and encoder settings.
+
+        :param img_path: the image, as a path, bytes or a PIL image
+        :param text: the body of the quote for the caption
+        :param author: the author of the quote for the caption
+        :param width: the resize width of the image
+        :param seed: the seed for the random caption position
+        :param cache: whether to remember the image content hash
+        :param settings: the encoder save options, defaults to None
+                         for the engine's settings
+        :return: the output file name
+        """
+        settings = settings or self.encoder_settings
+        key = '\0'.join([self._image_digest(img_path, cache),
+                          text, author, str(width), str(seed),
+                          str(self.font.path), str(self.font.size),
+                          str(int(self.resample)),
+                          repr(sorted(settings.items()))])
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        extension = settings['format'].lower()
+        return f'{digest}.{extension}'
+
+    def render(self,
+               img: ImageSource,
+               text: str,
+               author: str,
+               width: int = 500,
+               seed: Optional[int] = None,
+               cache: bool = True) -> Image.Image:
+        """ Render a meme in memory.
+
+        :param img: the image, as a path to the image on disk, the
+                    image file content as bytes, a file-like object
+                    or a PIL image
+        :param text: the body of the quote for the caption
+        :param author: the author of the quote for the caption
+        :param width: the resize width of the image, defaults to 500
+        :param seed: the seed for the random caption position,
+                     defaults to None for a new random position
+        :param cache: whether to keep the resized image in the image
+                      cache, defaults to True
+        :return: the rendered meme image
+        """
+        im = self._load(img, width, cache)
+
+        # Set a random text anchor position for the caption
+        rng = random.Random(seed)
+        text_y = rng.uniform(0.1, 0.7) * im.height
+        text_x = rng.uniform(0.1, 0.3) * im.width
+
+        # Set the text width, then wrap and rasterize the caption to
+        # fit, or take its layer from the cache. The width is whole
+        # pixels so that caption layers can be reused between memes.
+        caption = f'{text} - {author}'
+        text_width = int((im.width - text_x) * 0.8)
+        layer = self.caption_cache.get(caption, self.font, text_width,
+                                       self.render_caption)
+
+        # Composite the caption onto the image
+        with metrics.stage('draw'):
+            self.composite(im, layer, (int(text_x), int(text_y)))
+        return im
+
+    def render_caption(self, caption: str, line_length: int) -> CaptionLayer:
+        """ Wrap a caption and rasterize it in white onto a transparent
+        layer, cropped to its ink.
+
+        :param caption: the caption text, before wrapping
+        :param line_length: the number of pixels of space for a line
+        :return: the caption layer
+        """
+        with metrics.stage('wrap'):
+            caption = self.get_wrapped_text(caption, self.font,
+                                            line_length)
+        with metrics.stage('draw'):
+            font = self.font.font
+            left, top, right, bottom = ImageDraw.Draw(
+                Image.new('RGBA', (1, 1))).multiline_textbbox(
+                    (0, 0), caption, font=font)
+            im = Image.new('RGBA', (max(1, right - left),
+                                    max(1, bottom - top)),
+                           (255, 255, 255, 0))
+            ImageDraw.Draw(im).text((-left, -top), caption,
+                                    fill='white', font=font)
+        return CaptionLayer(im, (left, top))
+
+    @staticmethod
+    def composite(im: Image.Image,
+                  layer: CaptionLayer,
+                  anchor: Tuple[int, int]) -> None:
+        """ Composite a caption layer onto an image, in place.
+
+        :param im: the image to draw the caption on
+        :param layer: the caption layer
+        :param anchor: the position of the caption's text anchor
+        """
+        x = anchor[0] + layer.offset[0]
+        y = anchor[1] + layer.offset[1]
+        if im.mode == 'RGBA' and x >= 0 and y >= 0:
+            im.alpha_composite(layer.image, (x, y))
+        else:
+            # Blend the layer in by its alpha, as drawing the text on
+            # the image would, in any image mode.
+            im.paste(layer.image, (x, y), layer.image)
+
+    def _load(self,
+              img: ImageSource,
+              width: int,
+              cache: bool) -> Image.Image:
+        """ Return a resized copy of the image that is safe to draw on,
+        from the image cache where possible.
+        """
+        if isinstance(img, Image.Image):
+            return self.resize(img, width, self.resample)
+        loader = self._loader()
+        if isinstance(img, (bytes, bytearray, memoryview)):
+            return loader(io.BytesIO(img), width)
+        if hasattr(img, 'read'):
+            return loader(img, width)
+        if cache and self.derivatives is not None:
+            im = self.derivatives.get(img, width, loader,
+                                      self.resample.name)
+            if im is not None:
+                return im
+        if cache:
+            return self.image_cache.get(img, width, loader)
+        return loader(img, width)
+
+    def build_derivatives(self,
+                          paths: List[Union[str, pathlib.Path]]) -> int:
+        """ Build any missing or stale pre-resized images for the
+        given paths in the engine's derivative store.
+
+        :param paths: the paths to the source images
+        :return: the number of derivatives built
+        """
+        if self.derivatives is None:
+            return 0
+        loader = self._loader()
+        return self.derivatives.build_all(paths, loader,
+                                          self.resample.name)
+
+    def _loader(self) -> Callable[[ImageSource, int], Image.Image]:
+        """ Return load_image with the engine's resampling filter and
+        pixel limit.
+        """
+        return functools.partial(self.load_image,
+                                 resample=self.resample,
+                                 max_pixels=self.max_pixels)
+
+    def _render_bytes(self,
+                      img: ImageSource,
+                      text: str,
+                      author: str,
+                      width: int,
+                      seed: Optional[int],
+                      settings: Dict[str, Any]) -> io.BytesIO:
+        """ Render a meme and encode it into a new buffer, at
+        position 0.
+        """
+        buffer = io.BytesIO()
+        with self.render(img, text, author, width, seed, cache=False) as im:
+            self.encode(im, buffer, settings)
+        self._count('renders')
+        metrics.inc('meme_renders_total')
+        buffer.seek(0)
+        return buffer
+
+    def _save(self,
+              im: Image.Image,
+              out_path: pathlib.Path,
+              settings: Dict[str, Any]) -> None:
+        """ Save the meme to out_path. The meme is encoded in memory, so
+        that encoding and writing can be timed apart, then written to
+        a temporary name, so a partly written file is never served.
+        """
+        buffer = io.BytesIO()
+        self.encode(im, buffer, settings)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = out_path.with_name(
+            f'.{out_path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with metrics.stage('write'):
+                with open(tmp_path, 'wb') as f:
+                    f.write(buffer.getbuffer())
+                os.replace(tmp_path, out_path)
+        finally:
+            if tmp_path.exists():
+                os.remove(tmp_path)
+
+    def _count(self, counter: str) -> None:
+        """ Add one to a counter, safely across threads. """
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @contextmanager
+    def _render_lock(self, out_file: str) -> Iterator[None]:
+        """ Hold the lock for rendering the given output file, so only
+        one thread renders each meme at a time.
+        """
+        with self._inflight_lock:
+            lock = self._inflight.setdefault(out_file, threading.Lock())
+        try:
+            with lock:
+                yield
+        finally:
+            with self._inflight_lock:
+                if self._inflight.get(out_file) is lock:
+                    del self._inflight[out_file]
+
+    @staticmethod
+    def _read_source(img: ImageSource) -> ImageSource:
+        """ Read a file-like image source into bytes, so it can be both
+        hashed and decoded. Other sources are returned unchanged.
+        """
+        if hasattr(img, 'read') and not isinstance(img, Image.Image):
+            return img.read()
+        return img
+
+    def _image_digest(self,
+                      img: ImageSource,
+                      cache: bool = True) -> str:
+        """ Return the SHA-256 hash of an image's content. The hash of
+        a file is remembered, one per path, until the file changes.
+        """
+        if isinstance(img, Image.Image):
+            sha = hashlib.sha256(f'{img.mode}{img.size}'.encode())
+            sha.update(img.tobytes())
+            return sha.hexdigest()
+        if isinstance(img, (bytes, bytearray, memoryview)):
+            return hashlib.sha256(img).hexdigest()
+
+        st = os.stat(img)
+        key = str(img)
+        entry = self._digests.get(key)
+        if entry is not None and entry[:2] == (st.st_mtime_ns, st.st_size):
+            return entry[2]
+        sha = hashlib.sha256()
+        with open(img, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        if cache:
+            # Replaces the hash of an older version of the file.
+            self._digests[key] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    @classmethod
+    def load_image(cls,
+                   img_path: Union[str, pathlib.Path, BinaryIO],
+                   width: int,
+                   resample: int = Image.LANCZOS,
+                   max_pixels: Optional[int] = None) -> Image.Image:
+        """ Load an image and resize it to the given width, keeping its
+        aspect ratio.
+
+        Only the image header is read before the size is checked. A
+        JPEG is then decoded at the smallest scale that is still at
+        least the target size.
+
+        :param img_path: the path to the image on disk, or a file-like
+                         object
+        :param width: the resize width of the image
+        :param resample: the resampling filter, defaults to LANCZOS
+        :param max_pixels: the largest number of pixels to decode,
+                           defaults to None for no limit
+        :return: the resized image
+        """
+        with Image.open(img_path) as im:
+            if max_pixels is not None and im.width * im.height > max_pixels:
+                raise Exception(f'Image is too large: {im.width}x'
+                                f'{im.height} pixels, the limit is '
+                                f'{max_pixels}')
+            size = cls.scaled_size(im, width)
+            if im.format == 'JPEG':
+                im.draft(None, size)
+            with metrics.stage('decode'):
+                im.load()
+            with metrics.stage('resize'):
+                return cls.drawable(im).resize(
+                    size, resample, reducing_gap=cls.reducing_gap)
+
+    @classmethod
+    def resize(cls,
+               im: Image.Image,
+               width: int,
+               resample: int = Image.LANCZOS) -> Image.Image:
+        """ Resize an image to the given width, keeping its aspect
+        ratio. The original image is not modified.
+
+        :param im: the image
+        :param width: the resize width of the image
+        :param resample: the resampling filter, defaults to LANCZOS
+        :return: the resized image
+        """
+        return cls.drawable(im).resize(cls.scaled_size(im, width),
+                                       resample,
+                                       reducing_gap=cls.reducing_gap)
+
+    @staticmethod
+    def drawable(im: Image.Image) -> Image.Image:
+        """ Convert palette, bilevel and greyscale with alpha images to
+        RGB, or RGBA if they have transparency, so that they are
+        resampled smoothly and a white caption keeps its colour.
+        Images in other modes are returned unchanged.
+
+        :param im: the image
+        :return: the image, converted if needed
+        """
+        if im.mode in ('P', 'PA'):
+            alpha = im.mode == 'PA' or 'transparency' in im.info
+            return im.convert('RGBA' if alpha else 'RGB')
+        if im.mode == 'LA':
+            return im.convert('RGBA')
+        if im.mode == '1':
+            return im.convert('RGB')
+        return im
+
+    @staticmethod
+    def scaled_size(im: Image.Image, width: int) -> Tuple[int, int]:
+        """ Return the size of an image scaled to the given width.
+
+        :param im: the image
+        :param width: the resize width of the image
+        :return: the scaled width and height
+        """
+        resize_ratio = width/im.width
+        return width, int(im.height * resize_ratio)
+
     def get_wrapped_text(self,
                          text: str,
-                         font: ImageFont.ImageFont,
+                         font: Union[ImageFont.FreeTypeFont, FontEntry],
                          line_length: int) -> str:
         """ Wraps the provided text to fit the given line length.
-        Does not split in the middle of a word.
-
-        Function by Chris Collett on StackOverflow, Apr 21,
-        2021: https://stackoverflow.com/a/67203353
+        Does not split in the middle of a word. Layouts are memoized
+        by the engine's TextWrapper.
 
         :param text: The text to wrap
         :param font: The font of the text, which affects its size
@@ -87,15 +687,4 @@ class MemeEngine():
         :return: A string of wrapped text, containing line breaks
                  where needed to fit the line length.
         """
-        lines = ['']
-        for word in text.split():
-            # Add the next word to the current line
-            line = f'{lines[-1]} {word}'.strip()
-            # Check if the current line is getting too long
-            if font.getlength(line) <= line_length:
-                # Save the line with the new word at the end
-                lines[-1] = line
-            else:
-                # Start a new line beginning with this word
-                lines.append(word)
-        return '\n'.join(lines)
+        return self.text_wrapper.wrap(text, font, line_length)
@@ -0,0 +1,242 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Union
+import os
+import pathlib
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class OutputStore():
+    """ A bounded directory of generated memes.
+
+    The store enforces a maximum total size and a maximum age on the
+    files in its directory. Files older than max_age, by modification
+    time, are expired. If the directory is still over max_bytes, the
+    least recently used files are evicted until it fits. A file's
+    access time is set whenever it is written or served again, so
+    eviction does not depend on the file system recording reads.
+
+    Eviction takes an exclusive lock on a lock file in the directory,
+    so several worker processes can share one store. Files whose
+    names start with a dot, such as the lock file and partly written
+    memes, are never counted or evicted.
+
+    Scanning the directory is costly when it holds many memes, so a
+    write does not scan it. The store keeps a running total of the
+    bytes it has written since its last scan, and scans only when that
+    total goes over max_bytes, or every scan_interval seconds or
+    scan_every writes, to pick up other processes' writes and expire
+    old memes. Eviction then goes down to low_water of max_bytes, so
+    that the following writes do not scan again at once. Expired memes
+    are never served, as touch() checks their age.
+    """
+    lock_name = '.lock'
+    # Longest time in seconds, and most writes, between scans.
+    scan_interval = 60.0
+    scan_every = 1000
+    # Fraction of max_bytes that eviction reduces the store to.
+    low_water = 0.9
+
+    def __init__(self,
+                 directory: Union[str, pathlib.Path],
+                 max_bytes: Optional[int] = None,
+                 max_age: Optional[float] = None) -> None:
+        """ Construct a new OutputStore for the given directory.
+
+        :param directory: the directory to store memes in
+        :param max_bytes: the maximum total size of the stored memes
+                          in bytes, defaults to None for no limit
+        :param max_age: the maximum age of a stored meme in seconds,
+                        defaults to None for no limit
+        """
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evictions = 0
+        self.expirations = 0
+        self.scans = 0
+        self._lock = threading.Lock()
+        self._total_lock = threading.Lock()
+        # Bytes stored as of the last scan, plus the bytes written
+        # since, or None before the first scan.
+        self._total: Optional[int] = None
+        self._writes = 0
+        self._scanned = 0.0
+        # When current_bytes last counted the directory.
+        self._counted = 0.0
+
+    def path(self, name: str) -> pathlib.Path:
+        """ Return the path of a meme in the store.
+
+        :param name: the file name of the meme
+        :return: the path of the meme
+        """
+        return self.directory.joinpath(name)
+
+    def touch(self, path: pathlib.Path) -> bool:
+        """ Mark a stored meme as used, if it is still in the store.
+
+        :param path: the path of the meme
+        :return: whether the meme is in the store
+        """
+        try:
+            st = os.stat(path)
+            if self.max_age is not None \
+                    and time.time() - st.st_mtime > self.max_age:
+                return False
+            os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def add(self, path: pathlib.Path) -> None:
+        """ Record a newly written meme, and enforce the store's limits
+        if a scan is due.
+
+        :param path: the path of the meme
+        """
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            size = 0
+        with self._total_lock:
+            self._writes += 1
+            due = self._total is None \
+                or self._writes >= self.scan_every \
+                or time.monotonic() - self._scanned >= self.scan_interval
+            if self._total is not None:
+                self._total += size
+                if self.max_bytes is not None \
+                        and self._total > self.max_bytes:
+                    due = True
+        if due and (self.max_bytes is not None or self.max_age is not None):
+            self.enforce(keep=path)
+
+    def enforce(self, keep: Optional[pathlib.Path] = None) -> None:
+        """ Expire memes over the maximum age, then evict the least
+        recently used memes until the store fits in its size limit.
+
+        :param keep: a meme that must not be evicted, such as the one
+                     just written, defaults to None
+        """
+        now = time.time()
+        with self._locked():
+            entries = self._scan()
+            total = sum(st.st_size for st in entries.values())
+
+            if self.max_age is not None:
+                for path, st in list(entries.items()):
+                    if now - st.st_mtime > self.max_age and path != keep:
+                        if self._remove(path):
+                            self.expirations += 1
+                        total -= st.st_size
+                        del entries[path]
+
+            if self.max_bytes is not None and total > self.max_bytes:
+                target = self.max_bytes * self.low_water
+                by_access = sorted(entries.items(),
+                                   key=lambda item: item[1].st_atime_ns)
+                for path, st in by_access:
+                    if total <= target:
+                        break
+                    if path == keep:
+                        continue
+                    if self._remove(path):
+                        self.evictions += 1
+                    total -= st.st_size
+
+            with self._total_lock:
+                self._total = total
+                self._writes = 0
+                self._scanned = time.monotonic()
+                self.scans += 1
+
+    @property
+    def current_bytes(self) -> int:
+        """ The bytes stored as of the last scan plus the bytes written
+        since. The directory is counted again only if it has not been
+        scanned for scan_interval seconds, to pick up other processes'
+        writes, so reading this is cheap.
+        """
+        with self._total_lock:
+            last = max(self._scanned, self._counted)
+            if self._total is not None \
+                    and time.monotonic() - last < self.scan_interval:
+                return self._total
+        total = sum(st.st_size for st in self._scan().values())
+        with self._total_lock:
+            self._total = total
+            self._counted = time.monotonic()
+        return total
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """ Return the occupancy and eviction counts of the store.
+
+        The eviction counts are for this process only. This scans the
+        directory; current_bytes is a cheaper estimate of its size.
+
+        :return: the number of files and bytes stored, the limits, and
+                 the number of memes evicted and expired
+        """
+        entries = self._scan()
+        return {'files': len(entries),
+                'bytes': sum(st.st_size for st in entries.values()),
+                'max_bytes': self.max_bytes,
+                'max_age': self.max_age,
+                'evictions': self.evictions,
+                'expirations': self.expirations}
+
+    def _scan(self) -> Dict[pathlib.Path, os.stat_result]:
+        """ Stat every meme in the store. """
+        entries = {}
+        try:
+            scan = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return entries
+        for entry in scan:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_file():
+                    entries[pathlib.Path(entry.path)] = entry.stat()
+            except FileNotFoundError:
+                continue
+        return entries
+
+    @staticmethod
+    def _remove(path: pathlib.Path) -> bool:
+        """ Remove a meme, returning False if another process already
+        removed it.
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """ Hold the store's thread lock and its lock file, excluding
+        other threads and processes.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.path(self.lock_name), 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
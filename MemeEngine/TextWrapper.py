@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+from PIL import ImageFont
+import threading
+
+from .FontRegistry import FontEntry
+
+
+class TextWrapper():
+    """ Wraps caption text to fit a given line length, in linear time.
+
+    Each word of a caption is measured once, and line widths are
+    built up by adding word widths and a cached space width, rather
+    than measuring the whole line again for every word. With a
+    FontEntry the kerning either side of the joining space is taken
+    from its kerning table, so the result is exact. For other fonts
+    the candidate line is measured again only when it is close to
+    the line length, where a line break may happen.
+
+    Word measurements and finished layouts are memoized, keyed by
+    text, font, size and line length, as the same quotes are wrapped
+    again on every random meme.
+
+    Wrapping follows the function shared by Chris Collett on
+    StackOverflow, Apr 21, 2021: https://stackoverflow.com/a/67203353
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """ Construct a new TextWrapper.
+
+        :param max_entries: the maximum number of memoized layouts,
+                            and of memoized word measurements
+        """
+        self.max_entries = max_entries
+        self._layouts = OrderedDict()
+        self._measurements = OrderedDict()
+        self._spaces = {}
+        self._lock = threading.Lock()
+
+    def wrap(self,
+             text: str,
+             font: Union[ImageFont.FreeTypeFont, FontEntry],
+             line_length: float) -> str:
+        """ Wrap the text to fit the given line length. Does not split
+        in the middle of a word.
+
+        :param text: The text to wrap
+        :param font: The font of the text, which affects its size
+        :param line_length: The number of pixels of space for the line
+        :return: A string of wrapped text, containing line breaks
+                 where needed to fit the line length.
+        """
+        font_key = (str(font.path), font.size)
+        key = (text, font_key, line_length)
+        layout = self._get(self._layouts, key)
+        if layout is None:
+            layout = self._layout(text, font, font_key, line_length)
+            self._put(self._layouts, key, layout)
+        return layout
+
+    def _layout(self,
+                text: str,
+                font: Union[ImageFont.FreeTypeFont, FontEntry],
+                font_key: Tuple[str, int],
+                line_length: float) -> str:
+        """ Lay out the text into lines, without memoization of the
+        finished layout.
+        """
+        words, widths = self._measure(text, font, font_key)
+        space = self._space(font, font_key)
+
+        lines = ['']
+        line_words: List[str] = []
+        line_width = 0.0
+        for word, width in zip(words, widths):
+            if not line_words:
+                new_width = width
+            else:
+                adjustment = self._join_adjustment(font,
+                                                   line_words[-1][-1],
+                                                   word[0])
+                new_width = line_width + space + width
+                if adjustment is not None:
+                    new_width += adjustment
+                elif new_width > line_length - space:
+                    # Near a line break: measure the line exactly.
+                    new_width = font.getlength(
+                        ' '.join(line_words + [word]))
+
+            if new_width <= line_length:
+                # Add the word to the end of the current line
+                line_words.append(word)
+                line_width = new_width
+            else:
+                # Start a new line beginning with this word
+                if line_words:
+                    lines[-1] = ' '.join(line_words)
+                lines.append('')
+                line_words = [word]
+                line_width = width
+
+        if line_words:
+            lines[-1] = ' '.join(line_words)
+        return '\n'.join(lines)
+
+    def _measure(self,
+                 text: str,
+                 font: Union[ImageFont.FreeTypeFont, FontEntry],
+                 font_key: Tuple[str, int]
+                 ) -> Tuple[List[str], List[float]]:
+        """ Split the text into words and measure each distinct word
+        once, memoizing the result.
+        """
+        key = (text, font_key)
+        measured = self._get(self._measurements, key)
+        if measured is None:
+            words = text.split()
+            lengths = {}
+            for word in words:
+                if word not in lengths:
+                    lengths[word] = font.getlength(word)
+            measured = (words, [lengths[word] for word in words])
+            self._put(self._measurements, key, measured)
+        return measured
+
+    def _space(self,
+               font: Union[ImageFont.FreeTypeFont, FontEntry],
+               font_key: Tuple[str, int]) -> float:
+        """ Return the cached width of a space in the font. """
+        space = self._spaces.get(font_key)
+        if space is None:
+            space = self._spaces[font_key] = font.getlength(' ')
+        return space
+
+    @staticmethod
+    def _join_adjustment(font: Union[ImageFont.FreeTypeFont, FontEntry],
+                         left: str,
+                         right: str) -> Optional[float]:
+        """ Return the exact kerning adjustment either side of the
+        space joining two words, or None if it cannot be computed
+        without measuring the line.
+        """
+        if not isinstance(font, FontEntry) or not font.use_table:
+            return None
+        if left not in font.advances or right not in font.advances:
+            return None
+        return font.kern(left, ' ') + font.kern(' ', right)
+
+    def _get(self, cache: OrderedDict, key):
+        """ Look up a memoized value, marking it recently used. """
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _put(self, cache: OrderedDict, key, value) -> None:
+        """ Memoize a value, evicting the least recently used value
+        when the cache is full.
+        """
+        with self._lock:
+            cache[key] = value
+            if len(cache) > self.max_entries:
+                cache.popitem(last=False)
@@ -1 +1,5 @@
 from .MemeEngine import MemeEngine
+from .CaptionCache import CaptionCache, CaptionLayer
+from .DerivativeStore import DerivativeStore
+from .MemeCache import MemeCache
+from .OutputStore import OutputStore
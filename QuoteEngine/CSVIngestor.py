@@ -1,36 +1,99 @@
-from typing import List, Union
-import pandas
+from typing import Iterator, Optional, Union
+import csv
 import pathlib
 
-from .IngestorInterface import IngestorInterface
+from .IngestorInterface import ErrorHandler, IngestorInterface
 from .QuoteModel import QuoteModel
 
 
 class CSVIngestor(IngestorInterface):
     """ Subclass of IngestorInterface. Responsible for parsing CSV
     files into a list of quote objects.
+
+    Simple two-column files are read with the standard csv module,
+    without importing pandas. Other files are read with pandas in
+    fixed-size chunks, taking the body and author columns of each
+    chunk as whole vectors, so peak memory is bounded by the chunk
+    size rather than the file size.
     """
     allowed_extensions = ['csv']
+    # Number of rows read by pandas at a time.
+    chunk_size = 100_000
 
     @classmethod
-    def parse(cls, path: Union[str, pathlib.Path]) -> List[QuoteModel]:
-        """ Overrides the parse() method of IngestorInterface. Uses
-        pandas to convert the csv data into dataframe rows, each of
-        which then are converted into quote objects.
+    def iter_parse(cls,
+                   path: Union[str, pathlib.Path],
+                   on_error: Optional[ErrorHandler] = None
+                   ) -> Iterator[QuoteModel]:
+        """ Overrides the iter_parse() method of IngestorInterface.
+        Reads the csv rows, converting the first two columns of each
+        into quote objects.
 
         :param path: the file path
-        :return: a list of QuoteModel objects
+        :param on_error: the handler for rows that cannot be parsed
+        :return: an iterator over QuoteModel objects
         """
         if not cls.can_ingest(path):
             raise Exception('File extension is not of type csv')
 
-        quotes = []
+        on_error = on_error or cls.report_error
         try:
-            df = pandas.read_csv(path, header=0)
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                header = next(csv.reader(f), [])
+            if len(header) == 2:
+                yield from cls._parse_simple(path, on_error)
+            else:
+                yield from cls._parse_chunked(path, on_error)
         except Exception as e:
             raise Exception(f'Error reading CSV file: {e}')
-        else:
-            for index, row in df.iterrows():
-                quotes.append(QuoteModel(row.iloc[0], row.iloc[1]))
 
-        return quotes
+    @classmethod
+    def _parse_simple(cls,
+                      path: Union[str, pathlib.Path],
+                      on_error: ErrorHandler) -> Iterator[QuoteModel]:
+        """ Parse a two-column csv file with the csv module.
+
+        :param path: the file path
+        :param on_error: the handler for rows that cannot be parsed
+        :return: an iterator over QuoteModel objects
+        """
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) != 2:
+                    on_error(path, reader.line_num, ','.join(row),
+                             Exception(f'Expected 2 fields, '
+                                       f'saw {len(row)}'))
+                    continue
+                yield QuoteModel(row[0], row[1])
+
+    @classmethod
+    def _parse_chunked(cls,
+                       path: Union[str, pathlib.Path],
+                       on_error: ErrorHandler) -> Iterator[QuoteModel]:
+        """ Parse a csv file with pandas, in chunks of chunk_size rows.
+        Rows missing a body or author are reported and skipped.
+
+        :param path: the file path
+        :param on_error: the handler for rows that cannot be parsed
+        :return: an iterator over QuoteModel objects
+        """
+        import pandas
+
+        with pandas.read_csv(path, header=0, usecols=[0, 1],
+                             chunksize=cls.chunk_size) as reader:
+            for chunk in reader:
+                missing = chunk.isna().any(axis=1)
+                if missing.any():
+                    for index in chunk.index[missing]:
+                        # Line numbers count the header line.
+                        on_error(path, index + 2,
+                                 ','.join(map(str, chunk.loc[index])),
+                                 Exception('Missing body or author'))
+                    chunk = chunk[~missing]
+                bodies = chunk.iloc[:, 0].tolist()
+                authors = chunk.iloc[:, 1].tolist()
+                yield from map(QuoteModel, bodies, authors)
@@ -0,0 +1,221 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+                               ThreadPoolExecutor
+from typing import ContextManager, List, Optional, Sequence, Tuple, \
+                   Type, Union
+import contextlib
+import multiprocessing
+import os
+import pathlib
+import time
+
+import metrics
+from .Ingestor import Ingestor
+from .PDFIngestor import PDFIngestor
+from .QuoteCache import QuoteCache
+from .QuoteModel import QuoteModel
+from .QuoteStore import QuoteStore
+
+
+class IngestReport():
+    """ The result of ingesting a single quotes file: the number of
+    quotes read, how long it took, and the error if it failed.
+    """
+
+    def __init__(self,
+                 path: pathlib.Path,
+                 count: int = 0,
+                 duration: float = 0.0,
+                 error: Optional[str] = None,
+                 cached: bool = False) -> None:
+        """ Construct a report for one file.
+
+        :param path: the file path
+        :param count: the number of quotes read
+        :param duration: the time taken in seconds
+        :param error: the error message, or None on success
+        :param cached: whether the quotes came from the quote cache
+        """
+        self.path = path
+        self.count = count
+        self.duration = duration
+        self.error = error
+        self.cached = cached
+
+    def __repr__(self) -> str:
+        """ Return a computer-readable string representation of
+        this report.
+
+        :return: string representation of the report
+        """
+        status = f'error={self.error!r}' if self.error \
+            else f'{self.count} quotes'
+        source = ', cached' if self.cached else ''
+        return (f'<{self.path.name}: {status}, '
+                f'{self.duration * 1000:.1f}ms{source}>')
+
+
+def ingest_file(path: pathlib.Path
+                ) -> Tuple[List[QuoteModel], float, Optional[str]]:
+    """ Parse one file and time it. Defined at module level so that it
+    can run in a worker process.
+
+    :param path: the file path
+    :return: the quotes, the parse time in seconds and the error
+             message, or None on success
+    """
+    start = time.perf_counter()
+    try:
+        quotes, error = Ingestor.parse(path), None
+    except Exception as e:
+        quotes, error = [], str(e)
+    return quotes, time.perf_counter() - start, error
+
+
+class DirectoryIngestor():
+    """ Responsible for ingesting every quotes file in a directory
+    concurrently.
+
+    Files are parsed on a pool chosen by format. CPU-heavy formats are
+    parsed on a process pool, once there is enough data for the
+    process start-up cost to pay off. PDFs, whose time is spent
+    waiting on the pdftotext subprocess, are parsed on PDFIngestor's
+    shared worker pool, and other formats on a thread pool. Files
+    that are unchanged in the quote cache are loaded from it without
+    being parsed.
+
+    Every file gets an IngestReport, so one slow or broken file
+    neither blocks nor hides the others.
+
+    Quotes can be added straight to a QuoteStore. Cached quotes are
+    then streamed from the quote cache into the store, and each parsed
+    file's quotes are dropped once they are added, so no list of every
+    quote is built.
+    """
+    # Formats parsed on the process pool.
+    process_extensions = ['csv', 'docx']
+    # Minimum total size of CPU-heavy files to start a process pool.
+    process_min_bytes = 1024 * 1024
+    max_workers = 4
+
+    @classmethod
+    def parse(cls,
+              directory: Union[str, pathlib.Path],
+              cache: Optional[QuoteCache] = None,
+              into: Optional[QuoteStore] = None
+              ) -> Tuple[Sequence[QuoteModel], List[IngestReport]]:
+        """ Parse every file in the directory.
+
+        :param directory: the quotes directory
+        :param cache: the quote cache to load from and update,
+                      defaults to None for no cache
+        :param into: the quote store to add the quotes to, defaults to
+                     None for a new list
+        :return: the quotes from all files, in file name order, and a
+                 report for each file
+        """
+        directory = pathlib.Path(directory)
+        paths = sorted(path for path in directory.iterdir()
+                       if path.is_file())
+        results = {}
+        reports = {}
+
+        pending = []
+        for path in paths:
+            if not Ingestor.can_ingest(path):
+                reports[path] = IngestReport(
+                    path, error='Unsupported file type')
+                continue
+            if cache is not None:
+                start = time.perf_counter()
+                try:
+                    cached = cache.check(path)
+                except Exception as e:
+                    cached = False
+                    print(f'Quote Cache Error:  {path}: {e}')
+                if cached:
+                    # The quotes are streamed from the cache below.
+                    reports[path] = IngestReport(
+                        path, 0, time.perf_counter() - start,
+                        cached=True)
+                    continue
+            pending.append(path)
+
+        process_paths = [path for path in pending
+                         if path.suffix[1:] in cls.process_extensions]
+        if sum(os.path.getsize(p) for p in process_paths) \
+                < cls.process_min_bytes:
+            process_paths = []
+        pdf_paths = [path for path in pending
+                     if PDFIngestor.can_ingest(path)]
+        thread_paths = [path for path in pending
+                        if path not in process_paths and
+                        path not in pdf_paths]
+
+        stats = {path: os.stat(path) for path in pending}
+        with cls._executor(ProcessPoolExecutor, process_paths) as procs, \
+                cls._executor(ThreadPoolExecutor, thread_paths) as threads:
+            futures = {path: procs.submit(ingest_file, path)
+                       for path in process_paths}
+            futures.update({path: threads.submit(ingest_file, path)
+                            for path in thread_paths})
+            futures.update({path: PDFIngestor.pool().submit(ingest_file,
+                                                            path)
+                            for path in pdf_paths})
+
+            for path, future in futures.items():
+                try:
+                    quotes, duration, error = future.result()
+                except Exception as e:
+                    quotes, duration, error = [], 0.0, str(e)
+                reports[path] = IngestReport(path, len(quotes),
+                                             duration, error)
+                if error:
+                    continue
+                results[path] = quotes
+                if cache is not None:
+                    try:
+                        cache.store(path, quotes, stats[path])
+                    except Exception as e:
+                        print(f'Quote Cache Error:  {path}: {e}')
+
+        quotes = [] if into is None else into
+        for path in paths:
+            report = reports[path]
+            if report.cached:
+                start, count = time.perf_counter(), len(quotes)
+                try:
+                    quotes.extend(cache.iter_quotes(path))
+                except Exception as e:
+                    report.error = f'Error reading quote cache: {e}'
+                report.count = len(quotes) - count
+                report.duration += time.perf_counter() - start
+            else:
+                quotes.extend(results.pop(path, []))
+            if report.error is None:
+                file_format = path.suffix[1:].lower()
+                metrics.observe('quotes_ingest_seconds', report.duration,
+                                format=file_format,
+                                cached=str(report.cached).lower())
+                metrics.inc('quotes_ingested_total', report.count,
+                            format=file_format)
+        return quotes, [reports[path] for path in paths]
+
+    @classmethod
+    def _executor(cls,
+                  executor_class: Type[Executor],
+                  paths: List[pathlib.Path]) -> ContextManager:
+        """ Return an executor of the given class sized for the paths,
+        or an empty context if there are none.
+        """
+        if not paths:
+            return contextlib.nullcontext()
+        max_workers = min(cls.max_workers, len(paths))
+        if executor_class is ProcessPoolExecutor:
+            # Spawn, rather than fork, workers, since parsing may start
+            # from a threaded server or the reload watcher, while other
+            # threads hold locks.
+            return executor_class(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn'))
+        return executor_class(max_workers=max_workers)
+
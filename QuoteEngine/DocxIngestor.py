@@ -1,38 +1,170 @@
-from typing import List, Union
-from docx import Document
+from typing import IO, Iterator, List, Optional, Tuple, Union
+from xml.etree import ElementTree
 import pathlib
+import posixpath
+import zipfile
 
-from .IngestorInterface import IngestorInterface
+from .IngestorInterface import ErrorHandler, IngestorInterface
 from .QuoteModel import QuoteModel
 
+# WordprocessingML main namespace, of transitional (not strict) files.
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+RELS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+# Text equivalents of the run content elements, as read by python-docx.
+RUN_TEXT = {f'{W}tab': '\t', f'{W}ptab': '\t', f'{W}cr': '\n',
+            f'{W}noBreakHyphen': '-'}
+
 
 class DocxIngestor(IngestorInterface):
     """ Subclass of IngestorInterface. Responsible for parsing DocX
     files into a list of quote objects.
+
+    The main document part is streamed from the archive with zipfile
+    and parsed incrementally, yielding the text of each top-level
+    paragraph as it ends and then discarding it, so peak memory does
+    not grow with the document. Paragraph text matches python-docx's
+    Paragraph.text. Unusual documents, whose main part cannot be
+    found or is not transitional WordprocessingML, are read with
+    python-docx instead, which is only imported when needed.
     """
     allowed_extensions = ['docx']
 
     @classmethod
-    def parse(cls, path: Union[str, pathlib.Path]) -> List[QuoteModel]:
-        """ Overrides the parse() method of IngestorInterface. Uses
-        docx to read the file line by line, converting each into quote
-        objects.
+    def iter_parse(cls,
+                   path: Union[str, pathlib.Path],
+                   on_error: Optional[ErrorHandler] = None
+                   ) -> Iterator[QuoteModel]:
+        """ Overrides the iter_parse() method of IngestorInterface.
+        Reads the file paragraph by paragraph, converting each into
+        quote objects.
 
         :param path: the file path
-        :return: a list of QuoteModel objects
+        :param on_error: the handler for lines that cannot be parsed
+        :return: an iterator over QuoteModel objects
         """
         if not cls.can_ingest(path):
             raise Exception('File extension is not of type docx.')
 
-        quotes = []
         try:
-            doc = Document(path)
+            paragraphs = cls._stream_paragraphs(path)
+            if paragraphs is None:
+                paragraphs = cls._document_paragraphs(path)
+            yield from cls.quotes_from_lines(path, paragraphs, on_error)
         except Exception as e:
             raise Exception(f'Error reading DocX file: {e}')
-        else:
-            for para in doc.paragraphs:
-                if para.text != '':
-                    parse = para.text.split(' - ')
-                    quotes.append(QuoteModel(parse[0], parse[1]))
 
-        return quotes
+    @classmethod
+    def _stream_paragraphs(cls, path: Union[str, pathlib.Path]
+                           ) -> Optional[Iterator[str]]:
+        """ Start streaming the paragraphs of the main document part.
+
+        :param path: the file path
+        :return: an iterator over the paragraph texts, or None if the
+                 document is unusual and must be read with python-docx
+        """
+        archive = zipfile.ZipFile(path)
+        stream = None
+        try:
+            part = cls._main_part(archive)
+            if part is not None:
+                stream = archive.open(part)
+                events = ElementTree.iterparse(stream,
+                                               events=('start', 'end'))
+                event, root = next(events)
+                if root.tag == f'{W}document':
+                    return cls._paragraphs(archive, stream, events, root)
+        except (KeyError, StopIteration, ElementTree.ParseError):
+            pass
+        except BaseException:
+            if stream is not None:
+                stream.close()
+            archive.close()
+            raise
+        if stream is not None:
+            stream.close()
+        archive.close()
+        return None
+
+    @staticmethod
+    def _main_part(archive: zipfile.ZipFile) -> Optional[str]:
+        """ Find the main document part in the package relationships.
+
+        :param archive: the open DocX archive
+        :return: the part's name in the archive, or None if not found
+        """
+        rels = ElementTree.fromstring(archive.read('_rels/.rels'))
+        for rel in rels.iter(f'{RELS}Relationship'):
+            if rel.get('Type', '').endswith('/officeDocument') and \
+                    rel.get('TargetMode') != 'External':
+                part = posixpath.normpath(rel.get('Target', '')
+                                          .lstrip('/'))
+                if part in archive.namelist():
+                    return part
+        return None
+
+    @staticmethod
+    def _paragraphs(archive: zipfile.ZipFile,
+                    stream: IO[bytes],
+                    events: Iterator[Tuple[str, ElementTree.Element]],
+                    root: ElementTree.Element) -> Iterator[str]:
+        """ Yield the text of each paragraph that is a direct child of
+        the document body, like python-docx's Document.paragraphs.
+        Text is taken from the runs of a paragraph and of its
+        hyperlinks. Elements are cleared as they end.
+
+        :param archive: the open DocX archive, closed when done
+        :param stream: the main document part, closed when done
+        :param events: the incremental parser's remaining events
+        :param root: the document element
+        :return: an iterator over the paragraph texts
+        """
+        # The tags of the open elements, from the document element.
+        tags = [root.tag]
+        body = None
+        text: List[str] = []
+        try:
+            for event, elem in events:
+                if event == 'start':
+                    tags.append(elem.tag)
+                    if len(tags) == 2 and elem.tag == f'{W}body':
+                        body = elem
+                    continue
+
+                depth = len(tags)
+                in_paragraph = depth > 3 and tags[1] == f'{W}body' and \
+                    tags[2] == f'{W}p'
+                if in_paragraph and tags[-2] == f'{W}r' and (
+                        depth == 5 or
+                        (depth == 6 and tags[3] == f'{W}hyperlink')):
+                    if elem.tag == f'{W}t':
+                        text.append(elem.text or '')
+                    elif elem.tag == f'{W}br':
+                        if elem.get(f'{W}type', 'textWrapping') == \
+                                'textWrapping':
+                            text.append('\n')
+                    elif elem.tag in RUN_TEXT:
+                        text.append(RUN_TEXT[elem.tag])
+                tags.pop()
+
+                # Discard each block of the body once it has ended.
+                if depth == 3 and body is not None:
+                    if elem.tag == f'{W}p':
+                        yield ''.join(text)
+                    text = []
+                    body.clear()
+        finally:
+            stream.close()
+            archive.close()
+
+    @staticmethod
+    def _document_paragraphs(path: Union[str, pathlib.Path]
+                             ) -> Iterator[str]:
+        """ Read the paragraphs with python-docx.
+
+        :param path: the file path
+        :return: an iterator over the paragraph texts
+        """
+        from docx import Document
+
+        doc = Document(path)
+        return (para.text for para in doc.paragraphs)
@@ -1,7 +1,7 @@
-from typing import List, Union
+from typing import Iterator, Optional, Union
 import pathlib
 
-from .IngestorInterface import IngestorInterface
+from .IngestorInterface import ErrorHandler, IngestorInterface
 from .CSVIngestor import CSVIngestor
 from .DocxIngestor import DocxIngestor
 from .PDFIngestor import PDFIngestor
@@ -24,15 +24,31 @@ class Ingestor(IngestorInterface):
                  PDFIngestor, TextIngestor]
 
     @classmethod
-    def parse(cls, path: Union[str, pathlib.Path]) -> List[QuoteModel]:
-        """Overrides the parse() method of IngestorInterface. It
+    def can_ingest(cls, path: Union[str, pathlib.Path]) -> bool:
+        """ Overrides the can_ingest() method of IngestorInterface.
+        Checks whether any ingestor subclass supports the file.
+
+        :param path: the file path
+        :return: boolean: whether the file is supported
+        """
+        return any(ingestor.can_ingest(path) for ingestor in cls.ingestors)
+
+    @classmethod
+    def iter_parse(cls,
+                   path: Union[str, pathlib.Path],
+                   on_error: Optional[ErrorHandler] = None
+                   ) -> Iterator[QuoteModel]:
+        """Overrides the iter_parse() method of IngestorInterface. It
         checks the input file against each ingestor subclass's
-        can_parse() method. When it finds an ingestor that can parse
-        the file, it calls that ingestor's parse() method on the file.
+        can_ingest() method. When it finds an ingestor that can parse
+        the file, it yields the quotes from that ingestor's
+        iter_parse() method. Unsupported files yield no quotes.
 
         :param path: a path to a quotes file
-        :return: a list of quotes
+        :param on_error: the handler for lines that cannot be parsed
+        :return: an iterator over quotes
         """
         for ingestor in cls.ingestors:
             if ingestor.can_ingest(path):
-                return ingestor.parse(path)
+                return ingestor.iter_parse(path, on_error)
+        return iter([])
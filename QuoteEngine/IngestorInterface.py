@@ -1,9 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import List, Union
+from typing import Callable, Iterable, Iterator, List, Optional, Union
 import pathlib
+import random
 
 from .QuoteModel import QuoteModel
 
+# Called with (path, line number, line, error) for each line that
+# cannot be parsed into a quote.
+ErrorHandler = Callable[[Union[str, pathlib.Path], int, str, Exception],
+                        None]
+
 
 class IngestorInterface(ABC):
     """ Abstract superclass for different types of file ingestors
@@ -15,8 +21,14 @@ class IngestorInterface(ABC):
     child ingestor classes to suit each specific type of ingestor
     (i.e. csv, pdf, etc).
 
-    The parse() method should be overridden with the filetype-specific
-    implementation to read the given file line by line.
+    The iter_parse() method should be overridden with the
+    filetype-specific implementation to read the given file line by
+    line, yielding quotes as they are read. The parse() method
+    collects them into a list.
+
+    A line that cannot be parsed is passed to an error handler and
+    skipped, instead of failing the whole file. The default handler,
+    report_error(), prints a warning.
     """
     allowed_extensions = []
 
@@ -32,14 +44,100 @@ class IngestorInterface(ABC):
         return ext in cls.allowed_extensions
 
     @classmethod
-    @abstractmethod
-    def parse(cls, path: Union[str, pathlib.Path]) -> List[QuoteModel]:
+    def parse(cls,
+              path: Union[str, pathlib.Path],
+              on_error: Optional[ErrorHandler] = None) -> List[QuoteModel]:
         """ Parse the provided file into a list of quote objects.
 
+        :param path: the file path
+        :param on_error: the handler for lines that cannot be parsed,
+                         defaults to report_error()
+        :return: a list of quotes
+        """
+        return list(cls.iter_parse(path, on_error))
+
+    @classmethod
+    @abstractmethod
+    def iter_parse(cls,
+                   path: Union[str, pathlib.Path],
+                   on_error: Optional[ErrorHandler] = None
+                   ) -> Iterator[QuoteModel]:
+        """ Parse the provided file, yielding quote objects lazily.
+
         Concrete subclasses must override this method with specific
         implementation depending on file type.
 
         :param path: the file path
-        :return: a list of quotes
+        :param on_error: the handler for lines that cannot be parsed,
+                         defaults to report_error()
+        :return: an iterator over the quotes
         """
         raise NotImplementedError
+
+    @classmethod
+    def sample(cls,
+               path: Union[str, pathlib.Path],
+               k: int = 1,
+               rng: Optional[random.Random] = None) -> List[QuoteModel]:
+        """ Choose up to k quotes uniformly at random from the file,
+        using reservoir sampling. Only k quotes are held in memory at
+        a time, however large the file.
+
+        :param path: the file path
+        :param k: the number of quotes to choose, defaults to 1
+        :param rng: the random number generator, defaults to the
+                    random module
+        :return: a list of up to k quotes
+        """
+        rng = rng or random
+        reservoir = []
+        for i, quote in enumerate(cls.iter_parse(path)):
+            if i < k:
+                reservoir.append(quote)
+            else:
+                j = rng.randrange(i + 1)
+                if j < k:
+                    reservoir[j] = quote
+        return reservoir
+
+    @classmethod
+    def report_error(cls,
+                     path: Union[str, pathlib.Path],
+                     line_number: int,
+                     line: str,
+                     error: Exception) -> None:
+        """ The default error handler. Prints a warning for a line
+        that could not be parsed.
+
+        :param path: the file path
+        :param line_number: the line number in the file
+        :param line: the text of the line
+        :param error: the error raised parsing the line
+        """
+        print(f'Ingestor Error:  {path}:{line_number}: {error}: {line!r}')
+
+    @classmethod
+    def quotes_from_lines(cls,
+                          path: Union[str, pathlib.Path],
+                          lines: Iterable[str],
+                          on_error: Optional[ErrorHandler] = None
+                          ) -> Iterator[QuoteModel]:
+        """ Convert lines of the form 'body - author' into quote
+        objects, skipping blank lines and reporting malformed ones.
+
+        :param path: the file path, for error reporting
+        :param lines: the lines of text
+        :param on_error: the handler for lines that cannot be parsed,
+                         defaults to report_error()
+        :return: an iterator over the quotes
+        """
+        on_error = on_error or cls.report_error
+        for line_number, line in enumerate(lines, 1):
+            line = line.strip('\n\r').strip()
+            if len(line) > 0:
+                parse = line.split(" - ")
+                if len(parse) < 2:
+                    on_error(path, line_number, line,
+                             Exception('Expected "body - author"'))
+                    continue
+                yield QuoteModel(parse[0], parse[1])
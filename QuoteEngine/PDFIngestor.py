@@ -1,46 +1,127 @@
-from typing import List, Union
-import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Optional, Union
 import pathlib
-import subprocess
-import random
+import threading
 
-from .IngestorInterface import IngestorInterface
+from .IngestorInterface import ErrorHandler, IngestorInterface
 from .QuoteModel import QuoteModel
 
 
 class PDFIngestor(IngestorInterface):
     """ Subclass of IngestorInterface. Responsible for parsing PDF
     files into a list of quote objects.
+
+    The pdftotext output is read straight from a pipe, without a
+    temporary file, and parsed line by line as it arrives. A
+    conversion that runs longer than the timeout is killed.
+
+    Many PDFs can be parsed at once on a shared worker pool, so the
+    start-up of each pdftotext subprocess overlaps with the others.
     """
     allowed_extensions = ['pdf']
+    # pdftotext command, timeout in seconds and worker pool size.
+    command = 'pdftotext'
+    timeout = 30.0
+    max_workers = 4
+
+    _pool = None
+    _pool_lock = threading.Lock()
 
     @classmethod
-    def parse(cls, path: Union[str, pathlib.Path]) -> List[QuoteModel]:
-        """ Overrides the parse() method of IngestorInterface. Uses
-        subprocess to run XpdfReader to convert the PDF to a temporary
-        text file. Then reads the text file and converts each line into
-        quote objects.
+    def iter_parse(cls,
+                   path: Union[str, pathlib.Path],
+                   on_error: Optional[ErrorHandler] = None
+                   ) -> Iterator[QuoteModel]:
+        """ Overrides the iter_parse() method of IngestorInterface.
+        Uses subprocess to run XpdfReader to convert the PDF to text,
+        then converts each line of its output into quote objects.
 
         :param path: the file path
-        :return: a list of QuoteModel objects
+        :param on_error: the handler for lines that cannot be parsed
+        :return: an iterator over QuoteModel objects
         """
         if not cls.can_ingest(path):
             raise Exception('File extension is not of type pdf')
 
-        quotes = []
-        path = pathlib.Path(path)
-        tmp = path.parent.joinpath(f'{random.randint(0,100000)}.txt')
-
         try:
-            subprocess.run(['pdftotext', '-layout', path, tmp])
-            with open(tmp) as f:
-                for line in f:
-                    line = line.strip('\n\r').strip()
-                    if len(line) > 0:
-                        parse = line.split(" - ")
-                        quotes.append(QuoteModel(parse[0], parse[1]))
-            os.remove(tmp)
+            yield from cls.quotes_from_lines(path, cls.read_lines(path),
+                                             on_error)
         except Exception as e:
             raise Exception(f'Error running subprocess pdftotext: {e}')
 
-        return quotes
+    @classmethod
+    def read_lines(cls, path: Union[str, pathlib.Path]) -> Iterator[str]:
+        """ Run pdftotext on the file and yield its output line by
+        line from the subprocess's stdout pipe.
+
+        The subprocess is killed if it runs longer than the timeout,
+        or if the caller stops reading early.
+
+        :param path: the file path
+        :return: an iterator over the lines of text in the PDF
+        """
+        import subprocess
+
+        proc = subprocess.Popen(
+            [cls.command, '-layout', '-enc', 'UTF-8', str(path), '-'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            proc.kill()
+
+        timer = threading.Timer(cls.timeout, kill)
+        timer.daemon = True
+        timer.start()
+        try:
+            for line in proc.stdout:
+                yield line.decode('utf-8', errors='replace')
+            proc.wait()
+        finally:
+            timer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+
+        if timed_out.is_set():
+            raise Exception(f'pdftotext timed out after {cls.timeout}s')
+        if proc.returncode != 0:
+            raise Exception(f'pdftotext exited with status '
+                            f'{proc.returncode}')
+
+    @classmethod
+    def pool(cls) -> ThreadPoolExecutor:
+        """ Return the shared worker pool, creating it on first use.
+
+        :return: the worker pool
+        """
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=cls.max_workers,
+                        thread_name_prefix='pdftotext')
+        return cls._pool
+
+    @classmethod
+    def submit(cls, path: Union[str, pathlib.Path]) -> Future:
+        """ Parse a file on the shared worker pool.
+
+        :param path: the file path
+        :return: a future for the list of QuoteModel objects
+        """
+        return cls.pool().submit(cls.parse, path)
+
+    @classmethod
+    def parse_many(cls,
+                   paths: List[Union[str, pathlib.Path]]
+                   ) -> List[List[QuoteModel]]:
+        """ Parse many files concurrently on the shared worker pool.
+
+        :param paths: the file paths
+        :return: a list of quotes for each file, in the same order
+        """
+        futures = [cls.submit(path) for path in paths]
+        return [future.result() for future in futures]
@@ -0,0 +1,169 @@
+from typing import Iterator, List, Optional, Union
+import hashlib
+import os
+import pathlib
+import sqlite3
+import threading
+
+from .Ingestor import Ingestor
+from .QuoteModel import QuoteModel
+
+
+class QuoteCache():
+    """ A persistent cache of parsed quotes, stored in an SQLite
+    database.
+
+    Each quotes file is stored with its size, modification time and
+    content hash. A file whose size and modification time are
+    unchanged is loaded straight from the cache. If only its
+    modification time has changed, its content hash is checked before
+    it is re-ingested. Files that have changed are parsed again by the
+    Ingestor and the cache is updated.
+
+    Cached quotes can be streamed from the database with
+    iter_quotes(), so loading them does not build a list of every
+    quote first.
+    """
+    # Rows fetched from the database at a time when streaming quotes.
+    batch_size = 1000
+
+    def __init__(self, db_path: Union[str, pathlib.Path]) -> None:
+        """ Open the cache database, creating it if needed.
+
+        :param db_path: the path to the SQLite database file
+        """
+        self.db_path = pathlib.Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path),
+                                   check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS files ('
+                             'path TEXT PRIMARY KEY, size INTEGER, '
+                             'mtime INTEGER, sha256 TEXT)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS quotes ('
+                             'path TEXT, idx INTEGER, body TEXT, '
+                             'author TEXT, PRIMARY KEY (path, idx))')
+
+    def parse(self, path: Union[str, pathlib.Path]) -> List[QuoteModel]:
+        """ Return the quotes in a file, from the cache if the file is
+        unchanged, otherwise by parsing it with the Ingestor.
+
+        :param path: a path to a quotes file
+        :return: a list of quotes
+        """
+        quotes = self.lookup(path)
+        if quotes is None:
+            st = os.stat(path)
+            quotes = Ingestor.parse(path) or []
+            self.store(path, quotes, st)
+        return quotes
+
+    def lookup(self,
+               path: Union[str, pathlib.Path]) -> Optional[List[QuoteModel]]:
+        """ Return the cached quotes for a file, or None if the file
+        is not cached or has changed since it was cached.
+
+        :param path: a path to a quotes file
+        :return: a list of quotes, or None
+        """
+        if not self.check(path):
+            return None
+        return list(self.iter_quotes(path))
+
+    def check(self, path: Union[str, pathlib.Path]) -> bool:
+        """ Check whether a file's quotes are cached and the file is
+        unchanged since, so they can be read with iter_quotes().
+
+        :param path: a path to a quotes file
+        :return: whether the cached quotes are up to date
+        """
+        key = self._key(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT size, mtime, sha256 FROM files WHERE path = ?',
+                (key,)).fetchone()
+            if row is None or row[0] != st.st_size:
+                self.misses += 1
+                return False
+            if row[1] != st.st_mtime_ns:
+                # Touched but possibly unchanged; compare contents.
+                if row[2] != self._hash(path):
+                    self.misses += 1
+                    return False
+                with self._db:
+                    self._db.execute(
+                        'UPDATE files SET mtime = ? WHERE path = ?',
+                        (st.st_mtime_ns, key))
+            self.hits += 1
+        return True
+
+    def iter_quotes(self,
+                    path: Union[str, pathlib.Path]) -> Iterator[QuoteModel]:
+        """ Stream the cached quotes for a file from the database, in
+        batches of batch_size rows, without checking that the file is
+        unchanged.
+
+        :param path: a path to a quotes file
+        :return: an iterator over the cached quotes
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                'SELECT body, author FROM quotes WHERE path = ? '
+                'ORDER BY idx', (self._key(path),))
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                for body, author in rows:
+                    yield QuoteModel(body, author)
+        finally:
+            cursor.close()
+
+    def store(self,
+              path: Union[str, pathlib.Path],
+              quotes: List[QuoteModel],
+              st: Optional[os.stat_result] = None) -> None:
+        """ Store the parsed quotes for a file in the cache.
+
+        :param path: a path to a quotes file
+        :param quotes: the quotes parsed from the file
+        :param st: the stat of the file taken before it was parsed,
+                   defaults to a new stat
+        """
+        key = self._key(path)
+        if st is None:
+            st = os.stat(path)
+        digest = self._hash(path)
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM quotes WHERE path = ?', (key,))
+            self._db.executemany(
+                'INSERT INTO quotes VALUES (?, ?, ?, ?)',
+                ((key, i, quote.body, quote.author)
+                 for i, quote in enumerate(quotes)))
+            self._db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                (key, st.st_size, st.st_mtime_ns, digest))
+
+    def close(self) -> None:
+        """ Close the cache database. """
+        self._db.close()
+
+    @staticmethod
+    def _key(path: Union[str, pathlib.Path]) -> str:
+        """ Return the cache key for a file path. """
+        return str(pathlib.Path(path).resolve())
+
+    @staticmethod
+    def _hash(path: Union[str, pathlib.Path]) -> str:
+        """ Return the SHA-256 hash of a file's content. """
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
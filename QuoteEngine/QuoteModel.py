@@ -1,4 +1,8 @@
 class QuoteModel():
+    """ A quote, made up of the text body of the quote and its
+    author. Instances use __slots__ to keep them small.
+    """
+    __slots__ = ('body', 'author')
 
     def __init__(self, body: str, author: str) -> None:
         """ Construct a Quote object containing the text body
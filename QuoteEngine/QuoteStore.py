@@ -0,0 +1,101 @@
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List, Optional
+import random
+
+from .QuoteModel import QuoteModel
+
+
+class QuoteStore(Sequence):
+    """ A compact, read-mostly collection of quotes.
+
+    Quote bodies are stored back to back as UTF-8 in a single buffer,
+    indexed by an array of offsets. Authors are interned in a table,
+    and each quote stores only the index of its author. A QuoteModel
+    is only built when a quote is accessed, so the store holds no
+    per-quote Python objects.
+
+    The store is a Sequence, so random.choice() and iteration work
+    as they do for a list of quotes. random() picks a quote uniformly
+    in constant time.
+    """
+
+    def __init__(self, quotes: Iterable[QuoteModel] = ()) -> None:
+        """ Construct a new QuoteStore holding the given quotes.
+
+        :param quotes: the quotes to store
+        """
+        self._bodies = bytearray()
+        self._offsets = array('Q', [0])
+        self._author_ids = array('I')
+        self._authors: List[Any] = []
+        self._author_index: Dict[Any, int] = {}
+        self.extend(quotes)
+
+    def __len__(self) -> int:
+        """ Return the number of quotes in the store. """
+        return len(self._author_ids)
+
+    def __getitem__(self, index: int) -> QuoteModel:
+        """ Build the quote at the given index.
+
+        :param index: the index of the quote
+        :return: the quote
+        """
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('QuoteStore index out of range')
+        body = self._bodies[self._offsets[index]:self._offsets[index + 1]]
+        author = self._authors[self._author_ids[index]]
+        return QuoteModel(body.decode('utf-8'), author)
+
+    def append(self, quote: QuoteModel) -> None:
+        """ Add a quote to the end of the store.
+
+        :param quote: the quote to add
+        """
+        # Drop the quote marks QuoteModel adds; they are added back
+        # when the quote is built.
+        self._bodies += quote.body[1:-1].encode('utf-8')
+        self._offsets.append(len(self._bodies))
+
+        author_id = self._author_index.get(quote.author)
+        if author_id is None:
+            author_id = len(self._authors)
+            self._authors.append(quote.author)
+            self._author_index[quote.author] = author_id
+        self._author_ids.append(author_id)
+
+    def extend(self, quotes: Iterable[QuoteModel]) -> None:
+        """ Add quotes to the end of the store.
+
+        :param quotes: the quotes to add
+        """
+        for quote in quotes:
+            self.append(quote)
+
+    def random(self, rng: Optional[random.Random] = None) -> QuoteModel:
+        """ Choose a quote uniformly at random.
+
+        :param rng: the random number generator, defaults to the
+                    random module
+        :return: the chosen quote
+        """
+        if not len(self):
+            raise IndexError('Cannot choose from an empty QuoteStore')
+        return self[(rng or random).randrange(len(self))]
+
+    @property
+    def authors(self) -> List[Any]:
+        """ The distinct authors in the store. """
+        return list(self._authors)
+
+    @property
+    def nbytes(self) -> int:
+        """ The number of bytes used by the store's packed buffers. """
+        return (len(self._bodies)
+                + self._offsets.itemsize * len(self._offsets)
+                + self._author_ids.itemsize * len(self._author_ids))
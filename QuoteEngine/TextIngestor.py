@@ -1,7 +1,7 @@
-from typing import List, Union
+from typing import Iterator, Optional, Union
 import pathlib
 
-from .IngestorInterface import IngestorInterface
+from .IngestorInterface import ErrorHandler, IngestorInterface
 from .QuoteModel import QuoteModel
 
 
@@ -12,25 +12,22 @@ class TextIngestor(IngestorInterface):
     allowed_extensions = ['txt']
 
     @classmethod
-    def parse(cls, path: Union[str, pathlib.Path]) -> List[QuoteModel]:
-        """ Overrides the parse() method of IngestorInterface. Reads
-        the text file and converts each line into quote objects.
+    def iter_parse(cls,
+                   path: Union[str, pathlib.Path],
+                   on_error: Optional[ErrorHandler] = None
+                   ) -> Iterator[QuoteModel]:
+        """ Overrides the iter_parse() method of IngestorInterface.
+        Reads the text file and converts each line into quote objects.
 
         :param path: the file path
-        :return: a list of QuoteModel objects
+        :param on_error: the handler for lines that cannot be parsed
+        :return: an iterator over QuoteModel objects
         """
         if not cls.can_ingest(path):
             raise Exception('File extension is not of type txt')
 
-        quotes = []
         try:
             with open(path, encoding='utf-8-sig') as f:
-                for line in f:
-                    line = line.strip('\n\r').strip()
-                    if len(line) > 0:
-                        parse = line.split(" - ")
-                        quotes.append(QuoteModel(parse[0], parse[1]))
+                yield from cls.quotes_from_lines(path, f, on_error)
         except Exception as e:
             raise Exception(f'Error reading text file: {e}')
-
-        return quotes
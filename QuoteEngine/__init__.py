@@ -1,2 +1,5 @@
 from .Ingestor import Ingestor
 from .QuoteModel import QuoteModel
+from .QuoteCache import QuoteCache
+from .DirectoryIngestor import DirectoryIngestor, IngestReport
+from .QuoteStore import QuoteStore
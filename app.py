@@ -1,45 +1,99 @@
-from typing import Union
+from typing import List, Optional, Union
 from constants import ROOT_DIR, STATIC_DIR, QUOTES_DIR, \
-                      IMAGES_DIR, TEMP_DIR
-from flask import Flask, render_template, request
-import random
+                      IMAGES_DIR, QUOTE_CACHE_FILE, \
+                      RELOAD_INTERVAL, DOWNLOAD_CACHE_DIR, \
+                      DOWNLOAD_CACHE_MAX_BYTES, DOWNLOAD_CACHE_MAX_AGE, \
+                      OUTPUT_MAX_BYTES, OUTPUT_MAX_AGE, MEME_ENCODER, \
+                      DERIVATIVES_DIR, POOL_DEPTH, POOL_RATE, \
+                      RENDER_WORKERS, RENDER_QUEUE, RENDER_TIMEOUT, \
+                      RETRY_AFTER, STABLE_CAPTIONS
+from flask import Flask, Response, g, render_template, request
+import base64
+import functools
 import os
-import requests
+import pathlib
+import threading
+import time
+
+import metrics
+from MemeEngine import DerivativeStore, MemeEngine, OutputStore
+from QuoteEngine import DirectoryIngestor, QuoteCache, QuoteStore
+from downloader import ImageDownloader
+from prerender import MemePool
+from profiling import profiler
+from serving import RenderPool, RenderPoolFull, rng
+from watcher import Changes, DirectoryWatcher
+
+
+def build_engine() -> MemeEngine:
+    """ Build the app's meme engine. Render worker processes call it
+    to build their own engine.
+
+    :return: A meme engine writing to the static directory
+    """
+    return MemeEngine(STATIC_DIR,
+                      store=OutputStore(STATIC_DIR, OUTPUT_MAX_BYTES,
+                                        OUTPUT_MAX_AGE),
+                      encoder=MEME_ENCODER,
+                      derivatives=DerivativeStore(DERIVATIVES_DIR,
+                                                  IMAGES_DIR))
 
-from MemeEngine import MemeEngine
-from QuoteEngine import Ingestor
 
 app = Flask(__name__)
-meme = MemeEngine(STATIC_DIR)
+meme = build_engine()
+downloader = ImageDownloader(DOWNLOAD_CACHE_DIR,
+                             cache_max_bytes=DOWNLOAD_CACHE_MAX_BYTES,
+                             cache_max_age=DOWNLOAD_CACHE_MAX_AGE)
+render_pool = None
+if RENDER_WORKERS > 0:
+    render_pool = RenderPool(build_engine, RENDER_WORKERS, RENDER_QUEUE,
+                             RENDER_TIMEOUT, RETRY_AFTER)
 
 
 def setup():
     """ Load all quotes and image resources used for random meme
     generation. Search the quotes and images directories for
-    supported file types and compile lists of the resources. For
-    quotes, call the QuoteEngine module to parse the contents of
-    the quotes files.
+    supported file types and compile lists of the resources.
 
-    :return: A list of quote objects and a list of image paths
+    :return: A store of quote objects and a list of image paths
     """
+    return load_quotes(), load_images()
+
 
-    # Parse all quotes files and save as a list of quotes.
-    quotes = []
-    for item in os.listdir(QUOTES_DIR):
-        file_path = QUOTES_DIR.joinpath(item)
-        if os.path.isfile(file_path):
-            try:
-                quotes.extend(Ingestor.parse(file_path))
-            except Exception as e:
-                print(f'Ingestor Error:  {e}')
+def load_quotes() -> QuoteStore:
+    """ Load the quotes used for random meme generation. Call the
+    QuoteEngine module to parse the contents of the quotes files
+    concurrently, adding the quotes straight to a QuoteStore.
+    Unchanged quotes files are streamed from the compiled quote cache
+    instead of being parsed again.
+
+    :return: A store of quote objects
+    """
+    # Parse all quotes files and save as a compact store of quotes.
+    corpus = QuoteCache(QUOTE_CACHE_FILE)
+    quotes, report = DirectoryIngestor.parse(QUOTES_DIR, corpus,
+                                             QuoteStore())
+    corpus.close()
+    for item in report:
+        if item.error:
+            print(f'Ingestor Error:  {item.path.name}: {item.error}')
 
     # Alert if no quotes could be loaded.
     if not quotes:
         print('Warning: No Default Quotes!')
 
+    return quotes
+
+
+def load_images() -> List[pathlib.Path]:
+    """ Find the images used for random meme generation, and build
+    any missing or stale pre-resized copies of them.
+
+    :return: A list of image paths
+    """
     # Get list of all paths for default meme images.
     imgs = []
-    for item in os.listdir(IMAGES_DIR):
+    for item in sorted(os.listdir(IMAGES_DIR)):
         file_path = IMAGES_DIR.joinpath(item)
         valid_extensions = ['.jpg', '.jpeg', '.png', '.svg', '.webp']
         if file_path.suffix in valid_extensions:
@@ -49,15 +103,191 @@ def setup():
     if not imgs:
         print('Warning: No Default Images!')
 
-    return quotes, imgs
+    meme.build_derivatives(imgs)
+    return imgs
+
+
+resources = None
+resources_lock = threading.Lock()
+watcher = None
 
 
-quotes, imgs = setup()
+def init_app():
+    """ Startup hook that loads the quote and image resources, once
+    per process. It runs before the first request is handled, rather
+    than when the module is imported, so that importing the app stays
+    fast. Servers that preload the app can call it explicitly.
+
+    It also starts a background watcher that reloads the resources
+    when files in the quotes or images directories change, unless
+    RELOAD_INTERVAL is 0, and the pool that renders random memes
+    ahead of time, unless POOL_DEPTH is 0.
+
+    :return: A store of quote objects and a list of image paths
+    """
+    global resources, watcher
+    if resources is None:
+        with resources_lock:
+            if resources is None:
+                # Snapshot the directories before loading, so changes
+                # made during loading are picked up by the watcher.
+                if RELOAD_INTERVAL > 0:
+                    watcher = DirectoryWatcher([QUOTES_DIR, IMAGES_DIR],
+                                               reload_resources,
+                                               RELOAD_INTERVAL)
+                resources = setup()
+                if watcher is not None:
+                    watcher.start()
+                pool.start()
+    return resources
+
+
+def reload_resources(changes: Changes) -> None:
+    """ Reload the resources in the directories that changed, and
+    swap them in atomically. Requests in progress keep using the
+    resources they started with. Only quotes files that changed are
+    parsed again; the rest are loaded from the compiled quote cache.
+
+    :param changes: the changed files in each directory
+    """
+    global resources
+    with resources_lock:
+        quotes, imgs = resources
+        if QUOTES_DIR in changes:
+            quotes = load_quotes()
+        if IMAGES_DIR in changes:
+            imgs = load_images()
+        resources = (quotes, imgs)
+    pool.clear()
+
+
+def render(method: str, *args, **kwargs):
+    """ Call a meme engine method, in the render pool if there is
+    one, or else on the current thread.
+
+    :param method: the name of the engine method, such as 'make_meme'
+    :return: the method's result
+    """
+    if render_pool is not None:
+        return render_pool.call(method, *args, **kwargs)
+    return getattr(meme, method)(*args, **kwargs)
+
+
+def caption_seed(body: str, author: str) -> Optional[int]:
+    """ Return the caption position seed for a meme of the quote.
+
+    :param body: the body of the quote
+    :param author: the author of the quote
+    :return: a seed derived from the quote if STABLE_CAPTIONS is set,
+             so repeated memes are deduplicated, or None for a new
+             random position
+    """
+    if STABLE_CAPTIONS:
+        return MemeEngine.caption_seed(body, author)
+    return None
+
+
+def random_meme(idle_only: bool = False) -> Optional[pathlib.Path]:
+    """ Make a meme from a random image and quote.
+
+    :param idle_only: whether to skip the meme if the render pool has
+                      no idle worker, so that rendering ahead of time
+                      never takes capacity requests need, defaults to
+                      False
+    :return: The path of the meme, or None if it was skipped
+    """
+    quotes, imgs = resources
+    if not quotes or not imgs:
+        raise Exception('No default quotes or images')
+    img = rng().choice(imgs)
+    quote = quotes.random(rng())
+    args = (img, quote.body, quote.author)
+    seed = caption_seed(quote.body, quote.author)
+    if idle_only and render_pool is not None:
+        return render_pool.call_idle('make_meme', *args, seed=seed)
+    return render('make_meme', *args, seed=seed)
+
+
+pool = MemePool(functools.partial(random_meme, idle_only=True),
+                POOL_DEPTH, POOL_RATE)
+
+metrics.registry.gauge('meme_output_store_bytes',
+                       lambda: meme.store.current_bytes)
+metrics.registry.gauge('meme_pool_ready', lambda: len(pool))
+if render_pool is None:
+    metrics.registry.gauge('meme_image_cache_bytes',
+                           lambda: meme.image_cache.current_bytes)
+else:
+    # Each worker has its own image cache, which is not reported.
+    metrics.registry.gauge('meme_render_pool_pending',
+                           lambda: render_pool.pending)
+
+
+@app.before_request
+def start_timing():
+    """ Start timing the request and collecting its stage timings. """
+    g.start_time = time.perf_counter()
+    metrics.registry.start_request()
+
+
+@app.before_request
+def load_resources():
+    """ Make sure resources are loaded before handling a request. """
+    init_app()
+
+
+@app.after_request
+def add_server_timing(response: Response) -> Response:
+    """ Record the request's latency, and report the time spent in
+    each stage in the Server-Timing header.
+    """
+    if not metrics.registry.enabled:
+        return response
+    duration = time.perf_counter() - g.start_time
+    metrics.observe('meme_request_seconds', duration,
+                    endpoint=request.endpoint or 'unknown',
+                    status=str(response.status_code))
+    server_timing = metrics.registry.end_request()
+    total = f'total;dur={duration * 1000:.2f}'
+    response.headers['Server-Timing'] = \
+        f'{server_timing}, {total}' if server_timing else total
+    return response
+
+
+@app.errorhandler(RenderPoolFull)
+def render_pool_full(error: RenderPoolFull) -> Response:
+    """ Reject a request that the render pool cannot admit, telling
+    the client when to retry.
+    """
+    response = Response('The server is busy, please try again shortly.\n',
+                        status=503, mimetype='text/plain')
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+@app.route('/metrics')
+def show_metrics():
+    """ Report the app's metrics in the Prometheus text format. """
+    if not metrics.registry.enabled:
+        return Response('Metrics are disabled.\n', status=404,
+                        mimetype='text/plain')
+    return Response(metrics.registry.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+def request_params() -> dict:
+    """ Return the parameters of the current request, recorded with
+    its profile.
+    """
+    return {'method': request.method, 'path': request.path,
+            'values': request.values.to_dict()}
 
 
 @app.route('/')
+@profiler.sampled('meme_rand', request_params)
 def meme_rand():
     """ Generate a random meme. """
+    quotes, imgs = init_app()
 
     # If no default quotes or images could be found,
     # load the create meme page instead.
@@ -65,13 +295,18 @@ def meme_rand():
         print('Warning: No Default Quotes or Images!')
         return render_template('meme_form.html')
 
-    # Use a random image and quote to create a meme.
-    img = random.choice(imgs)
-    quote = random.choice(quotes)
+    # Take a meme rendered ahead of time, if it has not since been
+    # evicted, or use a random image and quote to create one.
+    path = pool.get()
+    if path is not None and not meme.store.touch(path):
+        path = None
     rel_path = None
     try:
-        path = meme.make_meme(img, quote.body, quote.author)
+        if path is None:
+            path = random_meme()
         rel_path = path.relative_to(ROOT_DIR)
+    except RenderPoolFull:
+        raise
     except Exception as e:
         print(f'Error making meme: {e}')
 
@@ -85,6 +320,7 @@ def meme_form():
 
 
 @app.route('/create', methods=['POST'])
+@profiler.sampled('meme_post', request_params)
 def meme_post():
     """ Create a user defined meme. """
 
@@ -99,24 +335,31 @@ def meme_post():
         return render_template('meme_form.html', error_message=error)
 
     # Retrieve the user's image.
-    r = requests.get(img_url)
-    tmp_img = TEMP_DIR.joinpath(f'{random.randint(1, 1000000)}.png')
-    with open(tmp_img, 'wb') as f:
-        f.write(r.content)
-
-    # Convert the image to a meme.
-    rel_path = None
     try:
-        path = meme.make_meme(tmp_img, quote_body, quote_author)
-        rel_path = path.relative_to(ROOT_DIR)
+        img_content = downloader.fetch(img_url)
+    except Exception as e:
+        print(f'Error downloading image: {e}')
+        return render_template('meme_form.html',
+                               error_message=f'Unable to use image: {e}')
+
+    # Convert the image to a meme in memory, and embed it in the page
+    # as a data URI, so nothing is written to disk. With stable
+    # captions, the same form posted again is served from the engine's
+    # meme cache.
+    data_uri = None
+    try:
+        buffer = render('make_meme_bytes', img_content, quote_body,
+                        quote_author,
+                        seed=caption_seed(quote_body, quote_author))
+        encoded = base64.b64encode(buffer.getvalue()).decode('ascii')
+        data_uri = f'data:{meme.mime_type};base64,{encoded}'
+    except RenderPoolFull:
+        raise
     except Exception as e:
         print(f'Error making meme: {e}')
 
-    # Remove the temporary image.
-    os.remove(tmp_img)
-
-    # Render the template with the new meme path.
-    return render_template('meme.html', path=rel_path)
+    # Render the template with the new meme.
+    return render_template('meme.html', path=data_uri)
 
 
 def validate_form_inputs(img_url: str,
@@ -136,4 +379,5 @@ def validate_form_inputs(img_url: str,
 
 
 if __name__ == "__main__":
+    init_app()
     app.run()
@@ -0,0 +1,84 @@
+""" Benchmark for putting one caption on many images.
+
+Compares MemeEngine.make_memes, which wraps and rasterizes the caption
+once and composites it onto every image, with calling make_meme in a
+loop, where each meme gets its own random caption position and so
+its own caption layer. The loop is also timed with the caption layer
+cache turned off. Memes are written as balanced JPEGs to a temporary
+directory, from the bundled dog photos resized and repeated to the
+batch size. Each copy has one pixel changed and each run uses new
+seeds, so no meme is served from an existing file.
+
+Run from the project root with:
+
+    python -m benchmarks.bench_batch [--size N]
+"""
+import argparse
+import itertools
+import tempfile
+import time
+
+from constants import IMAGES_DIR
+from MemeEngine import MemeEngine
+
+CAPTION = ('To bork or not to bork, that is the question. '
+           'He who smelt it dealt it, said the wise old dog.')
+AUTHOR = 'Rex'
+DEFAULT_SIZE = 48
+REPEAT = 3
+
+
+def run(size: int = DEFAULT_SIZE) -> dict:
+    """ Run the benchmark and return the best time in seconds to make
+    a batch of memes, keyed by method.
+    """
+    photos = [MemeEngine.load_image(path, 500)
+              for path in sorted(IMAGES_DIR.glob('*.jpg'))]
+    imgs = []
+    for index, photo in enumerate(
+            itertools.islice(itertools.cycle(photos), size)):
+        img = photo.copy()
+        img.putpixel((0, 0), (index % 256, index // 256, 0))
+        imgs.append(img)
+    seeds = itertools.count()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engines = {
+            'loop, no caption cache': MemeEngine(tmp_dir,
+                                                 encoder='balanced',
+                                                 caption_bytes=0),
+            'loop': MemeEngine(tmp_dir, encoder='balanced'),
+            'batch': MemeEngine(tmp_dir, encoder='balanced'),
+        }
+        for method, meme in engines.items():
+            timings = []
+            for _ in range(REPEAT):
+                start = time.perf_counter()
+                if method == 'batch':
+                    meme.make_memes(imgs, CAPTION, AUTHOR,
+                                    seed=next(seeds))
+                else:
+                    for img in imgs:
+                        meme.make_meme(img, CAPTION, AUTHOR,
+                                       seed=next(seeds))
+                timings.append(time.perf_counter() - start)
+            results[method] = min(timings)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Time one caption on many images.')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE,
+                        help='the number of images in the batch')
+    args = parser.parse_args()
+
+    results = run(args.size)
+    baseline = results['loop, no caption cache']
+    print(f'{"method":>24} {"batch":>10} {"per meme":>10} '
+          f'{"memes/s":>8} {"speedup":>8}')
+    for method, seconds in results.items():
+        print(f'{method:>24} {seconds * 1000:>8.1f}ms '
+              f'{seconds / args.size * 1000:>8.2f}ms '
+              f'{args.size / seconds:>8.1f} '
+              f'{baseline / seconds:>7.2f}x')
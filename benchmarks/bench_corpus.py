@@ -0,0 +1,66 @@
+""" Benchmark for loading the quote corpus.
+
+Reports the time to load every quotes file in QUOTES_DIR by parsing
+each file with the Ingestor, on a cold start with an empty compiled
+quote cache, and on a warm start from the populated cache.
+
+Run from the project root with:
+
+    python -m benchmarks.bench_corpus
+"""
+import os
+import pathlib
+import tempfile
+import time
+
+from constants import QUOTES_DIR
+from QuoteEngine import Ingestor, QuoteCache
+
+
+def load(parse) -> int:
+    """ Parse every quotes file with the given function and return
+    the number of quotes loaded.
+    """
+    quotes = []
+    for item in os.listdir(QUOTES_DIR):
+        file_path = QUOTES_DIR.joinpath(item)
+        if os.path.isfile(file_path):
+            try:
+                quotes.extend(parse(file_path) or [])
+            except Exception as e:
+                print(f'Ingestor Error:  {e}')
+    return len(quotes)
+
+
+def timed(func):
+    """ Return the result and the duration in seconds of a call. """
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def run() -> dict:
+    """ Run the benchmark and return the timings in seconds. """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = pathlib.Path(tmp).joinpath('quotes.sqlite3')
+
+        count, uncached = timed(lambda: load(Ingestor.parse))
+
+        corpus = QuoteCache(db_path)
+        _, cold = timed(lambda: load(corpus.parse))
+        corpus.close()
+
+        corpus = QuoteCache(db_path)
+        _, warm = timed(lambda: load(corpus.parse))
+        corpus.close()
+
+    return {'quotes': count, 'uncached': uncached,
+            'cold': cold, 'warm': warm}
+
+
+if __name__ == '__main__':
+    results = run()
+    print(f'Loaded {results["quotes"]} quotes from {QUOTES_DIR}')
+    print(f'  no cache:   {results["uncached"] * 1000:8.2f}ms')
+    print(f'  cold cache: {results["cold"] * 1000:8.2f}ms')
+    print(f'  warm cache: {results["warm"] * 1000:8.2f}ms')
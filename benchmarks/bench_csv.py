@@ -0,0 +1,90 @@
+""" Benchmark for CSV quote ingestion.
+
+Generates a large synthetic two-column quotes export and compares the
+original DataFrame.iterrows() parser with the csv module path and the
+chunked pandas path of the CSVIngestor, reporting time per row and
+peak traced memory.
+
+Run from the project root with:
+
+    python -m benchmarks.bench_csv [rows]
+"""
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from QuoteEngine.CSVIngestor import CSVIngestor
+from QuoteEngine.QuoteModel import QuoteModel
+
+DEFAULT_ROWS = 1_000_000
+# The original parser is slow, so it is timed on fewer rows.
+ORIGINAL_ROWS = 50_000
+
+
+def original_parse(path):
+    """ The original parser, walking the DataFrame with iterrows(). """
+    import pandas
+    df = pandas.read_csv(path, header=0)
+    return [QuoteModel(row.iloc[0], row.iloc[1])
+            for index, row in df.iterrows()]
+
+
+def parse_simple(path):
+    """ Parse a file with the csv module path of the CSVIngestor. """
+    return list(CSVIngestor._parse_simple(path, CSVIngestor.report_error))
+
+
+def parse_chunked(path):
+    """ Parse a file with the chunked pandas path of the CSVIngestor.
+    """
+    return list(CSVIngestor._parse_chunked(path, CSVIngestor.report_error))
+
+
+def write_csv(path: pathlib.Path, rows: int) -> None:
+    """ Write a synthetic quotes file with the given number of rows. """
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('body,author\n')
+        for i in range(rows):
+            f.write(f'"Chase the mailman, number {i}",'
+                    f'Skittle {i % 100}\n')
+
+
+def measure(func, path) -> dict:
+    """ Return the duration and peak traced memory of parsing a file.
+    Memory is traced in a separate run, so tracing does not inflate
+    the timing.
+    """
+    start = time.perf_counter()
+    count = len(func(path))
+    duration = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'rows': count, 'seconds': duration, 'peak_bytes': peak}
+
+
+def run(rows: int = DEFAULT_ROWS) -> dict:
+    """ Run the benchmark and return the measurements by parser. """
+    with tempfile.TemporaryDirectory() as tmp:
+        small = pathlib.Path(tmp).joinpath('small.csv')
+        large = pathlib.Path(tmp).joinpath('large.csv')
+        write_csv(small, min(rows, ORIGINAL_ROWS))
+        write_csv(large, rows)
+        return {
+            'iterrows': measure(original_parse, small),
+            'csv module': measure(parse_simple, large),
+            'pandas chunked': measure(parse_chunked, large),
+        }
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    for name, result in run(rows).items():
+        per_row = result['seconds'] / result['rows'] * 1e6
+        print(f'{name:>15}: {result["rows"]:>9} rows '
+              f'{result["seconds"]:8.2f}s {per_row:7.2f}us/row '
+              f'peak {result["peak_bytes"] / 2 ** 20:8.1f} MiB')
@@ -0,0 +1,117 @@
+""" Benchmark for decoding and downscaling large images.
+
+Writes a large synthetic JPEG and PNG, then loads each at the default
+500px meme width with the original full decode and NEAREST resize,
+and with MemeEngine.load_image, which decodes JPEGs at a reduced
+scale and reduces other images before resampling them. Each load runs
+in a fresh process, so that its peak resident memory can be measured.
+
+Run from the project root with:
+
+    python -m benchmarks.bench_decode [megapixels]
+"""
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+from constants import IMAGES_DIR
+
+ROOT_DIR = pathlib.Path(__file__).parent.parent
+DEFAULT_MEGAPIXELS = 24
+WIDTH = 500
+REPEAT = 3
+
+CHILD = '''
+import json, resource, sys, time
+from PIL import Image
+from MemeEngine import MemeEngine
+
+path, variant, width, repeat = sys.argv[1:3] + [int(a) for a in sys.argv[3:]]
+
+
+def original():
+    with Image.open(path) as im:
+        im.load()
+        return im.resize((width, int(im.height * width / im.width)),
+                         Image.NEAREST)
+
+
+loaders = {
+    'original NEAREST': original,
+    'load_image NEAREST': lambda: MemeEngine.load_image(
+        path, width, Image.NEAREST),
+    'load_image BICUBIC': lambda: MemeEngine.load_image(
+        path, width, Image.BICUBIC),
+    'load_image LANCZOS': lambda: MemeEngine.load_image(path, width),
+}
+load = loaders[variant]
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+times = []
+for _ in range(repeat):
+    start = time.perf_counter()
+    load()
+    times.append(time.perf_counter() - start)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+scale = 1 if sys.platform == 'darwin' else 1024
+print(json.dumps({'seconds': min(times), 'bytes': (peak - base) * scale}))
+'''
+
+VARIANTS = ['original NEAREST', 'load_image NEAREST',
+            'load_image BICUBIC', 'load_image LANCZOS']
+
+MAKE_INPUTS = '''
+import sys
+from PIL import Image
+
+source, directory = sys.argv[1:3]
+megapixels = float(sys.argv[3])
+with Image.open(source) as im:
+    side = int((megapixels * 1e6 * im.width / im.height) ** 0.5)
+    large = im.convert('RGB').resize(
+        (side, int(side * im.height / im.width)), Image.BICUBIC)
+large.save(f'{directory}/large.jpg', quality=90)
+large.save(f'{directory}/large.png', compress_level=1)
+'''
+
+
+def make_inputs(directory: pathlib.Path, megapixels: float) -> dict:
+    """ Write a large JPEG and PNG, upscaled from a bundled photo.
+
+    They are written by a separate process, since a child process
+    starts with its parent's peak memory on some platforms.
+    """
+    source = sorted(IMAGES_DIR.glob('*.jpg'))[0]
+    subprocess.run([sys.executable, '-c', MAKE_INPUTS, str(source),
+                    str(directory), str(megapixels)], check=True)
+    return {'jpeg': directory.joinpath('large.jpg'),
+            'png': directory.joinpath('large.png')}
+
+
+def run(megapixels: float = DEFAULT_MEGAPIXELS) -> dict:
+    """ Run the benchmark and return the best load time in seconds and
+    the peak memory growth in bytes for each input and loader.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for kind, path in make_inputs(pathlib.Path(tmp_dir),
+                                      megapixels).items():
+            for variant in VARIANTS:
+                result = subprocess.run(
+                    [sys.executable, '-c', CHILD, str(path), variant,
+                     str(WIDTH), str(REPEAT)],
+                    capture_output=True, text=True, cwd=ROOT_DIR,
+                    check=True)
+                results[f'{kind} {variant}'] = json.loads(
+                    result.stdout.strip().splitlines()[-1])
+    return results
+
+
+if __name__ == '__main__':
+    megapixels = float(sys.argv[1]) if len(sys.argv) > 1 \
+        else DEFAULT_MEGAPIXELS
+    print(f'{megapixels} megapixel inputs, resized to {WIDTH}px')
+    for name, result in run(megapixels).items():
+        print(f'{name:>24}: {result["seconds"] * 1000:8.1f}ms '
+              f'{result["bytes"] / 2 ** 20:7.1f} MiB peak')
@@ -0,0 +1,54 @@
+""" Benchmark for encoding memes.
+
+Renders a meme from each bundled dog photo, then compares the encode
+time and file size of each MemeEngine encoder preset, plus PNG at the
+lowest and highest compression settings.
+
+Run from the project root with:
+
+    python -m benchmarks.bench_encode
+"""
+import io
+import tempfile
+import timeit
+
+from constants import IMAGES_DIR
+from MemeEngine import MemeEngine
+
+EXTRA_ENCODERS = {
+    'png compress_level=1': {'format': 'PNG', 'compress_level': 1},
+    'png optimize': {'format': 'PNG', 'optimize': True},
+}
+
+
+def run(repeat: int = 3) -> dict:
+    """ Run the benchmark and return the mean encode time in seconds
+    and the mean file size in bytes for each encoder.
+    """
+    meme = MemeEngine(tempfile.gettempdir())
+    images = [meme.render(path, 'To bork or not to bork', 'Rex', seed=0)
+              for path in sorted(IMAGES_DIR.glob('*.jpg'))]
+    encoders = {**meme.encoder_presets, **EXTRA_ENCODERS}
+
+    results = {}
+    for name, encoder in encoders.items():
+        settings = meme.encoder_options(encoder)
+        sizes = []
+
+        def encode_all():
+            sizes.clear()
+            for im in images:
+                buffer = io.BytesIO()
+                meme.encode(im, buffer, settings)
+                sizes.append(buffer.tell())
+
+        seconds = min(timeit.repeat(encode_all, number=1, repeat=repeat))
+        results[name] = {'seconds': seconds / len(images),
+                         'bytes': sum(sizes) / len(images)}
+    return results
+
+
+if __name__ == '__main__':
+    for name, result in run().items():
+        print(f'{name:>21}: {result["seconds"] * 1000:8.2f}ms '
+              f'{result["bytes"] / 1024:8.1f} KiB')
@@ -0,0 +1,81 @@
+""" Memory benchmark for holding the quote corpus.
+
+Compares the traced memory of a synthetic corpus held as a list of
+QuoteModel objects with __dict__ (as quotes were stored originally),
+a list of the current __slots__ QuoteModel, and a QuoteStore. Also
+times uniform random sampling from each.
+
+Run from the project root with:
+
+    python -m benchmarks.bench_quote_store [quotes]
+"""
+import random
+import sys
+import timeit
+import tracemalloc
+
+from QuoteEngine import QuoteModel, QuoteStore
+
+DEFAULT_QUOTES = 1_000_000
+AUTHORS = 500
+
+
+class DictQuoteModel():
+    """ A quote with a per-instance __dict__, like the original
+    QuoteModel.
+    """
+
+    def __init__(self, body: str, author: str) -> None:
+        body = body.strip('"')
+        self.body = f'"{body}"'
+        self.author = author
+
+
+def raw_quotes(count: int):
+    """ Yield synthetic (body, author) pairs. """
+    for i in range(count):
+        yield (f'To bork or not to bork, question number {i}',
+               f'Author {i % AUTHORS}')
+
+
+def traced(build):
+    """ Return the built collection and its traced size in bytes. """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    collection = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return collection, size
+
+
+def run(count: int = DEFAULT_QUOTES) -> dict:
+    """ Run the benchmark and return the size in bytes and the time
+    per random choice in seconds for each way of holding quotes.
+    """
+    builders = {
+        'list of dict QuoteModel': lambda: [
+            DictQuoteModel(b, a) for b, a in raw_quotes(count)],
+        'list of slots QuoteModel': lambda: [
+            QuoteModel(b, a) for b, a in raw_quotes(count)],
+        'QuoteStore': lambda: QuoteStore(
+            QuoteModel(b, a) for b, a in raw_quotes(count)),
+    }
+    results = {}
+    for name, build in builders.items():
+        quotes, size = traced(build)
+        rng = random.Random(0)
+        choose = quotes.random if isinstance(quotes, QuoteStore) \
+            else (lambda: rng.choice(quotes))
+        seconds = min(timeit.repeat(choose, number=10000, repeat=3))
+        results[name] = {'bytes': size, 'choice_seconds': seconds / 10000}
+        del quotes
+    return results
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_QUOTES
+    print(f'{count} quotes, {AUTHORS} authors')
+    for name, result in run(count).items():
+        print(f'{name:>25}: {result["bytes"] / 2 ** 20:8.1f} MiB '
+              f'{result["bytes"] / count:7.1f} B/quote '
+              f'{result["choice_seconds"] * 1e6:6.2f}us/choice')
@@ -0,0 +1,57 @@
+""" Benchmark for process start-up.
+
+Starts fresh Python processes and reports the time to import the
+QuoteEngine and the app, and the time until the first request to each
+route has been served by the Flask test client. This is the cost paid
+by every worker respawn.
+
+Run from the project root with:
+
+    python -m benchmarks.bench_startup [runs]
+"""
+import json
+import pathlib
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = pathlib.Path(__file__).parent.parent
+DEFAULT_RUNS = 5
+
+CHILD = '''
+import json, time
+start = time.perf_counter()
+import QuoteEngine
+quote_engine = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/create')
+first_form = time.perf_counter()
+client.get('/')
+first_random = time.perf_counter()
+print(json.dumps({
+    'import QuoteEngine': quote_engine - start,
+    'import app': imported - start,
+    'first GET /create': first_form - imported,
+    'first GET /': first_random - first_form,
+}))
+'''
+
+
+def run(runs: int = DEFAULT_RUNS) -> dict:
+    """ Run the benchmark and return the median timings in seconds. """
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', CHILD],
+                                capture_output=True, text=True,
+                                cwd=ROOT_DIR, check=True)
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {name: statistics.median(sample[name] for sample in samples)
+            for name in samples[0]}
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RUNS
+    for name, seconds in run(runs).items():
+        print(f'{name:>20}: {seconds * 1000:8.2f}ms')
@@ -0,0 +1,83 @@
+""" Microbenchmark for caption wrapping.
+
+Compares the original quadratic wrapping function with the
+TextWrapper, both without memoization (a new wrapper per call) and
+with a memoized layout, on captions of 50, 500 and 5,000 characters.
+
+Run from the project root with:
+
+    python -m benchmarks.bench_wrap
+"""
+import timeit
+
+from MemeEngine.FontRegistry import FontRegistry
+from MemeEngine.TextWrapper import TextWrapper
+
+CAPTION_LENGTHS = [50, 500, 5000]
+LINE_LENGTH = 300
+SAMPLE_TEXT = ('To bork or not to bork, that is the question. '
+               'He who smelt it dealt it, said the wise old dog. ')
+
+
+def original_wrap(text, font, line_length):
+    """ The original wrapping function, which measures the whole
+    current line again for every word.
+    """
+    lines = ['']
+    for word in text.split():
+        line = f'{lines[-1]} {word}'.strip()
+        if font.getlength(line) <= line_length:
+            lines[-1] = line
+        else:
+            lines.append(word)
+    return '\n'.join(lines)
+
+
+def make_caption(length: int) -> str:
+    """ Build a caption of roughly the given number of characters. """
+    repeats = length // len(SAMPLE_TEXT) + 1
+    return (SAMPLE_TEXT * repeats)[:length].rsplit(' ', 1)[0]
+
+
+def best_of(func, number: int) -> float:
+    """ Return the best per-call time in seconds over five runs. """
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def run() -> dict:
+    """ Run the benchmark and return per-call timings in seconds,
+    keyed by caption length.
+    """
+    font = FontRegistry.get('LilitaOne-Regular.ttf', 22)
+    results = {}
+    for length in CAPTION_LENGTHS:
+        caption = make_caption(length)
+        number = max(1, 5000 // length)
+        memoized = TextWrapper()
+        expected = original_wrap(caption, font.font, LINE_LENGTH)
+        assert memoized.wrap(caption, font, LINE_LENGTH) == expected
+
+        results[length] = {
+            'original': best_of(
+                lambda: original_wrap(caption, font.font, LINE_LENGTH),
+                number),
+            'linear': best_of(
+                lambda: TextWrapper().wrap(caption, font, LINE_LENGTH),
+                number),
+            'memoized': best_of(
+                lambda: memoized.wrap(caption, font, LINE_LENGTH),
+                number),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    print(f'{"chars":>6} {"original":>12} {"linear":>12} '
+          f'{"memoized":>12} {"speedup":>8}')
+    for length, timings in run().items():
+        speedup = timings['original'] / timings['linear']
+        print(f'{length:>6} '
+              f'{timings["original"] * 1e6:>10.1f}us '
+              f'{timings["linear"] * 1e6:>10.1f}us '
+              f'{timings["memoized"] * 1e6:>10.1f}us '
+              f'{speedup:>7.1f}x')
@@ -0,0 +1,282 @@
+""" Benchmark suite for catching performance regressions.
+
+Times, with no network access:
+
+    - each ingestor on the DogQuotes files scaled up by repeating
+      their quotes (PDF is timed on the original file, and skipped if
+      pdftotext is not installed)
+    - MemeEngine.get_wrapped_text on 50, 500 and 5,000 character
+      captions
+    - the stages of making a meme from a 2000px photo, as MemeEngine
+      runs them: decode (at a reduced JPEG draft scale), resize, draw
+      (render_caption and composite, and composite alone with a
+      cached caption layer) and encode, and make_meme_bytes as a whole
+    - the / and /create routes through the Flask test client, with
+      memes written to a temporary cache directory and the download
+      for POST /create served from a bundled photo. POST /create is
+      timed with a new caption each time, and repeated, when the meme
+      is served from the engine's meme cache
+
+Each result is the best per-call time in seconds. Results can be
+saved as a JSON baseline, and later runs compared with it, flagging
+every benchmark that is slower than the baseline by more than the
+threshold. The comparison exits with status 1 if any are flagged.
+Baselines are only comparable on the same machine.
+
+Run from the project root with:
+
+    python -m benchmarks.suite [--save FILE] [--compare FILE]
+                               [--threshold FRACTION] [--only GROUP]
+"""
+from typing import Callable, Dict, List, Tuple
+from unittest import mock
+import argparse
+import io
+import itertools
+import json
+import pathlib
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+from PIL import Image
+
+from benchmarks.bench_wrap import CAPTION_LENGTHS, LINE_LENGTH, \
+                                  make_caption
+from constants import CACHE_DIR, IMAGES_DIR, QUOTES_DIR
+from MemeEngine import MemeEngine
+from QuoteEngine import Ingestor
+
+DEFAULT_SCALE = 2000
+DEFAULT_THRESHOLD = 0.2
+REPEAT = 5
+TEST_IMAGE = sorted(IMAGES_DIR.glob('*.jpg'))[0]
+PHOTO_WIDTH = 2000
+CAPTION = 'To bork or not to bork, that is the question - Rex'
+
+
+def best(func: Callable[[], object], number: int = 1) -> float:
+    """ Return the best per-call time of a function in seconds. """
+    return min(timeit.repeat(func, number=number, repeat=REPEAT)) / number
+
+
+def scaled_quotes_files(directory: pathlib.Path,
+                        scale: int) -> Dict[str, pathlib.Path]:
+    """ Write copies of the DogQuotes files with their quotes repeated
+    scale times. PDF cannot be written here, so the original is used.
+    """
+    files = {}
+    for source in sorted(QUOTES_DIR.iterdir()):
+        kind = source.suffix[1:]
+        target = directory.joinpath(f'scaled.{kind}')
+        if kind == 'txt':
+            lines = source.read_text(encoding='utf-8-sig').splitlines()
+            target.write_text('\n'.join(lines * scale), encoding='utf-8')
+        elif kind == 'csv':
+            header, *rows = source.read_text(
+                encoding='utf-8-sig').splitlines()
+            target.write_text('\n'.join([header] + rows * scale),
+                              encoding='utf-8')
+        elif kind == 'docx':
+            import docx
+
+            paragraphs = [p.text for p in docx.Document(source).paragraphs]
+            document = docx.Document()
+            for text in paragraphs * scale:
+                document.add_paragraph(text)
+            document.save(target)
+        elif kind == 'pdf':
+            if shutil.which('pdftotext') is None:
+                continue
+            target = source
+        else:
+            continue
+        files[kind] = target
+    return files
+
+
+def bench_ingest(scale: int = DEFAULT_SCALE) -> Dict[str, float]:
+    """ Time each ingestor on a scaled quotes file. """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for kind, path in scaled_quotes_files(pathlib.Path(tmp_dir),
+                                              scale).items():
+            results[f'ingest {kind}'] = best(lambda: Ingestor.parse(path))
+    return results
+
+
+def bench_wrap() -> Dict[str, float]:
+    """ Time caption wrapping, without layout memoization. """
+    meme = MemeEngine(tempfile.gettempdir())
+    results = {}
+    for length in CAPTION_LENGTHS:
+        caption = make_caption(length)
+
+        def wrap():
+            meme.text_wrapper._layouts.clear()
+            meme.get_wrapped_text(caption, meme.font, LINE_LENGTH)
+
+        results[f'wrap {length} chars'] = best(
+            wrap, number=max(1, 5000 // length))
+    return results
+
+
+def bench_render() -> Dict[str, float]:
+    """ Time the stages of making a meme from a bundled photo, scaled
+    up to the size of a typical upload.
+    """
+    meme = MemeEngine(tempfile.gettempdir())
+    with Image.open(TEST_IMAGE) as im:
+        im = meme.resize(im, PHOTO_WIDTH, Image.BICUBIC)
+    buffer = io.BytesIO()
+    im.save(buffer, format='JPEG', quality=90)
+    content = buffer.getvalue()
+    resized = meme.resize(im, 500, meme.resample)
+    layer = meme.render_caption(CAPTION, 400)
+
+    def decode():
+        with Image.open(io.BytesIO(content)) as decoded:
+            decoded.draft(None, MemeEngine.scaled_size(decoded, 500))
+            decoded.load()
+        return decoded
+
+    drafted = decode()
+
+    def draw():
+        layer = meme.render_caption(CAPTION, 400)
+        meme.composite(resized.copy(), layer, (50, 50))
+
+    def encode(preset):
+        settings = meme.encoder_options(preset)
+        return lambda: meme.encode(resized, io.BytesIO(), settings)
+
+    return {
+        'render decode': best(decode, number=10),
+        'render resize': best(
+            lambda: meme.resize(drafted, 500, meme.resample), number=10),
+        'render draw': best(draw, number=10),
+        'render draw cached': best(
+            lambda: meme.composite(resized.copy(), layer, (50, 50)),
+            number=10),
+        'render encode png': best(encode('png'), number=3),
+        'render encode balanced': best(encode('balanced'), number=10),
+        'render make_meme_bytes': best(
+            lambda: meme.make_meme_bytes(content, CAPTION, 'Rex'),
+            number=3),
+    }
+
+
+def bench_routes() -> Dict[str, float]:
+    """ Time the Flask routes through the test client, writing memes to
+    a temporary directory and serving the image download locally.
+    """
+    import app
+
+    client = app.app.test_client()
+    content = TEST_IMAGE.read_bytes()
+    form = {'image_url': 'http://example.com/dog.jpg',
+            'body': 'To bork or not to bork', 'author': 'Rex'}
+    count = itertools.count()
+
+    def post_new():
+        # A new caption each time, so the meme cache cannot serve it.
+        client.post('/create', data={**form,
+                                     'body': f'{form["body"]} {next(count)}'})
+    # Memes are linked relative to the project root, so they must be
+    # written inside it.
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=CACHE_DIR) as tmp_dir:
+        meme = MemeEngine(tmp_dir, encoder=app.meme.encoder_settings,
+                          derivatives=app.meme.derivatives)
+        with mock.patch.object(app, 'meme', meme), \
+                mock.patch.object(app.downloader, 'fetch',
+                                  return_value=content):
+            client.get('/create')
+            return {
+                'route GET /': best(lambda: client.get('/'), number=3),
+                'route GET /create': best(lambda: client.get('/create'),
+                                          number=20),
+                'route POST /create': best(post_new, number=3),
+                'route POST /create repeated': best(
+                    lambda: client.post('/create', data=form), number=3),
+            }
+
+
+GROUPS = {'ingest': bench_ingest,
+          'wrap': bench_wrap,
+          'render': bench_render,
+          'routes': bench_routes}
+
+
+def run(groups: List[str] = None) -> Dict[str, float]:
+    """ Run the benchmark groups and return the per-call timings in
+    seconds, keyed by benchmark name.
+    """
+    results = {}
+    for group in groups or GROUPS:
+        results.update(GROUPS[group]())
+    return results
+
+
+def save(results: Dict[str, float], path: pathlib.Path) -> None:
+    """ Save results as a JSON baseline. """
+    baseline = {'python': platform.python_version(),
+                'machine': platform.platform(),
+                'results': results}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def compare(results: Dict[str, float],
+            baseline: Dict[str, float],
+            threshold: float = DEFAULT_THRESHOLD
+            ) -> List[Tuple[str, float, float, bool]]:
+    """ Compare results with a baseline.
+
+    :return: the name, baseline time, current time and whether it is
+             a regression, for each benchmark in both
+    """
+    return [(name, baseline[name], seconds,
+             seconds > baseline[name] * (1 + threshold))
+            for name, seconds in results.items() if name in baseline]
+
+
+def main(argv: List[str] = None) -> int:
+    """ Run the suite from the command line. """
+    parser = argparse.ArgumentParser(description='Run the benchmarks.')
+    parser.add_argument('--save', type=pathlib.Path,
+                        help='save the results as a JSON baseline')
+    parser.add_argument('--compare', type=pathlib.Path,
+                        help='compare the results with a JSON baseline')
+    parser.add_argument('--threshold', type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help='the slowdown to flag, as a fraction')
+    parser.add_argument('--only', action='append', choices=GROUPS,
+                        help='run only the given benchmark group')
+    args = parser.parse_args(argv)
+
+    results = run(args.only)
+    if args.save:
+        save(results, args.save)
+
+    if not args.compare:
+        for name, seconds in results.items():
+            print(f'{name:>28}: {seconds * 1000:10.3f}ms')
+        return 0
+
+    with open(args.compare, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = 0
+    for name, before, after, regressed in compare(results, baseline,
+                                                  args.threshold):
+        flag = 'SLOWER' if regressed else ''
+        regressions += regressed
+        print(f'{name:>28}: {before * 1000:10.3f}ms -> '
+              f'{after * 1000:10.3f}ms {after / before:6.2f}x {flag}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
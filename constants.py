@@ -1,3 +1,4 @@
+import os
 import pathlib
 
 # project root directory
@@ -8,7 +9,54 @@ STATIC_DIR = pathlib.Path(ROOT_DIR).joinpath('static')
 QUOTES_DIR = pathlib.Path(ROOT_DIR).joinpath('_data/DogQuotes')
 # path for input image files for generating memes
 IMAGES_DIR = pathlib.Path(ROOT_DIR).joinpath('_data/photos/dog')
-# path for temp storage of user-supplied images for meme creation
-TEMP_DIR = pathlib.Path(ROOT_DIR).joinpath('_data/temp')
 # fonts path
 FONTS_DIR = pathlib.Path(ROOT_DIR).joinpath('fonts')
+# path for persistent caches, such as the compiled quote corpus
+CACHE_DIR = pathlib.Path(ROOT_DIR).joinpath('_data/cache')
+# path for the compiled quote corpus cache
+QUOTE_CACHE_FILE = CACHE_DIR.joinpath('quotes.sqlite3')
+# path for cached downloads of user-supplied images
+DOWNLOAD_CACHE_DIR = CACHE_DIR.joinpath('downloads')
+# maximum total bytes of cached downloads kept in DOWNLOAD_CACHE_DIR
+DOWNLOAD_CACHE_MAX_BYTES = int(os.environ.get('MEME_DOWNLOAD_CACHE_MAX_BYTES',
+                                              64 * 1024 * 1024))
+# maximum age in seconds of cached downloads kept in DOWNLOAD_CACHE_DIR
+DOWNLOAD_CACHE_MAX_AGE = float(os.environ.get('MEME_DOWNLOAD_CACHE_MAX_AGE',
+                                              7 * 24 * 60 * 60))
+# path for pre-resized copies of the images in IMAGES_DIR
+DERIVATIVES_DIR = CACHE_DIR.joinpath('derivatives')
+# seconds between checks for changed quotes and images, 0 to disable
+RELOAD_INTERVAL = float(os.environ.get('MEME_RELOAD_INTERVAL', 5))
+# maximum total bytes of generated memes kept in STATIC_DIR
+OUTPUT_MAX_BYTES = int(os.environ.get('MEME_OUTPUT_MAX_BYTES',
+                                      256 * 1024 * 1024))
+# maximum age in seconds of generated memes kept in STATIC_DIR
+OUTPUT_MAX_AGE = float(os.environ.get('MEME_OUTPUT_MAX_AGE', 24 * 60 * 60))
+# encoder preset for generated memes: png, fast, balanced or small
+MEME_ENCODER = os.environ.get('MEME_ENCODER', 'png')
+# whether to place each quote's caption at a position derived from
+# the quote, so repeated memes of an image and quote are deduplicated
+STABLE_CAPTIONS = os.environ.get('MEME_STABLE_CAPTIONS', '0') != '0'
+# number of random memes to render ahead of time, 0 to disable
+POOL_DEPTH = int(os.environ.get('MEME_POOL_DEPTH', 0))
+# maximum random memes rendered ahead per second, 0 for no limit
+POOL_RATE = float(os.environ.get('MEME_POOL_RATE', 0))
+# whether to record metrics for /metrics and Server-Timing headers
+METRICS_ENABLED = os.environ.get('MEME_METRICS', '1') != '0'
+# fraction of requests and meme generations to profile, from 0 to 1
+PROFILE_RATE = float(os.environ.get('MEME_PROFILE_RATE', 0))
+# path for dumped profiles of sampled requests
+PROFILE_DIR = pathlib.Path(os.environ.get('MEME_PROFILE_DIR',
+                                          CACHE_DIR.joinpath('profiles')))
+# number of dumped profiles to keep
+PROFILE_KEEP = int(os.environ.get('MEME_PROFILE_KEEP', 100))
+# number of worker processes that render memes, 0 to render on the
+# request thread
+RENDER_WORKERS = int(os.environ.get('MEME_RENDER_WORKERS', 0))
+# number of renders that can wait for a worker before requests are
+# rejected with 503 Service Unavailable
+RENDER_QUEUE = int(os.environ.get('MEME_RENDER_QUEUE', 4))
+# seconds to wait for a render worker before giving up
+RENDER_TIMEOUT = float(os.environ.get('MEME_RENDER_TIMEOUT', 30))
+# seconds clients are told to wait before retrying a rejected request
+RETRY_AFTER = int(os.environ.get('MEME_RETRY_AFTER', 1))
@@ -0,0 +1,247 @@
+from typing import Dict, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+
+import metrics
+from MemeEngine import OutputStore
+
+# Leading bytes of the image formats Pillow is expected to open.
+IMAGE_SIGNATURES = [b'\xff\xd8\xff',            # JPEG
+                    b'\x89PNG\r\n\x1a\n',       # PNG
+                    b'GIF87a', b'GIF89a',       # GIF
+                    b'BM',                      # BMP
+                    b'II*\x00', b'MM\x00*']     # TIFF
+
+
+class ImageDownloader():
+    """ Downloads user-supplied images for meme creation.
+
+    All downloads share one connection-pooled requests session. Each
+    download has connect and read timeouts plus an overall time
+    limit, and is streamed with a cap on its size. A response is
+    rejected early if its Content-Type is not an image, or if its
+    first bytes are not a known image header.
+
+    Downloads that carry an ETag or Last-Modified header are kept in
+    a local cache keyed by URL. A cached image is revalidated with a
+    conditional request, and reused without downloading it again
+    when the server answers 304 Not Modified. The cache is an
+    OutputStore, so its total size and the age of its files can be
+    bounded, evicting the least recently used downloads first.
+    """
+
+    def __init__(self,
+                 cache_dir: Optional[Union[str, pathlib.Path]] = None,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 10.0,
+                 total_timeout: float = 30.0,
+                 max_bytes: int = 10 * 1024 * 1024,
+                 pool_size: int = 10,
+                 cache_max_bytes: Optional[int] = None,
+                 cache_max_age: Optional[float] = None) -> None:
+        """ Construct a new ImageDownloader.
+
+        :param cache_dir: the directory for cached downloads, defaults
+                          to None for no cache
+        :param connect_timeout: the connect timeout in seconds
+        :param read_timeout: the timeout in seconds between bytes
+        :param total_timeout: the time limit in seconds for a download
+        :param max_bytes: the maximum size of an image in bytes
+        :param pool_size: the number of pooled connections per host
+        :param cache_max_bytes: the maximum total size of the cached
+                                downloads in bytes, defaults to None
+                                for no limit
+        :param cache_max_age: the maximum age of a cached download in
+                              seconds, defaults to None for no limit
+        """
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir else None
+        self.cache = None
+        if self.cache_dir is not None:
+            self.cache = OutputStore(self.cache_dir, cache_max_bytes,
+                                     cache_max_age)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.pool_size = pool_size
+        self.downloads = 0
+        self.cache_hits = 0
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """ The shared requests session, created on first use. """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size,
+                                          pool_maxsize=self.pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def fetch(self, url: str) -> bytes:
+        """ Download the image at the URL, or reuse the cached copy if
+        the server reports it has not been modified.
+
+        :param url: the URL of the image
+        :return: the image file content
+        """
+        with metrics.stage('download'):
+            try:
+                content, result = self._fetch(url)
+            except Exception:
+                metrics.inc('meme_downloads_total', result='error')
+                raise
+        metrics.inc('meme_downloads_total', result=result)
+        return content
+
+    def _fetch(self, url: str) -> Tuple[bytes, str]:
+        """ Download or revalidate an image, returning its content and
+        whether it was 'downloaded' or 'not_modified'.
+        """
+        cached = self._cache_read(url)
+        headers = {}
+        if cached is not None:
+            meta, _ = cached
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = self.session.get(
+                url, headers=headers, stream=True,
+                timeout=(self.connect_timeout, self.read_timeout))
+        except Exception as e:
+            raise Exception(f'Could not connect to {url}: {e}')
+
+        with response:
+            if response.status_code == 304 and cached is not None:
+                self.cache_hits += 1
+                return cached[1], 'not_modified'
+            if response.status_code != 200:
+                raise Exception(f'Image request failed with status '
+                                f'{response.status_code}')
+
+            content_type = response.headers.get('Content-Type', '')
+            content_type = content_type.split(';')[0].strip().lower()
+            if content_type and not content_type.startswith('image/'):
+                raise Exception(f'URL is not an image: {content_type}')
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                raise Exception(f'Image is larger than '
+                                f'{self.max_bytes} bytes')
+
+            content = self._read(response)
+
+        self.downloads += 1
+        self._cache_write(url, response.headers, content)
+        return content, 'downloaded'
+
+    def _read(self, response) -> bytes:
+        """ Stream the response body, enforcing the size limit, the
+        overall time limit and the image header check.
+        """
+        import requests
+        import urllib3
+
+        deadline = time.monotonic() + self.total_timeout
+        content = bytearray()
+        checked = False
+        try:
+            while True:
+                # read1() returns whatever has arrived, waiting at most
+                # read_timeout, so a server that drips the body a byte
+                # at a time still meets the overall time limit.
+                chunk = response.raw.read1(64 * 1024, decode_content=True)
+                if not chunk:
+                    break
+                content += chunk
+                if len(content) > self.max_bytes:
+                    raise Exception(f'Image is larger than '
+                                    f'{self.max_bytes} bytes')
+                if time.monotonic() > deadline:
+                    raise Exception(f'Image download took longer than '
+                                    f'{self.total_timeout}s')
+                if not checked and len(content) >= 12:
+                    self._check_header(bytes(content[:12]))
+                    checked = True
+        except (requests.RequestException,
+                urllib3.exceptions.HTTPError) as e:
+            raise Exception(f'Error downloading image: {e}')
+
+        if not checked:
+            self._check_header(bytes(content[:12]))
+        return bytes(content)
+
+    @staticmethod
+    def _check_header(header: bytes) -> None:
+        """ Raise an exception if the bytes do not start with a known
+        image file header.
+        """
+        if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+            return
+        if not any(header.startswith(sig) for sig in IMAGE_SIGNATURES):
+            raise Exception('Downloaded file is not a supported image')
+
+    def _cache_paths(self, url: str) -> Tuple[pathlib.Path, pathlib.Path]:
+        """ Return the paths of the cached content and metadata for a
+        URL.
+        """
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.cache.path(f'{key}.img'), self.cache.path(f'{key}.json')
+
+    def _cache_read(self, url: str) -> Optional[Tuple[Dict, bytes]]:
+        """ Return the cached metadata and content for a URL, or None.
+        A cached download that has expired is not used.
+        """
+        if self.cache is None:
+            return None
+        content_path, meta_path = self._cache_paths(url)
+        if not (self.cache.touch(content_path) and
+                self.cache.touch(meta_path)):
+            return None
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(content_path, 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url:
+            return None
+        return meta, content
+
+    def _cache_write(self, url: str, headers, content: bytes) -> None:
+        """ Cache a download if the server sent validators for it. """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if self.cache is None or not (etag or last_modified):
+            return
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        content_path, meta_path = self._cache_paths(url)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified}
+        # Temporary files start with a dot, so the store ignores them.
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            for path, data in [(content_path, content),
+                               (meta_path, json.dumps(meta).encode())]:
+                tmp_path = path.with_name(f'.{path.name}{suffix}')
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self.cache.add(path)
+        except OSError as e:
+            print(f'Download Cache Error:  {e}')
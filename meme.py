@@ -2,12 +2,16 @@ import os
 import random
 import argparse
 
-from constants import STATIC_DIR, IMAGES_DIR
-from MemeEngine import MemeEngine
-from QuoteEngine import Ingestor
+from constants import STATIC_DIR, IMAGES_DIR, QUOTES_DIR, \
+                      QUOTE_CACHE_FILE, OUTPUT_MAX_BYTES, OUTPUT_MAX_AGE, \
+                      MEME_ENCODER, DERIVATIVES_DIR
+from MemeEngine import DerivativeStore, MemeEngine, OutputStore
+from QuoteEngine import DirectoryIngestor, QuoteCache
 from QuoteEngine import QuoteModel
+from profiling import profiler
 
 
+@profiler.sampled()
 def generate_meme(path=None, body=None, author=None):
     """ Generate a meme given a path and a quote """
     img = None
@@ -23,13 +27,12 @@ def generate_meme(path=None, body=None, author=None):
         img = path
 
     if body is None:
-        quote_files = ['./_data/DogQuotes/DogQuotesTXT.txt',
-                       './_data/DogQuotes/DogQuotesDOCX.docx',
-                       './_data/DogQuotes/DogQuotesPDF.pdf',
-                       './_data/DogQuotes/DogQuotesCSV.csv']
-        quotes = []
-        for f in quote_files:
-            quotes.extend(Ingestor.parse(f))
+        corpus = QuoteCache(QUOTE_CACHE_FILE)
+        quotes, report = DirectoryIngestor.parse(QUOTES_DIR, corpus)
+        corpus.close()
+        for item in report:
+            if item.error:
+                print(f'Ingestor Error:  {item.path.name}: {item.error}')
 
         quote = random.choice(quotes)
     else:
@@ -37,7 +40,10 @@ def generate_meme(path=None, body=None, author=None):
             raise Exception('Author Required if Body is Used')
         quote = QuoteModel(body, author)
 
-    meme = MemeEngine(STATIC_DIR)
+    store = OutputStore(STATIC_DIR, OUTPUT_MAX_BYTES, OUTPUT_MAX_AGE)
+    derivatives = DerivativeStore(DERIVATIVES_DIR, IMAGES_DIR)
+    meme = MemeEngine(STATIC_DIR, store=store, encoder=MEME_ENCODER,
+                      derivatives=derivatives)
     path = meme.make_meme(img, quote.body, quote.author)
     return path
 
@@ -51,5 +57,11 @@ if __name__ == "__main__":
     parser.add_argument('--path', type=str, default=None)
     parser.add_argument('--body', type=str, default=None)
     parser.add_argument('--author', type=str, default=None)
+    parser.add_argument('--profile', type=float, nargs='?', const=1.0,
+                        default=None, metavar='RATE',
+                        help='profile a fraction of runs, all if no '
+                             'rate is given, dumping to MEME_PROFILE_DIR')
     args = parser.parse_args()
+    if args.profile is not None:
+        profiler.rate = args.profile
     print(generate_meme(args.path, args.body, args.author))
@@ -0,0 +1,270 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+import contextlib
+import threading
+import time
+
+from constants import METRICS_ENABLED
+
+# Upper bounds in seconds of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Help text for the metrics recorded by the app.
+HELP = {
+    'meme_stage_seconds': 'Time spent in each stage of making a meme.',
+    'meme_request_seconds': 'Time taken to handle each request.',
+    'meme_renders_total': 'Memes rendered.',
+    'meme_dedup_hits_total': 'Memes served from an existing file.',
+    'meme_downloads_total': 'User image downloads, by result.',
+    'quotes_ingest_seconds': 'Time taken to ingest each quotes file.',
+    'quotes_ingested_total': 'Quotes ingested, by file format.',
+    'meme_image_cache_bytes': 'Bytes of resized images in the cache.',
+    'meme_output_store_bytes': 'Bytes of generated memes on disk.',
+    'meme_pool_ready': 'Random memes rendered ahead and ready.',
+    'meme_render_rejections_total': 'Renders rejected by a full pool.',
+    'meme_render_pool_pending': 'Renders running or waiting for a worker.',
+}
+
+# Labels of a metric, as sorted (name, value) pairs.
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram():
+    """ A latency histogram with fixed bucket bounds. """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """ Construct a new, empty Histogram.
+
+        :param buckets: the upper bounds of the buckets, ascending
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """ Record a value.
+
+        :param value: the value, in seconds
+        """
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StageTimer():
+    """ Times a stage of the work, recording it in a histogram and in
+    the current request's Server-Timing entries.
+    """
+    __slots__ = ('registry', 'stage', 'start')
+
+    def __init__(self, registry: 'Metrics', stage: str) -> None:
+        """ Construct a timer for one stage.
+
+        :param registry: the metrics registry to record in
+        :param stage: the name of the stage
+        """
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self) -> 'StageTimer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        duration = time.perf_counter() - self.start
+        self.registry.observe('meme_stage_seconds', duration,
+                              stage=self.stage)
+        timings = self.registry._timings.get()
+        if timings is not None:
+            timings[self.stage] = timings.get(self.stage, 0.0) + duration
+
+
+class Metrics():
+    """ A registry of counters, latency histograms and gauges, that can
+    be rendered in the Prometheus text exposition format.
+
+    Work is timed in stages with stage(). The stages timed while
+    handling a request are also collected for the request's
+    Server-Timing header, between start_request() and end_request().
+
+    When the registry is disabled, stage() returns a shared no-op
+    context manager and the other methods return at once, so the
+    instrumentation costs little more than a method call.
+    """
+
+    def __init__(self,
+                 enabled: bool = True,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """ Construct a new, empty Metrics registry.
+
+        :param enabled: whether to record metrics, defaults to True
+        :param buckets: the histogram bucket bounds in seconds
+        """
+        self.enabled = enabled
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._timings: ContextVar[Optional[Dict[str, float]]] = \
+            ContextVar('timings', default=None)
+        self._lock = threading.Lock()
+        self._null_timer = contextlib.nullcontext()
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        """ Add to a counter.
+
+        :param name: the counter name
+        :param amount: the amount to add, defaults to 1
+        :param labels: the counter's labels
+        """
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counter = self._counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """ Record a value in a histogram.
+
+        :param name: the histogram name
+        :param value: the value, in seconds
+        :param labels: the histogram's labels
+        """
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histograms = self._histograms.setdefault(name, {})
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def gauge(self, name: str, callback: Callable[[], float]) -> None:
+        """ Register a gauge, read by calling the callback whenever the
+        metrics are rendered.
+
+        :param name: the gauge name
+        :param callback: returns the gauge's current value
+        """
+        self._gauges[name] = callback
+
+    def stage(self, stage: str):
+        """ Return a context manager that times a stage of the work.
+
+        :param stage: the name of the stage, such as 'decode'
+        :return: the stage timer
+        """
+        if not self.enabled:
+            return self._null_timer
+        return StageTimer(self, stage)
+
+    def start_request(self) -> None:
+        """ Start collecting stage timings for the current request. """
+        if self.enabled:
+            self._timings.set({})
+
+    def end_request(self) -> str:
+        """ Stop collecting stage timings for the current request.
+
+        :return: the Server-Timing header value for the stages timed,
+                 with durations in milliseconds
+        """
+        timings = self.take_timings()
+        if not timings:
+            return ''
+        return ', '.join(f'{stage};dur={seconds * 1000:.2f}'
+                         for stage, seconds in timings.items())
+
+    def take_timings(self) -> Dict[str, float]:
+        """ Stop collecting stage timings for the current request, and
+        return them.
+
+        :return: the seconds spent in each stage timed
+        """
+        timings = self._timings.get()
+        self._timings.set(None)
+        return timings or {}
+
+    def add_timings(self, timings: Dict[str, float]) -> None:
+        """ Record stage timings taken elsewhere, such as in a worker
+        process, as if the stages had been timed here.
+
+        :param timings: the seconds spent in each stage
+        """
+        if not self.enabled:
+            return
+        current = self._timings.get()
+        for stage, duration in timings.items():
+            self.observe('meme_stage_seconds', duration, stage=stage)
+            if current is not None:
+                current[stage] = current.get(stage, 0.0) + duration
+
+    def render(self) -> str:
+        """ Render the metrics in the Prometheus text format.
+
+        :return: the metrics text
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, counter in sorted(self._counters.items()):
+                self._header(lines, name, 'counter')
+                for labels, value in sorted(counter.items()):
+                    lines.append(f'{name}{self._labels(labels)} '
+                                 f'{value:.15g}')
+
+            for name, histograms in sorted(self._histograms.items()):
+                self._header(lines, name, 'histogram')
+                for labels, histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets,
+                                            histogram.counts):
+                        cumulative += count
+                        le = self._labels(labels + (('le', f'{bound:g}'),))
+                        lines.append(f'{name}_bucket{le} {cumulative}')
+                    le = self._labels(labels + (('le', '+Inf'),))
+                    lines.append(f'{name}_bucket{le} {histogram.count}')
+                    lines.append(f'{name}_sum{self._labels(labels)} '
+                                 f'{histogram.sum:.6f}')
+                    lines.append(f'{name}_count{self._labels(labels)} '
+                                 f'{histogram.count}')
+
+        for name, callback in sorted(self._gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                print(f'Metrics Error:  {name}: {e}')
+                continue
+            self._header(lines, name, 'gauge')
+            lines.append(f'{name} {value:.15g}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _header(lines: List[str], name: str, kind: str) -> None:
+        """ Add the HELP and TYPE lines for a metric. """
+        if name in HELP:
+            lines.append(f'# HELP {name} {HELP[name]}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    @staticmethod
+    def _labels(labels: Labels) -> str:
+        """ Format labels as {name="value",...}, escaping the values. """
+        if not labels:
+            return ''
+        pairs = ','.join(
+            f'{key}="' + str(value).replace('\\', '\\\\')
+            .replace('"', '\\"').replace('\n', '\\n') + '"'
+            for key, value in labels)
+        return f'{{{pairs}}}'
+
+
+# The app's metrics registry.
+registry = Metrics(METRICS_ENABLED)
+stage = registry.stage
+inc = registry.inc
+observe = registry.observe
@@ -0,0 +1,132 @@
+from typing import Any, Callable, Dict, Optional
+import queue
+import threading
+import time
+
+
+class MemePool():
+    """ A bounded pool of memes rendered ahead of time.
+
+    A background daemon thread calls the producer to render memes
+    until the pool holds depth of them, then waits for memes to be
+    taken before rendering more. The refill rate can be capped, so
+    the producer does not compete with requests for the CPU. Taking a
+    meme never waits: get() returns None when the pool is empty, and
+    the caller renders a meme itself.
+
+    The producer can return None to skip a meme, for example when
+    the render workers are busy with requests; it is called again
+    after skip_delay seconds.
+    """
+    # Seconds to wait after the producer skips a meme.
+    skip_delay = 0.1
+
+    def __init__(self,
+                 producer: Callable[[], Any],
+                 depth: int = 8,
+                 rate: float = 0.0) -> None:
+        """ Construct a new MemePool.
+
+        :param producer: called with no arguments to render a meme
+        :param depth: the number of memes to keep ready, defaults to 8
+        :param rate: the maximum number of memes rendered per second,
+                     defaults to 0 for no limit
+        """
+        self.producer = producer
+        self.depth = depth
+        self.rate = rate
+        self.produced = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.skipped = 0
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self) -> int:
+        """ Return the number of memes ready in the pool. """
+        return self._queue.qsize()
+
+    def get(self) -> Optional[Any]:
+        """ Take a meme from the pool without waiting.
+
+        :return: a meme, or None if the pool is empty
+        """
+        try:
+            meme = self._queue.get_nowait()
+        except queue.Empty:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return meme
+
+    def clear(self) -> None:
+        """ Discard the memes in the pool, for example when the quotes
+        or images they were made from have changed.
+        """
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def stats(self) -> Dict[str, float]:
+        """ Return the pool's depth and counters.
+
+        :return: the number of memes ready, the depth and refill rate,
+                 and the number of memes produced, served from the
+                 pool, missed, failed and skipped
+        """
+        return {'ready': len(self),
+                'depth': self.depth,
+                'rate': self.rate,
+                'produced': self.produced,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'skipped': self.skipped}
+
+    def start(self) -> None:
+        """ Start filling the pool on a background daemon thread. """
+        if self._thread is None and self.depth > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='MemePool',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """ Stop filling the pool and wait for the thread to end. """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """ Render memes into the pool until stopped, reporting errors
+        and backing off after each one.
+        """
+        interval = 1 / self.rate if self.rate > 0 else 0.0
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                meme = self.producer()
+            except Exception as e:
+                self.errors += 1
+                print(f'Meme Pool Error:  {e}')
+                self._stop.wait(max(interval, 1.0))
+                continue
+            if meme is None:
+                self.skipped += 1
+                self._stop.wait(max(interval, self.skip_delay))
+                continue
+            self.produced += 1
+
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(meme, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            self._stop.wait(max(0.0, interval - (time.monotonic() - start)))
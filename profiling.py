@@ -0,0 +1,203 @@
+""" On-demand profiling of sampled calls.
+
+Calls wrapped with Profiler.sampled() are run under cProfile at the
+profiler's sample rate. Each sampled call's profile is dumped to the
+profile directory with a JSON file of its parameters, keeping only
+the newest dumps.
+
+To report the hottest functions across the dumps, run:
+
+    python -m profiling [--dir DIR] [--top N] [--sort KEY] [--name NAME]
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+import argparse
+import cProfile
+import functools
+import io
+import json
+import os
+import pathlib
+import pstats
+import random
+import sys
+import threading
+import time
+
+from constants import PROFILE_DIR, PROFILE_KEEP, PROFILE_RATE
+
+
+class Profiler():
+    """ Profiles a random sample of calls with cProfile.
+
+    A profile is dumped as <time>-<pid>-<name>.prof, readable with
+    pstats, next to a .json file holding the call's name, parameters
+    and duration. Only the newest keep dumps are kept in the
+    directory.
+
+    With a sample rate of 0, sampled() functions only check the rate
+    before calling through.
+    """
+
+    def __init__(self,
+                 directory: Union[str, pathlib.Path],
+                 rate: float = 0.0,
+                 keep: int = 100) -> None:
+        """ Construct a new Profiler.
+
+        :param directory: the directory to dump profiles to
+        :param rate: the fraction of calls to profile, from 0 to 1,
+                     defaults to 0 for none
+        :param keep: the number of dumps to keep, defaults to 100
+        """
+        self.directory = pathlib.Path(directory)
+        self.rate = rate
+        self.keep = keep
+        self.profiled = 0
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    def sample(self) -> bool:
+        """ Decide whether to profile a call.
+
+        :return: whether to profile it
+        """
+        return self.rate > 0 and self._random.random() < self.rate
+
+    def sampled(self,
+                name: Optional[str] = None,
+                params: Optional[Callable[..., Dict[str, Any]]] = None
+                ) -> Callable:
+        """ Return a decorator that profiles a sample of calls to the
+        decorated function.
+
+        :param name: the name for the dumps, defaults to the function
+                     name
+        :param params: called with the function's arguments to return
+                       the parameters recorded with a dump, defaults to
+                       None to record the arguments
+        :return: the decorator
+        """
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.sample():
+                    return func(*args, **kwargs)
+                if params is not None:
+                    info = params(*args, **kwargs)
+                else:
+                    info = {'args': [repr(arg) for arg in args],
+                            'kwargs': {key: repr(value)
+                                       for key, value in kwargs.items()}}
+                with self.profile(name or func.__name__, info):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def profile(self,
+                name: str,
+                params: Optional[Dict[str, Any]] = None) -> Iterator[None]:
+        """ Profile the enclosed code and dump the profile.
+
+        :param name: the name for the dump
+        :param params: the parameters to record with the dump
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active, which newer Pythons allow
+            # only once per process.
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - start
+            try:
+                self._dump(profile, name, params or {}, duration)
+            except OSError as e:
+                print(f'Profiler Error:  {e}')
+
+    def _dump(self,
+              profile: cProfile.Profile,
+              name: str,
+              params: Dict[str, Any],
+              duration: float) -> None:
+        """ Write a profile and its parameters, then remove the oldest
+        dumps beyond the number to keep.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = f'{time.time_ns()}-{os.getpid()}-{name}'
+        profile.dump_stats(self.directory.joinpath(f'{stem}.prof'))
+        info = {'name': name, 'time': time.time(), 'duration': duration,
+                'pid': os.getpid(), 'params': params}
+        with open(self.directory.joinpath(f'{stem}.json'), 'w',
+                  encoding='utf-8') as f:
+            json.dump(info, f, indent=2, default=repr)
+
+        with self._lock:
+            self.profiled += 1
+            dumps = sorted(self.directory.glob('*.prof'))
+            for old in dumps[:max(0, len(dumps) - self.keep)]:
+                for path in (old, old.with_suffix('.json')):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+
+def report(directory: Union[str, pathlib.Path],
+           top: int = 20,
+           sort: str = 'cumulative',
+           name: Optional[str] = None) -> str:
+    """ Aggregate the dumped profiles into a report of the hottest
+    functions.
+
+    :param directory: the directory of dumped profiles
+    :param top: the number of functions to report, defaults to 20
+    :param sort: the pstats sort key, defaults to 'cumulative'
+    :param name: report only the dumps with this name, defaults to
+                 None for all
+    :return: the report text
+    """
+    directory = pathlib.Path(directory)
+    dumps = sorted(directory.glob('*.prof'))
+    if name is not None:
+        dumps = [path for path in dumps
+                 if path.stem.split('-', 2)[-1] == name]
+    if not dumps:
+        return f'No profiles in {directory}\n'
+
+    counts: Dict[str, int] = {}
+    for path in dumps:
+        dump_name = path.stem.split('-', 2)[-1]
+        counts[dump_name] = counts.get(dump_name, 0) + 1
+    summary = ', '.join(f'{count} {dump_name}'
+                        for dump_name, count in sorted(counts.items()))
+
+    out = io.StringIO()
+    out.write(f'{len(dumps)} profiles: {summary}\n')
+    stats = pstats.Stats(str(dumps[0]), stream=out)
+    for path in dumps[1:]:
+        stats.add(str(path))
+    stats.sort_stats(sort).print_stats(top)
+    return out.getvalue()
+
+
+# The app's profiler, configured by the MEME_PROFILE_* variables.
+profiler = Profiler(PROFILE_DIR, PROFILE_RATE, PROFILE_KEEP)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Report the hottest functions in dumped profiles.')
+    parser.add_argument('--dir', type=pathlib.Path, default=PROFILE_DIR)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--sort', type=str, default='cumulative')
+    parser.add_argument('--name', type=str, default=None)
+    args = parser.parse_args()
+    sys.stdout.write(report(args.dir, args.top, args.sort, args.name))
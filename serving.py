@@ -0,0 +1,237 @@
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+import multiprocessing
+import os
+import random
+import threading
+
+import metrics
+
+# The engine of a render worker process, built by init_worker().
+_engine = None
+_local = threading.local()
+
+
+class RenderPoolFull(Exception):
+    """ Raised when the render pool cannot admit another render. The
+    request should be retried after retry_after seconds.
+    """
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        """ Construct a new RenderPoolFull error.
+
+        :param message: the error message
+        :param retry_after: the seconds after which to retry
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def rng() -> random.Random:
+    """ Return the random number generator of the current thread.
+
+    Each thread, in each process, has its own generator, seeded from
+    the OS, so threads never share random state and forked workers
+    never repeat their parent's sequence.
+
+    :return: the thread's random number generator
+    """
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.rng = random.Random()
+        _local.pid = os.getpid()
+    return _local.rng
+
+
+def init_worker(factory: Callable[[], Any]) -> None:
+    """ Build the engine of a render worker process.
+
+    :param factory: an importable function that returns the engine
+    """
+    global _engine
+    _engine = factory()
+
+
+def call_engine(method: str,
+                args: tuple,
+                kwargs: Dict[str, Any]) -> Tuple[Any, Dict[str, float]]:
+    """ Call a method of the worker's engine. Defined at module level
+    so that it can run in a worker process.
+
+    :return: the method's result, and the seconds spent in each stage
+             timed by the engine, for the serving process to record
+    """
+    metrics.registry.start_request()
+    try:
+        result = getattr(_engine, method)(*args, **kwargs)
+    finally:
+        timings = metrics.registry.take_timings()
+    return result, timings
+
+
+class RenderPool():
+    """ A bounded pool of worker processes that render memes.
+
+    Each worker process builds its own engine with the factory, so
+    renders run in parallel without sharing engine state, and a
+    render cannot exhaust the memory of the serving process.
+
+    Admission is bounded: at most workers renders run at once, and at
+    most queue_size more wait for a worker. When both are full, call()
+    fails at once with RenderPoolFull instead of queueing without
+    limit, so a traffic spike is answered with quick rejections
+    rather than slow responses for everyone. pending counts the
+    renders running or waiting. Background work, such as rendering
+    memes ahead of time, uses call_idle(), which only runs when a
+    worker is idle and never takes the last free slot, so it does not
+    cause requests to be rejected.
+
+    The stages timed by a worker's engine are sent back with each
+    result and recorded in the serving process's metrics, alongside
+    the render_pool stage, which spans the whole wait for a worker.
+
+    If a worker process dies, for example when it runs out of memory,
+    the renders in progress fail with RenderPoolFull and the workers
+    are started again for the next render.
+    """
+
+    def __init__(self,
+                 factory: Callable[[], Any],
+                 workers: int = 2,
+                 queue_size: int = 4,
+                 timeout: float = 30.0,
+                 retry_after: int = 1) -> None:
+        """ Construct a new RenderPool. Worker processes are started on
+        first use.
+
+        :param factory: an importable function that returns the engine
+                        of a worker
+        :param workers: the number of worker processes, defaults to 2
+        :param queue_size: the number of renders that can wait for a
+                           worker, defaults to 4
+        :param timeout: the seconds to wait for a render, defaults to
+                        30
+        :param retry_after: the seconds clients are told to wait when
+                            the pool is full, defaults to 1
+        """
+        self.factory = factory
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.pending = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """ The worker process pool, created on first use. """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # Spawn, rather than fork, workers, since the
+                    # serving process runs background threads.
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=init_worker,
+                        initargs=(self.factory,))
+        return self._executor
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        """ Call an engine method in a worker process and wait for the
+        result.
+
+        :param method: the name of the engine method, such as
+                       'make_meme'
+        :return: the method's result
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            metrics.inc('meme_render_rejections_total')
+            raise RenderPoolFull('The render pool is full',
+                                 self.retry_after)
+        with self._lock:
+            self.pending += 1
+        return self._render(method, args, kwargs)
+
+    def call_idle(self, method: str, *args, **kwargs) -> Optional[Any]:
+        """ Call an engine method in a worker process for background
+        work, only if it takes no capacity that requests need: a worker
+        must be idle, and another slot must still be free for a
+        request. Otherwise return None at once, without counting a
+        rejection.
+
+        :param method: the name of the engine method, such as
+                       'make_meme'
+        :return: the method's result, or None if it was skipped
+        """
+        if self.pending >= self.workers or \
+                not self._slots.acquire(blocking=False):
+            return None
+        # Check that a slot is left over for requests.
+        if not self._slots.acquire(blocking=False):
+            self._slots.release()
+            return None
+        self._slots.release()
+        with self._lock:
+            self.pending += 1
+        return self._render(method, args, kwargs)
+
+    def _render(self, method: str, args: tuple,
+                kwargs: Dict[str, Any]) -> Any:
+        """ Run an admitted render in a worker process and wait for
+        the result. Its slot is freed when the render finishes.
+        """
+        executor = self.executor
+        try:
+            future = executor.submit(call_engine, method, args, kwargs)
+        except BrokenProcessPool:
+            self._release()
+            self._restart(executor)
+            raise RenderPoolFull('A render worker died', self.retry_after)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        with metrics.stage('render_pool'):
+            try:
+                result, timings = future.result(timeout=self.timeout)
+            except TimeoutError:
+                raise RenderPoolFull(f'The render took longer than '
+                                     f'{self.timeout}s', self.retry_after)
+            except BrokenProcessPool:
+                self._restart(executor)
+                raise RenderPoolFull('A render worker died',
+                                     self.retry_after)
+        metrics.registry.add_timings(timings)
+        return result
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        """ Discard a broken worker process pool, so that the next
+        render starts new workers.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.restarts += 1
+        print('Render Pool Error:  A render worker died, restarting')
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, future: Optional[Future] = None) -> None:
+        """ Free the slot of a finished render. """
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def shutdown(self) -> None:
+        """ Stop the worker processes. """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,144 @@
+import unittest
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from downloader import ImageDownloader
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_IMAGE = TESTS_ROOT.joinpath('DogImages/test_image.jpg')
+
+with open(TEST_IMAGE, 'rb') as f:
+    IMAGE_CONTENT = f.read()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """ Serves test responses for the downloader. """
+    requests = []
+
+    def do_GET(self):
+        ImageHandler.requests.append(self.path)
+        if self.path.split('?')[0] == '/dog.jpg':
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_body(IMAGE_CONTENT, 'image/jpeg', {'ETag': '"v1"'})
+        elif self.path == '/page.html':
+            self.send_body(b'<html></html>', 'text/html')
+        elif self.path == '/fake.jpg':
+            self.send_body(b'<html>not an image</html>', 'image/jpeg')
+        elif self.path == '/slow.jpg':
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.end_headers()
+            self.wfile.write(IMAGE_CONTENT[:100])
+            self.wfile.flush()
+            time.sleep(2)
+        elif self.path == '/drip.jpg':
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.end_headers()
+            for byte in IMAGE_CONTENT[:100]:
+                self.wfile.write(bytes([byte]))
+                self.wfile.flush()
+                time.sleep(0.05)
+        else:
+            self.send_body(b'', 'text/plain', status=404)
+
+    def send_body(self, body, content_type, headers=None, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestImageDownloader(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+        cls.server.daemon_threads = True
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever,
+                         daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.cache_dir = pathlib.Path(tempfile.mkdtemp())
+        self.downloader = ImageDownloader(self.cache_dir)
+        ImageHandler.requests = []
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_downloader_fetches_image(self):
+        content = self.downloader.fetch(f'{self.base_url}/dog.jpg')
+        self.assertEqual(content, IMAGE_CONTENT)
+
+    def test_downloader_reuses_cached_image_when_not_modified(self):
+        url = f'{self.base_url}/dog.jpg'
+        self.downloader.fetch(url)
+        content = ImageDownloader(self.cache_dir).fetch(url)
+
+        self.assertEqual(content, IMAGE_CONTENT)
+        self.assertEqual(self.downloader.downloads, 1)
+        self.assertEqual(len(ImageHandler.requests), 2)
+
+    def test_downloader_bounds_cache_size(self):
+        max_bytes = len(IMAGE_CONTENT) * 2
+        downloader = ImageDownloader(self.cache_dir,
+                                     cache_max_bytes=max_bytes)
+        for i in range(4):
+            downloader.fetch(f'{self.base_url}/dog.jpg?copy={i}')
+
+        size = sum(path.stat().st_size for path in self.cache_dir.iterdir()
+                   if not path.name.startswith('.'))
+        self.assertLessEqual(size, max_bytes)
+        self.assertGreater(downloader.cache.evictions, 0)
+
+    def test_downloader_rejects_non_image_content_type(self):
+        with self.assertRaisesRegex(Exception, 'not an image'):
+            self.downloader.fetch(f'{self.base_url}/page.html')
+
+    def test_downloader_rejects_non_image_content(self):
+        with self.assertRaisesRegex(Exception, 'not a supported image'):
+            self.downloader.fetch(f'{self.base_url}/fake.jpg')
+
+    def test_downloader_rejects_large_image(self):
+        downloader = ImageDownloader(max_bytes=1000)
+        with self.assertRaisesRegex(Exception, 'larger than'):
+            downloader.fetch(f'{self.base_url}/dog.jpg')
+
+    def test_downloader_times_out_slow_server(self):
+        downloader = ImageDownloader(read_timeout=0.2)
+        with self.assertRaisesRegex(Exception, 'Error downloading'):
+            downloader.fetch(f'{self.base_url}/slow.jpg')
+
+    def test_downloader_stops_server_dripping_bytes(self):
+        downloader = ImageDownloader(read_timeout=1.0, total_timeout=0.5)
+        start = time.monotonic()
+        with self.assertRaisesRegex(Exception, 'took longer than'):
+            downloader.fetch(f'{self.base_url}/drip.jpg')
+        self.assertLess(time.monotonic() - start, 2.0)
+
+    def test_downloader_reports_failed_request(self):
+        with self.assertRaisesRegex(Exception, 'status 404'):
+            self.downloader.fetch(f'{self.base_url}/missing.jpg')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,17 @@
 import unittest
 import pathlib
 import os
+import random
+import shutil
+import stat
+import sys
+import tempfile
 import pandas
 import subprocess
+import zipfile
 import docx
+import docx.enum.text
+from unittest import mock
 
 # import app
 from QuoteEngine import Ingestor
@@ -12,6 +20,9 @@ from QuoteEngine import TextIngestor
 from QuoteEngine import CSVIngestor
 from QuoteEngine import PDFIngestor
 from QuoteEngine import DocxIngestor
+from QuoteEngine import QuoteCache
+from QuoteEngine import DirectoryIngestor
+from QuoteEngine import QuoteStore
 
 TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
 TEST_CSV_FILE = TESTS_ROOT.joinpath('DogQuotes/DogQuotesCSV.csv')
@@ -23,12 +34,64 @@ TEST_JSON_FILE = TESTS_ROOT.joinpath('DogQuotes/DogQuotesJSON.json')
 
 class TestIngestor(unittest.TestCase):
 
+    def setUp(self):
+        self.tmp_dir = pathlib.Path(tempfile.mkdtemp())
+        self.cache_file = self.tmp_dir.joinpath('quotes.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
     # Ingestor Tests #
 
     def test_ingestor_returns_empty_quotes_for_unsupported_file(self):
         quotes = Ingestor.parse(TEST_JSON_FILE)
         self.assertFalse(quotes)
 
+    def write_quotes(self, name, lines):
+        quotes_file = self.tmp_dir.joinpath(name)
+        with open(quotes_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return quotes_file
+
+    def test_ingestor_iter_parse_yields_quotes_lazily(self):
+        quotes_file = self.write_quotes('quotes.txt',
+                                        ['Woof - Rex', 'Bark - Fido'])
+        quotes = Ingestor.iter_parse(quotes_file)
+        self.assertEqual(next(quotes).author, 'Rex')
+        self.assertEqual([q.author for q in quotes], ['Fido'])
+
+    def test_ingestor_reports_malformed_lines_and_continues(self):
+        quotes_file = self.write_quotes(
+            'quotes.txt', ['Woof - Rex', 'No author here', 'Bark - Fido'])
+        errors = []
+        quotes = Ingestor.parse(quotes_file,
+                                lambda *error: errors.append(error))
+
+        self.assertEqual([q.author for q in quotes], ['Rex', 'Fido'])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0][1:3], (2, 'No author here'))
+
+    def test_ingestor_reports_malformed_csv_rows(self):
+        quotes_file = self.write_quotes(
+            'quotes.csv', ['body,author', 'Woof,Rex', 'Bark,Fido,Extra'])
+        errors = []
+        quotes = Ingestor.parse(quotes_file,
+                                lambda *error: errors.append(error))
+
+        self.assertEqual([q.author for q in quotes], ['Rex'])
+        self.assertEqual(errors[0][1], 3)
+
+    def test_ingestor_samples_quotes_from_file(self):
+        lines = [f'Quote {i} - Author {i}' for i in range(100)]
+        quotes_file = self.write_quotes('quotes.txt', lines)
+        sample = Ingestor.sample(quotes_file, k=5,
+                                 rng=random.Random(1))
+
+        self.assertEqual(len(sample), 5)
+        self.assertEqual(len({q.author for q in sample}), 5)
+        self.assertEqual(len(Ingestor.sample(TEST_TXT_FILE, k=100)),
+                         len(Ingestor.parse(TEST_TXT_FILE)))
+
     # Text Ingestor Tests #
 
     def test_text_ingestor_returns_quote_objects(self):
@@ -88,6 +151,33 @@ class TestIngestor(unittest.TestCase):
                           CSVIngestor.CSVIngestor.parse,
                           TEST_JSON_FILE)
 
+    def test_csv_ingestor_reads_two_columns_without_pandas(self):
+        code = ('import sys\n'
+                'from QuoteEngine.CSVIngestor import CSVIngestor\n'
+                f'CSVIngestor.parse({str(TEST_CSV_FILE)!r})\n'
+                'print("pandas" in sys.modules)')
+        result = subprocess.run([sys.executable, '-c', code],
+                                capture_output=True, text=True,
+                                cwd=TESTS_ROOT.parent)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+    def test_csv_ingestor_reads_wide_files_in_chunks(self):
+        csv_file = self.tmp_dir.joinpath('wide.csv')
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write('body,author,source\n')
+            for i in range(25):
+                f.write(f'Quote {i},Author {i},Book\n')
+
+        original = CSVIngestor.CSVIngestor.chunk_size
+        CSVIngestor.CSVIngestor.chunk_size = 10
+        try:
+            quotes = Ingestor.parse(csv_file)
+        finally:
+            CSVIngestor.CSVIngestor.chunk_size = original
+
+        self.assertEqual(len(quotes), 25)
+        self.assertEqual(str(quotes[24]), '"Quote 24" - Author 24')
+
     # PDF Ingestor Tests #
 
     def test_pdf_ingestor_returns_quote_objects(self):
@@ -129,6 +219,49 @@ class TestIngestor(unittest.TestCase):
                           PDFIngestor.PDFIngestor.parse,
                           TEST_JSON_FILE)
 
+    def fake_pdftotext(self, script):
+        """ Install a stand-in pdftotext command running script. """
+        command = self.tmp_dir.joinpath('pdftotext')
+        with open(command, 'w') as f:
+            f.write(f'#!{sys.executable}\nimport sys, time\n{script}\n')
+        os.chmod(command, os.stat(command).st_mode | stat.S_IEXEC)
+        original = PDFIngestor.PDFIngestor.command
+        PDFIngestor.PDFIngestor.command = str(command)
+        self.addCleanup(setattr, PDFIngestor.PDFIngestor,
+                        'command', original)
+
+    def test_pdf_ingestor_streams_output_without_temp_files(self):
+        self.fake_pdftotext("print('Woof - Rex')\nprint()\n"
+                            "print('Bark - Fido')")
+        pdf_file = self.tmp_dir.joinpath('quotes.pdf')
+        shutil.copy(TEST_PDF_FILE, pdf_file)
+        before = set(os.listdir(self.tmp_dir))
+
+        quotes = PDFIngestor.PDFIngestor.parse(pdf_file)
+
+        self.assertEqual([str(q) for q in quotes],
+                         ['"Woof" - Rex', '"Bark" - Fido'])
+        self.assertEqual(set(os.listdir(self.tmp_dir)), before)
+
+    def test_pdf_ingestor_kills_subprocess_after_timeout(self):
+        self.fake_pdftotext('time.sleep(30)')
+        original = PDFIngestor.PDFIngestor.timeout
+        PDFIngestor.PDFIngestor.timeout = 0.2
+        self.addCleanup(setattr, PDFIngestor.PDFIngestor,
+                        'timeout', original)
+
+        with self.assertRaisesRegex(Exception, 'timed out'):
+            PDFIngestor.PDFIngestor.parse(TEST_PDF_FILE)
+
+    def test_pdf_ingestor_parses_many_files_on_pool(self):
+        self.fake_pdftotext("print(sys.argv[-2].rsplit('/', 1)[-1] "
+                            "+ ' - Rex')")
+        results = PDFIngestor.PDFIngestor.parse_many(
+            [TEST_PDF_FILE, TEST_PDF_FILE])
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][0].author, 'Rex')
+
     # DOCX Ingestor Tests #
 
     def test_docx_ingestor_returns_quote_objects(self):
@@ -156,11 +289,248 @@ class TestIngestor(unittest.TestCase):
         self.assertEqual(quote_obj_author, doc_quote_author)
         self.assertEqual(quote_obj_body, doc_quote_body)
 
+    def write_docx(self, name='quotes.docx'):
+        document = docx.Document()
+        document.add_paragraph('Woof - Rex')
+        run = document.add_paragraph('Bark\tloud').add_run(' - Fido')
+        run.add_break()
+        run.add_break(docx.enum.text.WD_BREAK.PAGE)
+        document.add_table(rows=1, cols=1).cell(0, 0).text = 'Nope - No'
+        document.add_paragraph('')
+        document.add_paragraph('Howl - Luna')
+        docx_file = self.tmp_dir.joinpath(name)
+        document.save(docx_file)
+        return docx_file
+
+    def test_docx_ingestor_streams_paragraphs_like_python_docx(self):
+        for docx_file in [TEST_DOCX_FILE, self.write_docx()]:
+            expected = [p.text for p in docx.Document(docx_file).paragraphs]
+            paragraphs = DocxIngestor.DocxIngestor._stream_paragraphs(
+                docx_file)
+            self.assertEqual(list(paragraphs), expected)
+
+    def test_docx_ingestor_finds_renamed_main_part(self):
+        source = self.write_docx('source.docx')
+        docx_file = self.tmp_dir.joinpath('renamed.docx')
+        with zipfile.ZipFile(source) as src, \
+                zipfile.ZipFile(docx_file, 'w') as dst:
+            for item in src.infolist():
+                content = src.read(item)
+                name = item.filename.replace('word/document.xml',
+                                             'word/main.xml')
+                if item.filename in ('_rels/.rels', '[Content_Types].xml'):
+                    content = content.replace(b'/word/document.xml',
+                                              b'/word/main.xml')
+                    content = content.replace(b'word/document.xml',
+                                              b'word/main.xml')
+                dst.writestr(name, content)
+
+        paragraphs = DocxIngestor.DocxIngestor._stream_paragraphs(
+            docx_file)
+        self.assertIsNotNone(paragraphs)
+        self.assertEqual([q.author for q in Ingestor.parse(docx_file)],
+                         ['Rex', 'Fido', 'Luna'])
+
+    def test_docx_ingestor_falls_back_to_python_docx(self):
+        docx_file = self.write_docx()
+        with mock.patch.object(DocxIngestor.DocxIngestor,
+                               '_stream_paragraphs', return_value=None):
+            quotes = Ingestor.parse(docx_file)
+        self.assertEqual([q.author for q in quotes],
+                         ['Rex', 'Fido', 'Luna'])
+
+    def test_docx_ingestor_does_not_import_python_docx(self):
+        code = ('import sys\n'
+                'from QuoteEngine import Ingestor\n'
+                f'quotes = Ingestor.parse({str(TEST_DOCX_FILE)!r})\n'
+                'print(len(quotes), "docx" in sys.modules)')
+        result = subprocess.run([sys.executable, '-c', code],
+                                capture_output=True, text=True,
+                                cwd=TESTS_ROOT.parent)
+        self.assertEqual(result.stdout.strip(), '4 False')
+
     def test_docx_ingestor_raises_error_for_wrong_filetype(self):
         self.assertRaises(Exception,
                           DocxIngestor.DocxIngestor.parse,
                           TEST_JSON_FILE)
 
+    # Directory Ingestor Tests #
+
+    def copy_quotes_dir(self):
+        quotes_dir = self.tmp_dir.joinpath('quotes')
+        quotes_dir.mkdir()
+        for name in ['DogQuotesTXT.txt', 'DogQuotesCSV.csv',
+                     'DogQuotesDOCX.docx', 'DogQuotesJSON.json']:
+            shutil.copy(TESTS_ROOT.joinpath('DogQuotes', name), quotes_dir)
+        return quotes_dir
+
+    def test_directory_ingestor_reports_each_file(self):
+        quotes_dir = self.copy_quotes_dir()
+        quotes, report = DirectoryIngestor.parse(quotes_dir)
+
+        counts = {item.path.name: item.count for item in report}
+        self.assertEqual(counts['DogQuotesTXT.txt'],
+                         len(Ingestor.parse(TEST_TXT_FILE)))
+        self.assertEqual(counts['DogQuotesCSV.csv'],
+                         len(Ingestor.parse(TEST_CSV_FILE)))
+        self.assertEqual(len(quotes), sum(counts.values()))
+        errors = [item.path.name for item in report if item.error]
+        self.assertEqual(errors, ['DogQuotesJSON.json'])
+
+    def test_directory_ingestor_survives_cache_store_errors(self):
+        quotes_dir = self.copy_quotes_dir()
+        cache = QuoteCache(self.cache_file)
+        self.addCleanup(cache.close)
+        with mock.patch.object(cache, 'store',
+                               side_effect=Exception('database is locked')):
+            quotes, report = DirectoryIngestor.parse(quotes_dir, cache)
+
+        self.assertTrue(quotes)
+        errors = [item.path.name for item in report if item.error]
+        self.assertEqual(errors, ['DogQuotesJSON.json'])
+
+    def test_directory_ingestor_uses_process_pool(self):
+        quotes_dir = self.copy_quotes_dir()
+        original = DirectoryIngestor.process_min_bytes
+        DirectoryIngestor.process_min_bytes = 0
+        try:
+            quotes, report = DirectoryIngestor.parse(quotes_dir)
+        finally:
+            DirectoryIngestor.process_min_bytes = original
+
+        serial = []
+        for item in report:
+            serial.extend(Ingestor.parse(item.path))
+        self.assertEqual([str(q) for q in quotes],
+                         [str(q) for q in serial])
+
+    def test_directory_ingestor_parses_pdfs_on_shared_pool(self):
+        self.fake_pdftotext("print('Woof - Rex')")
+        quotes_dir = self.copy_quotes_dir()
+        shutil.copy(TEST_PDF_FILE, quotes_dir)
+        pool = PDFIngestor.PDFIngestor.pool
+        with mock.patch.object(PDFIngestor.PDFIngestor, 'pool',
+                               side_effect=pool) as shared:
+            quotes, report = DirectoryIngestor.parse(quotes_dir)
+
+        shared.assert_called_once_with()
+        counts = {item.path.name: item.count for item in report}
+        self.assertEqual(counts['DogQuotesPDF.pdf'], 1)
+
+    def test_directory_ingestor_loads_unchanged_files_from_cache(self):
+        quotes_dir = self.copy_quotes_dir()
+        corpus = QuoteCache(self.cache_file)
+        DirectoryIngestor.parse(quotes_dir, corpus)
+        quotes, report = DirectoryIngestor.parse(quotes_dir, corpus)
+        corpus.close()
+
+        cached = [item.path.name for item in report if item.cached]
+        self.assertEqual(cached, ['DogQuotesCSV.csv',
+                                  'DogQuotesDOCX.docx',
+                                  'DogQuotesTXT.txt'])
+        self.assertTrue(quotes)
+
+    def test_directory_ingestor_streams_cached_quotes_into_store(self):
+        quotes_dir = self.copy_quotes_dir()
+        corpus = QuoteCache(self.cache_file)
+        self.addCleanup(corpus.close)
+        parsed, _ = DirectoryIngestor.parse(quotes_dir, corpus)
+        with mock.patch.object(corpus, 'lookup') as lookup:
+            store, report = DirectoryIngestor.parse(quotes_dir, corpus,
+                                                    QuoteStore())
+
+        lookup.assert_not_called()
+        self.assertIsInstance(store, QuoteStore)
+        self.assertEqual([str(q) for q in store], [str(q) for q in parsed])
+        counts = {item.path.name: item.count for item in report
+                  if item.cached}
+        self.assertEqual(counts['DogQuotesTXT.txt'],
+                         len(Ingestor.parse(TEST_TXT_FILE)))
+
+    # Quote Store Tests #
+
+    def test_quote_store_returns_stored_quotes(self):
+        quotes = Ingestor.parse(TEST_TXT_FILE) + [
+            QuoteModel('Caf\u00e9 "au lait"', 'Bork'),
+            QuoteModel('"Woof"', 'Bork')]
+        store = QuoteStore(quotes)
+
+        self.assertEqual(len(store), len(quotes))
+        self.assertEqual([str(q) for q in store], [str(q) for q in quotes])
+        self.assertEqual(str(store[-1]), str(quotes[-1]))
+        self.assertIsInstance(store[0], QuoteModel)
+        self.assertRaises(IndexError, store.__getitem__, len(quotes))
+
+    def test_quote_store_interns_authors(self):
+        store = QuoteStore(QuoteModel(f'Quote {i}', f'Author {i % 3}')
+                           for i in range(30))
+        self.assertEqual(len(store.authors), 3)
+
+    def test_quote_store_samples_uniformly(self):
+        store = QuoteStore(QuoteModel(f'Quote {i}', 'Author')
+                           for i in range(4))
+        rng = random.Random(0)
+        seen = {store.random(rng).body for _ in range(200)}
+        self.assertEqual(len(seen), 4)
+        self.assertRaises(IndexError, QuoteStore().random)
+
+    def test_quote_model_has_no_instance_dict(self):
+        self.assertFalse(hasattr(QuoteModel('Woof', 'Rex'), '__dict__'))
+
+    # Quote Cache Tests #
+
+    def test_quote_cache_loads_unchanged_file_from_cache(self):
+        corpus = QuoteCache(self.cache_file)
+        parsed = corpus.parse(TEST_TXT_FILE)
+        corpus.close()
+
+        corpus = QuoteCache(self.cache_file)
+        cached = corpus.parse(TEST_TXT_FILE)
+        corpus.close()
+
+        self.assertEqual(corpus.hits, 1)
+        self.assertEqual([str(q) for q in parsed],
+                         [str(q) for q in cached])
+
+    def test_quote_cache_reingests_modified_file(self):
+        quotes_file = self.tmp_dir.joinpath('quotes.txt')
+        shutil.copy(TEST_TXT_FILE, quotes_file)
+        corpus = QuoteCache(self.cache_file)
+        count = len(corpus.parse(quotes_file))
+
+        with open(quotes_file, 'a', encoding='utf-8') as f:
+            f.write('\nNew quote - New author\n')
+        quotes = corpus.parse(quotes_file)
+        corpus.close()
+
+        self.assertEqual(len(quotes), count + 1)
+        self.assertEqual(quotes[-1].author, 'New author')
+        self.assertEqual(corpus.misses, 2)
+
+    def test_quote_cache_hashes_touched_file(self):
+        quotes_file = self.tmp_dir.joinpath('quotes.txt')
+        shutil.copy(TEST_TXT_FILE, quotes_file)
+        corpus = QuoteCache(self.cache_file)
+        corpus.parse(quotes_file)
+
+        st = os.stat(quotes_file)
+        os.utime(quotes_file, ns=(st.st_atime_ns,
+                                  st.st_mtime_ns + 1_000_000_000))
+        corpus.parse(quotes_file)
+        corpus.close()
+
+        self.assertEqual(corpus.hits, 1)
+
+    def test_quote_cache_streams_quotes_in_batches(self):
+        corpus = QuoteCache(self.cache_file)
+        self.addCleanup(corpus.close)
+        corpus.batch_size = 2
+        parsed = corpus.parse(TEST_TXT_FILE)
+
+        self.assertTrue(corpus.check(TEST_TXT_FILE))
+        self.assertEqual([str(q) for q in corpus.iter_quotes(TEST_TXT_FILE)],
+                         [str(q) for q in parsed])
+
 
 if __name__ == '__main__':
     unittest.main()
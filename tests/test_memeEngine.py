@@ -1,9 +1,17 @@
 import unittest
+import io
 import pathlib
 import os
-from PIL import Image, ImageChops
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+from PIL import Image, ImageChops, ImageDraw
 
-from MemeEngine import MemeEngine
+from MemeEngine import DerivativeStore, MemeEngine, OutputStore
+from MemeEngine.FontRegistry import FontRegistry
+from MemeEngine.TextWrapper import TextWrapper
 
 TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
 TEST_MEMES_DIR = TESTS_ROOT.joinpath('Memes')
@@ -15,6 +23,10 @@ class TestMemeEngine(unittest.TestCase):
 
     def setUp(self) -> None:
         self.meme = MemeEngine(TEST_MEMES_DIR)
+        self.tmp_dir = pathlib.Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
 
     def test_meme_engine_returns_image_path(self):
         text = 'Life is like peanut butter: crunchy'
@@ -43,6 +55,458 @@ class TestMemeEngine(unittest.TestCase):
 
         os.remove(generated_meme)
 
+    def test_meme_engine_caches_resized_image(self):
+        first = self.meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut')
+        second = self.meme.make_meme(TEST_IMAGE, 'Bark', 'Peanut')
+
+        stats = self.meme.image_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+        os.remove(first)
+        os.remove(second)
+
+    def test_image_cache_invalidates_changed_file(self):
+        tmp_image = TEST_MEMES_DIR.joinpath('cache_test.jpg')
+        shutil.copy(TEST_IMAGE, tmp_image)
+        try:
+            first = self.meme.make_meme(tmp_image, 'Woof', 'Peanut')
+            st = os.stat(tmp_image)
+            os.utime(tmp_image, ns=(st.st_atime_ns,
+                                    st.st_mtime_ns + 1_000_000_000))
+            second = self.meme.make_meme(tmp_image, 'Bark', 'Peanut')
+
+            stats = self.meme.image_cache.stats()
+            self.assertEqual(stats['misses'], 2)
+            self.assertEqual(stats['invalidations'], 1)
+            self.assertEqual(stats['entries'], 1)
+        finally:
+            os.remove(tmp_image)
+
+        os.remove(first)
+        os.remove(second)
+
+    def test_image_cache_respects_byte_budget(self):
+        meme = MemeEngine(TEST_MEMES_DIR, cache_bytes=1)
+        generated_meme = meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut')
+
+        stats = meme.image_cache.stats()
+        self.assertEqual(stats['entries'], 0)
+        self.assertEqual(stats['evictions'], 1)
+
+        os.remove(generated_meme)
+
+    def test_meme_engine_reuses_identical_memes(self):
+        first = self.meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut', seed=7)
+        second = self.meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut', seed=7)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.meme.renders, 1)
+        self.assertEqual(self.meme.dedup_hits, 1)
+
+        os.remove(first)
+
+    def test_meme_engine_names_differ_by_content(self):
+        base = self.meme.output_name(TEST_IMAGE, 'Woof', 'Peanut', 500, 7)
+        self.assertNotEqual(base, self.meme.output_name(
+            TEST_IMAGE, 'Woof', 'Peanut', 500, 8))
+        self.assertNotEqual(base, self.meme.output_name(
+            TEST_IMAGE, 'Bark', 'Peanut', 500, 7))
+        self.assertNotEqual(base, self.meme.output_name(
+            TEST_IMAGE, 'Woof', 'Peanut', 400, 7))
+
+    def test_meme_engine_keeps_one_image_hash_per_file(self):
+        source = self.tmp_dir.joinpath('dog.jpg')
+        shutil.copy(TEST_IMAGE, source)
+        first = self.meme.output_name(source, 'Woof', 'Peanut', 500, 1)
+
+        with open(source, 'ab') as f:
+            f.write(b'\0')
+        second = self.meme.output_name(source, 'Woof', 'Peanut', 500, 1)
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(list(self.meme._digests), [str(source)])
+
+    def test_meme_engine_seed_is_deterministic(self):
+        first = self.meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut', seed=7)
+        first_img = Image.open(first).convert('RGB')
+        os.remove(first)
+
+        second = self.meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut', seed=7)
+        second_img = Image.open(second).convert('RGB')
+        os.remove(second)
+
+        diff = ImageChops.difference(first_img, second_img)
+        self.assertIsNone(diff.getbbox())
+
+    def test_meme_engine_coalesces_concurrent_renders(self):
+        paths = []
+        threads = [threading.Thread(target=lambda: paths.append(
+                       self.meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut',
+                                           seed=7)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(self.meme.renders, 1)
+
+        os.remove(paths[0])
+
+    # In-Memory Render Tests #
+
+    def test_meme_engine_renders_bytes_in_memory(self):
+        before = set(os.listdir(TEST_MEMES_DIR))
+        content = TEST_IMAGE.read_bytes()
+        buffer = self.meme.make_meme_bytes(content, 'Woof', 'Peanut',
+                                           seed=1)
+
+        with Image.open(buffer) as im:
+            self.assertEqual(im.format, 'PNG')
+            self.assertEqual(im.width, 500)
+        self.assertEqual(set(os.listdir(TEST_MEMES_DIR)), before)
+        self.assertEqual(self.meme.image_cache.stats()['misses'], 0)
+
+    def test_meme_engine_dedups_seeded_memes_in_memory(self):
+        content = TEST_IMAGE.read_bytes()
+        first = self.meme.make_meme_bytes(content, 'Woof', 'Peanut',
+                                          seed=1)
+        second = self.meme.make_meme_bytes(io.BytesIO(content), 'Woof',
+                                           'Peanut', seed=1)
+
+        self.assertEqual(first.getvalue(), second.getvalue())
+        self.assertEqual(self.meme.renders, 1)
+        self.assertEqual(self.meme.dedup_hits, 1)
+
+    def test_meme_engine_renders_any_image_source_alike(self):
+        content = TEST_IMAGE.read_bytes()
+        with Image.open(TEST_IMAGE) as im:
+            im.load()
+        size = im.size
+        sources = [TEST_IMAGE, content, io.BytesIO(content), im]
+        renders = [self.meme.render(source, 'Woof', 'Peanut', seed=1)
+                   for source in sources]
+
+        for render in renders[1:]:
+            diff = ImageChops.difference(renders[0].convert('RGB'),
+                                         render.convert('RGB'))
+            self.assertIsNone(diff.getbbox())
+        self.assertEqual(im.size, size)
+
+    def test_meme_engine_names_image_sources_by_content(self):
+        content = TEST_IMAGE.read_bytes()
+        self.assertEqual(
+            self.meme.output_name(TEST_IMAGE, 'Woof', 'Peanut', 500, 1),
+            self.meme.output_name(content, 'Woof', 'Peanut', 500, 1))
+
+        path = self.meme.make_meme(io.BytesIO(content), 'Woof', 'Peanut',
+                                   seed=1)
+        self.assertEqual(path, self.meme.make_meme(TEST_IMAGE, 'Woof',
+                                                   'Peanut', seed=1))
+        self.assertEqual(self.meme.dedup_hits, 1)
+
+        os.remove(path)
+
+    # Output Store Tests #
+
+    def test_output_store_evicts_least_recently_used(self):
+        store = OutputStore(self.tmp_dir, max_bytes=250)
+        now = time.time()
+        for i, name in enumerate(['a.png', 'b.png', 'c.png']):
+            path = store.path(name)
+            path.write_bytes(b'x' * 100)
+            os.utime(path, (now - 30 + i, now))
+        store.touch(store.path('a.png'))
+
+        store.enforce()
+
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)),
+                         ['.lock', 'a.png', 'c.png'])
+        stats = store.stats()
+        self.assertEqual(stats['files'], 2)
+        self.assertEqual(stats['bytes'], 200)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_output_store_expires_old_memes(self):
+        store = OutputStore(self.tmp_dir, max_age=60)
+        old, new = store.path('old.png'), store.path('new.png')
+        old.write_bytes(b'x')
+        new.write_bytes(b'x')
+        os.utime(old, (time.time(), time.time() - 120))
+
+        self.assertFalse(store.touch(old))
+        store.add(new)
+
+        self.assertFalse(old.exists())
+        self.assertTrue(new.exists())
+        self.assertEqual(store.stats()['expirations'], 1)
+
+    def test_output_store_scans_only_when_due(self):
+        store = OutputStore(self.tmp_dir, max_bytes=1000)
+        for i in range(9):
+            path = store.path(f'{i}.png')
+            path.write_bytes(b'x' * 100)
+            store.add(path)
+        self.assertEqual(store.scans, 1)
+
+        path = store.path('9.png')
+        path.write_bytes(b'x' * 200)
+        store.add(path)
+
+        self.assertEqual(store.scans, 2)
+        self.assertEqual(store.stats()['bytes'], 900)
+        self.assertEqual(store.evictions, 2)
+
+    def test_output_store_reports_bytes_without_scanning(self):
+        store = OutputStore(self.tmp_dir, max_bytes=1000)
+        self.tmp_dir.joinpath('old.png').write_bytes(b'x' * 50)
+        self.assertEqual(store.current_bytes, 50)
+
+        path = store.path('new.png')
+        path.write_bytes(b'x' * 100)
+        store.add(path)
+        scans = store.scans
+        with mock.patch.object(store, '_scan') as scan:
+            self.assertEqual(store.current_bytes, 150)
+        scan.assert_not_called()
+        self.assertEqual(store.scans, scans)
+
+    def test_meme_engine_rerenders_evicted_meme(self):
+        meme = MemeEngine(None, store=OutputStore(self.tmp_dir, max_bytes=1))
+
+        first = meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut', seed=1)
+        second = meme.make_meme(TEST_IMAGE, 'Bark', 'Peanut', seed=1)
+        self.assertFalse(first.exists())
+        self.assertTrue(second.exists())
+        self.assertEqual(first.parent, self.tmp_dir)
+
+        meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut', seed=1)
+        self.assertEqual(meme.renders, 3)
+        self.assertEqual(meme.dedup_hits, 0)
+
+    # Encoder Tests #
+
+    def test_meme_engine_encodes_with_presets(self):
+        meme = MemeEngine(TEST_MEMES_DIR, encoder='small')
+        path = meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut', seed=1)
+        jpeg = meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut', seed=1,
+                              encoder='fast')
+
+        self.assertEqual(path.suffix, '.webp')
+        self.assertEqual(jpeg.suffix, '.jpeg')
+        with Image.open(path) as im:
+            self.assertEqual(im.format, 'WEBP')
+        with Image.open(jpeg) as im:
+            self.assertEqual(im.format, 'JPEG')
+
+        os.remove(path)
+        os.remove(jpeg)
+
+    def test_meme_engine_names_differ_by_encoder_settings(self):
+        names = {self.meme.output_name(TEST_IMAGE, 'Woof', 'Peanut',
+                                       500, 1, settings=settings)
+                 for settings in [{'format': 'JPEG', 'quality': 80},
+                                  {'format': 'JPEG', 'quality': 90},
+                                  self.meme.encoder_options('fast')]}
+        self.assertEqual(len(names), 3)
+
+    def test_meme_engine_encodes_alpha_images_as_jpeg(self):
+        im = Image.new('RGBA', (100, 100), (0, 0, 0, 0))
+        buffer = self.meme.make_meme_bytes(
+            im, 'Woof', 'Peanut', encoder={'format': 'jpeg'})
+        with Image.open(buffer) as out:
+            self.assertEqual(out.format, 'JPEG')
+
+    def test_meme_engine_rejects_unknown_encoder_preset(self):
+        with self.assertRaises(Exception):
+            self.meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut',
+                                encoder='tiny')
+
+    # Image Loading Tests #
+
+    def test_load_image_decodes_jpeg_at_reduced_scale(self):
+        large = self.tmp_dir.joinpath('large.jpg')
+        with Image.open(TEST_IMAGE) as im:
+            im.resize((im.width * 8, im.height * 8)).save(large)
+
+        with Image.open(large) as im:
+            size = MemeEngine.scaled_size(im, 200)
+        resized = MemeEngine.load_image(large, 200)
+        self.assertEqual(resized.size, size)
+
+    def test_meme_engine_rejects_images_over_pixel_limit(self):
+        meme = MemeEngine(TEST_MEMES_DIR, max_pixels=100)
+        with self.assertRaises(Exception):
+            meme.render(TEST_IMAGE, 'Woof', 'Peanut')
+        with self.assertRaises(Exception):
+            meme.make_meme_bytes(TEST_IMAGE.read_bytes(), 'Woof', 'Peanut')
+
+    def test_meme_engine_resample_filter_is_selectable(self):
+        nearest = MemeEngine(TEST_MEMES_DIR, resample='nearest')
+        lanczos = MemeEngine(TEST_MEMES_DIR, resample=Image.LANCZOS)
+
+        self.assertEqual(nearest.resample, Image.NEAREST)
+        self.assertNotEqual(
+            nearest.output_name(TEST_IMAGE, 'Woof', 'Peanut', 500, 1),
+            lanczos.output_name(TEST_IMAGE, 'Woof', 'Peanut', 500, 1))
+
+    # Derivative Store Tests #
+
+    def test_derivative_store_shares_resized_images(self):
+        first = MemeEngine(TEST_MEMES_DIR, derivatives=DerivativeStore(
+            self.tmp_dir, TEST_IMAGE.parent))
+        second = MemeEngine(TEST_MEMES_DIR, derivatives=DerivativeStore(
+            self.tmp_dir, TEST_IMAGE.parent))
+
+        self.assertEqual(first.build_derivatives([TEST_IMAGE]), 1)
+        self.assertEqual(first.build_derivatives([TEST_IMAGE]), 0)
+        expected = first.render(TEST_IMAGE, 'Woof', 'Peanut', seed=1)
+        shared = second.render(TEST_IMAGE, 'Woof', 'Peanut', seed=1)
+
+        self.assertEqual(second.derivatives.builds, 0)
+        self.assertEqual(second.image_cache.stats()['misses'], 0)
+        self.assertEqual(shared.mode, 'RGB')
+        self.assertIsNone(ImageChops.difference(expected,
+                                                shared).getbbox())
+
+    def test_derivative_store_rebuilds_changed_source(self):
+        source = self.tmp_dir.joinpath('dog.jpg')
+        shutil.copy(TEST_IMAGE, source)
+        store = DerivativeStore(self.tmp_dir.joinpath('derivatives'),
+                                self.tmp_dir)
+
+        store.get(source, 500, MemeEngine.load_image)
+        with Image.open(TEST_IMAGE) as im:
+            im.rotate(90).save(source)
+        rotated = store.get(source, 500, MemeEngine.load_image)
+
+        self.assertEqual(store.builds, 2)
+        self.assertEqual(rotated.size,
+                         MemeEngine.load_image(source, 500).size)
+
+    def test_derivative_store_ignores_other_images(self):
+        store = DerivativeStore(self.tmp_dir, TEST_IMAGE.parent)
+
+        self.assertIsNone(store.get(TEST_MEME, 500, MemeEngine.load_image))
+        self.assertIsNone(store.get(TEST_IMAGE, 400, MemeEngine.load_image))
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+    # Caption Layer Tests #
+
+    def test_caption_layer_is_rendered_once_per_caption(self):
+        with Image.open(TEST_IMAGE) as im:
+            im.load()
+        sources = [TEST_IMAGE, im.rotate(180), im.convert('RGBA')]
+        for source in sources:
+            self.meme.render(source, 'Woof', 'Peanut', seed=1)
+
+        stats = self.meme.caption_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 2)
+
+    def test_caption_layer_composites_like_drawn_text(self):
+        base = self.meme.load_image(TEST_IMAGE, 500)
+        caption = self.meme.get_wrapped_text('Woof - Peanut',
+                                             self.meme.font, 300)
+        layer = self.meme.render_caption('Woof - Peanut', 300)
+
+        for mode in ('RGB', 'RGBA', 'L', 'P'):
+            im = self.meme.resize(base.convert(mode), base.width)
+            self.assertNotEqual(im.mode, 'P')
+            drawn = im.copy()
+            ImageDraw.Draw(drawn).text((80, 120), caption, fill='white',
+                                       font=self.meme.font.font)
+            composited = im.copy()
+            self.meme.composite(composited, layer, (80, 120))
+            diff = ImageChops.difference(drawn, composited)
+            self.assertIsNone(diff.getbbox())
+
+    def test_meme_engine_draws_white_captions_on_palette_images(self):
+        buffer = io.BytesIO()
+        with Image.open(TEST_IMAGE) as im:
+            im.convert('P', palette=Image.Palette.ADAPTIVE).save(
+                buffer, format='PNG')
+        meme = self.meme.render(buffer.getvalue(), 'Woof', 'Peanut',
+                                seed=1)
+
+        self.assertEqual(meme.mode, 'RGB')
+        self.assertIn((255, 255, 255), [color for _, color in
+                                        meme.getcolors(meme.width *
+                                                       meme.height)])
+
+    def test_make_memes_puts_one_caption_on_many_images(self):
+        with Image.open(TEST_IMAGE) as im:
+            im.load()
+        imgs = [TEST_IMAGE, im.rotate(180), im.transpose(
+            Image.Transpose.FLIP_LEFT_RIGHT)]
+        paths = self.meme.make_memes(imgs, 'Woof', 'Peanut', seed=1)
+        for path in paths:
+            self.addCleanup(os.remove, path)
+
+        self.assertEqual(len(set(paths)), 3)
+        self.assertEqual(paths[0], self.meme.make_meme(
+            TEST_IMAGE, 'Woof', 'Peanut', seed=1))
+        self.assertEqual(self.meme.caption_cache.stats()['misses'], 1)
+        self.assertEqual(self.meme.renders, 3)
+
+    # Font Registry Tests #
+
+    def test_font_registry_loads_each_font_once(self):
+        font = FontRegistry.get('LilitaOne-Regular.ttf', 22)
+        self.assertIs(font, FontRegistry.get('LilitaOne-Regular.ttf', 22))
+        self.assertIsNot(font,
+                         FontRegistry.get('LilitaOne-Regular.ttf', 30))
+
+    def test_font_registry_measures_like_freetype(self):
+        font = FontRegistry.get('LilitaOne-Regular.ttf', 22)
+        for text in ['Life is like peanut butter: crunchy - Peanut',
+                     'AVAWAY To Ta', 'caf\u00e9 \u2014 d\u00e9j\u00e0 vu']:
+            self.assertEqual(font.getlength(text),
+                             font.font.getlength(text))
+
+    def test_font_registry_is_independent_of_working_directory(self):
+        cwd = os.getcwd()
+        os.chdir(TESTS_ROOT)
+        try:
+            meme = MemeEngine(TEST_MEMES_DIR, font_size=30)
+            generated_meme = meme.make_meme(TEST_IMAGE, 'Woof', 'Peanut')
+        finally:
+            os.chdir(cwd)
+
+        self.assertTrue(generated_meme.exists())
+        os.remove(generated_meme)
+
+    # Text Wrapper Tests #
+
+    def test_text_wrapper_matches_line_by_line_measurement(self):
+        font = FontRegistry.get('LilitaOne-Regular.ttf', 22)
+        text = ('To bork or not to bork, that is the question. '
+                'He who smelt it dealt it - Stinky') * 5
+        for line_length in [40, 120, 300]:
+            wrapped = TextWrapper().wrap(text, font, line_length)
+            self.assertEqual(wrapped.split(), text.split())
+            for line in wrapped.split('\n'):
+                if ' ' in line:
+                    self.assertLessEqual(font.font.getlength(line),
+                                         line_length)
+
+    def test_text_wrapper_handles_plain_freetype_fonts(self):
+        font = FontRegistry.get('LilitaOne-Regular.ttf', 22)
+        text = 'Life is like peanut butter: crunchy - Peanut'
+        self.assertEqual(TextWrapper().wrap(text, font.font, 150),
+                         TextWrapper().wrap(text, font, 150))
+
+    def test_text_wrapper_memoizes_layouts(self):
+        font = FontRegistry.get('LilitaOne-Regular.ttf', 22)
+        wrapper = TextWrapper(max_entries=1)
+        first = wrapper.wrap('To bork or not to bork', font, 100)
+        self.assertIs(first, wrapper.wrap('To bork or not to bork',
+                                          font, 100))
+        wrapper.wrap('He who smelt it', font, 100)
+        self.assertEqual(len(wrapper._layouts), 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import time
+
+from metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.01, 0.1))
+
+    def test_render_reports_counters_and_histograms(self):
+        self.metrics.inc('meme_renders_total')
+        self.metrics.inc('meme_renders_total', 2)
+        self.metrics.observe('meme_stage_seconds', 0.05, stage='decode')
+        self.metrics.observe('meme_stage_seconds', 0.5, stage='decode')
+
+        text = self.metrics.render()
+
+        self.assertIn('# TYPE meme_renders_total counter\n'
+                      'meme_renders_total 3\n', text)
+        self.assertIn('meme_stage_seconds_bucket{stage="decode",le="0.01"} 0',
+                      text)
+        self.assertIn('meme_stage_seconds_bucket{stage="decode",le="0.1"} 1',
+                      text)
+        self.assertIn('meme_stage_seconds_bucket{stage="decode",le="+Inf"} 2',
+                      text)
+        self.assertIn('meme_stage_seconds_count{stage="decode"} 2', text)
+
+    def test_stage_timings_are_collected_for_server_timing(self):
+        self.metrics.start_request()
+        with self.metrics.stage('draw'):
+            time.sleep(0.01)
+        with self.metrics.stage('encode'):
+            pass
+
+        header = self.metrics.end_request()
+
+        self.assertRegex(header, r'^draw;dur=\d+\.\d\d, encode;dur=')
+        self.assertEqual(self.metrics.end_request(), '')
+
+    def test_label_values_are_escaped(self):
+        self.metrics.inc('meme_downloads_total', result='a "b"\n')
+        self.assertIn('meme_downloads_total{result="a \\"b\\"\\n"} 1',
+                      self.metrics.render())
+
+    def test_disabled_metrics_record_nothing(self):
+        metrics = Metrics(enabled=False)
+        metrics.start_request()
+        with metrics.stage('draw'):
+            pass
+        metrics.inc('meme_renders_total')
+
+        self.assertEqual(metrics.render(), '\n')
+        self.assertEqual(metrics.end_request(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
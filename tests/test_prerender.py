@@ -0,0 +1,81 @@
+import unittest
+import itertools
+import time
+
+from prerender import MemePool
+
+
+def wait_for(condition, timeout=5.0):
+    """ Wait until the condition is true or the timeout passes. """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestMemePool(unittest.TestCase):
+
+    def setUp(self):
+        self.counter = itertools.count()
+        self.pool = MemePool(lambda: next(self.counter), depth=3)
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_pool_fills_to_depth_in_background(self):
+        self.pool.start()
+        wait_for(lambda: len(self.pool) == 3)
+
+        self.assertEqual(len(self.pool), 3)
+        self.assertEqual(self.pool.get(), 0)
+        wait_for(lambda: len(self.pool) == 3)
+        self.assertEqual(len(self.pool), 3)
+
+    def test_empty_pool_returns_none_without_waiting(self):
+        self.assertIsNone(self.pool.get())
+        stats = self.pool.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['ready'], 0)
+
+    def test_pool_refill_rate_is_limited(self):
+        pool = MemePool(lambda: next(self.counter), depth=10, rate=20)
+        self.addCleanup(pool.stop)
+        pool.start()
+        time.sleep(0.25)
+
+        self.assertLessEqual(pool.stats()['produced'], 7)
+
+    def test_pool_survives_producer_errors(self):
+        def producer():
+            raise Exception('No default quotes or images')
+
+        pool = MemePool(producer, depth=1)
+        self.addCleanup(pool.stop)
+        pool.start()
+        wait_for(lambda: pool.errors > 0)
+
+        self.assertEqual(pool.errors, 1)
+        self.assertIsNone(pool.get())
+
+    def test_pool_skips_memes_the_producer_declines(self):
+        memes = iter([None, None, 'meme'])
+        pool = MemePool(lambda: next(memes, None), depth=1)
+        pool.skip_delay = 0.01
+        self.addCleanup(pool.stop)
+        pool.start()
+        wait_for(lambda: len(pool) == 1)
+
+        self.assertEqual(pool.get(), 'meme')
+        self.assertGreaterEqual(pool.skipped, 2)
+        self.assertEqual(pool.errors, 0)
+
+    def test_clear_discards_ready_memes(self):
+        self.pool.start()
+        wait_for(lambda: len(self.pool) == 3)
+        self.pool.stop()
+        self.pool.clear()
+
+        self.assertEqual(len(self.pool), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
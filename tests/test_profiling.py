@@ -0,0 +1,79 @@
+import unittest
+import json
+import pathlib
+import shutil
+import tempfile
+from unittest import mock
+
+from profiling import Profiler, report
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = pathlib.Path(tempfile.mkdtemp())
+        self.profiler = Profiler(self.tmp_dir, rate=1.0, keep=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_unsampled_calls_are_not_profiled(self):
+        profiler = Profiler(self.tmp_dir, rate=0.0)
+        double = profiler.sampled()(lambda x: x * 2)
+
+        self.assertEqual(double(2), 4)
+        self.assertEqual(list(self.tmp_dir.iterdir()), [])
+
+    def test_sampled_call_dumps_profile_and_params(self):
+        @self.profiler.sampled('double', lambda x: {'x': x})
+        def double(x):
+            return x * 2
+
+        self.assertEqual(double(2), 4)
+
+        dumps = list(self.tmp_dir.glob('*-double.prof'))
+        self.assertEqual(len(dumps), 1)
+        with open(dumps[0].with_suffix('.json'), encoding='utf-8') as f:
+            info = json.load(f)
+        self.assertEqual(info['name'], 'double')
+        self.assertEqual(info['params'], {'x': 2})
+
+    def test_oldest_dumps_are_rotated_out(self):
+        for i in range(4):
+            with self.profiler.profile(f'call{i}'):
+                sum(range(100))
+
+        names = sorted(path.name.split('-', 2)[-1]
+                       for path in self.tmp_dir.iterdir())
+        self.assertEqual(names, ['call2.json', 'call2.prof',
+                                 'call3.json', 'call3.prof'])
+
+    def test_report_aggregates_dumps(self):
+        for _ in range(2):
+            with self.profiler.profile('work'):
+                sorted(range(1000), key=lambda x: -x)
+
+        text = report(self.tmp_dir, top=5)
+
+        self.assertIn('2 profiles: 2 work', text)
+        self.assertIn('<lambda>', text)
+        self.assertIn('No profiles', report(self.tmp_dir, name='other'))
+
+    def test_app_routes_are_sampled(self):
+        import app
+
+        client = app.app.test_client()
+        with mock.patch.object(app.profiler, 'directory', self.tmp_dir), \
+                mock.patch.object(app.profiler, 'rate', 1.0):
+            client.get('/create')
+            client.get('/')
+
+        dumps = list(self.tmp_dir.glob('*.prof'))
+        self.assertEqual([path.stem.split('-', 2)[-1] for path in dumps],
+                         ['meme_rand'])
+        with open(dumps[0].with_suffix('.json'), encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['params']['path'], '/')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,16 @@
 import app
+import os
+import pathlib
+import subprocess
+import sys
+import time
 import unittest
+from unittest import mock
+
+from prerender import MemePool
+from serving import RenderPoolFull
+
+ROOT_DIR = pathlib.Path(__file__).parent.parent.resolve()
 
 
 class TestRoutes(unittest.TestCase):
@@ -12,6 +23,118 @@ class TestRoutes(unittest.TestCase):
         response = self.app.get('/')
         self.assertEqual(response.status_code, 200)
 
+    def test_home_route_serves_pre_rendered_meme(self):
+        self.app.get('/create')
+        produced = []
+
+        def producer():
+            produced.append(app.random_meme())
+            return produced[-1]
+
+        pool = MemePool(producer, depth=1)
+        pool.start()
+        deadline = time.monotonic() + 5
+        while not len(pool) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pool.stop()
+        path = produced[0]
+
+        with mock.patch.object(app, 'pool', pool):
+            response = self.app.get('/')
+
+        self.assertIn(path.name.encode(), response.data)
+        self.assertEqual(pool.hits, 1)
+        os.remove(path)
+
+    def test_home_route_reports_server_timing(self):
+        # Render, rather than reuse a meme made by an earlier test.
+        with mock.patch.object(app.meme.store, 'touch',
+                               return_value=False):
+            response = self.app.get('/')
+        stages = [entry.split(';')[0] for entry in
+                  response.headers['Server-Timing'].split(', ')]
+        self.assertIn('draw', stages)
+        self.assertEqual(stages[-1], 'total')
+
+    def test_metrics_route_reports_stages_and_requests(self):
+        with mock.patch.object(app.meme.store, 'touch',
+                               return_value=False):
+            self.app.get('/')
+        response = self.app.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'meme_stage_seconds_count{stage="draw"}',
+                      response.data)
+        self.assertIn(b'meme_request_seconds_count{endpoint="meme_rand"',
+                      response.data)
+
+    def test_full_render_pool_rejects_with_retry_after(self):
+        render_pool = mock.Mock()
+        render_pool.call.side_effect = RenderPoolFull('full', 3)
+        with mock.patch.object(app, 'render_pool', render_pool), \
+                mock.patch.object(app.pool, 'get', return_value=None):
+            response = self.app.get('/')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '3')
+        render_pool.call.assert_called_once()
+
     def test_create_route_get_response_code(self):
         response = self.app.get('/create')
         self.assertEqual(response.status_code, 200)
+
+    def test_create_route_reports_unusable_image_url(self):
+        response = self.app.post('/create', data={
+            'image_url': 'http://127.0.0.1:1/dog.jpg',
+            'body': 'Woof', 'author': 'Rex'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Unable to use image', response.data)
+
+    def test_create_route_serves_repeated_meme_from_cache(self):
+        content = ROOT_DIR.joinpath('tests/DogImages/test_image.jpg') \
+            .read_bytes()
+        form = {'image_url': 'http://example.com/dog.jpg',
+                'body': 'Woof', 'author': 'Rex'}
+        with mock.patch.object(app.downloader, 'fetch',
+                               return_value=content), \
+                mock.patch.object(app, 'STABLE_CAPTIONS', True):
+            first = self.app.post('/create', data=form)
+            renders = app.meme.renders
+            second = self.app.post('/create', data=form)
+
+        self.assertIn(b'data:image/', first.data)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(app.meme.renders, renders)
+
+    def test_caption_position_is_stable_only_when_enabled(self):
+        with mock.patch.object(app, 'STABLE_CAPTIONS', False):
+            self.assertIsNone(app.caption_seed('Woof', 'Rex'))
+        with mock.patch.object(app, 'STABLE_CAPTIONS', True):
+            self.assertEqual(app.caption_seed('Woof', 'Rex'),
+                             app.MemeEngine.caption_seed('Woof', 'Rex'))
+
+    def test_resources_are_loaded_by_startup_hook(self):
+        self.app.get('/create')
+        quotes, imgs = app.resources
+        self.assertTrue(imgs)
+
+    def test_reload_swaps_in_new_resources(self):
+        self.app.get('/create')
+        old_quotes, old_imgs = app.resources
+        app.reload_resources({app.IMAGES_DIR: {'added': [],
+                                               'changed': [],
+                                               'removed': []}})
+        quotes, imgs = app.resources
+
+        self.assertIs(quotes, old_quotes)
+        self.assertIsNot(imgs, old_imgs)
+        self.assertEqual(imgs, old_imgs)
+
+    def test_import_does_not_load_resources_or_backends(self):
+        code = ('import sys, app\n'
+                'print(app.resources is None, sorted(m for m in '
+                '("pandas", "docx", "requests") if m in sys.modules))')
+        result = subprocess.run([sys.executable, '-c', code],
+                                capture_output=True, text=True,
+                                cwd=ROOT_DIR)
+        self.assertEqual(result.stdout.strip(), 'True []')
@@ -0,0 +1,116 @@
+import os
+import signal
+import threading
+import time
+import unittest
+
+import metrics
+from serving import RenderPool, RenderPoolFull, rng
+
+
+class Engine():
+    """ A stand-in engine, importable by the worker processes. """
+
+    def pid(self):
+        return os.getpid()
+
+    def staged(self):
+        with metrics.stage('decode'):
+            return 'done'
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+
+def wait_for(condition, timeout=10.0):
+    """ Wait until the condition is true or the timeout passes. """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestRenderPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = RenderPool(Engine, workers=1, queue_size=0,
+                               retry_after=7)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_pool_calls_engine_in_worker_process(self):
+        pid = self.pool.call('pid')
+
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(self.pool.call('pid'), pid)
+        self.assertEqual(self.pool.pending, 0)
+
+    def test_pool_records_worker_stage_timings(self):
+        metrics.registry.start_request()
+        self.assertEqual(self.pool.call('staged'), 'done')
+        timings = metrics.registry.take_timings()
+
+        self.assertEqual(sorted(timings), ['decode', 'render_pool'])
+        self.assertIn('meme_stage_seconds_count{stage="decode"}',
+                      metrics.registry.render())
+
+    def test_full_pool_rejects_at_once(self):
+        self.pool.call('pid')
+        thread = threading.Thread(target=self.pool.call,
+                                  args=('sleep', 1.0))
+        thread.start()
+        wait_for(lambda: self.pool.pending == 1)
+
+        start = time.monotonic()
+        with self.assertRaises(RenderPoolFull) as context:
+            self.pool.call('pid')
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(context.exception.retry_after, 7)
+        self.assertEqual(self.pool.rejected, 1)
+
+        thread.join()
+        self.assertEqual(self.pool.pending, 0)
+        self.assertNotEqual(self.pool.call('pid'), os.getpid())
+
+    def test_background_calls_leave_capacity_for_requests(self):
+        pool = RenderPool(Engine, workers=1, queue_size=1)
+        self.addCleanup(pool.shutdown)
+        self.assertNotEqual(pool.call_idle('pid'), os.getpid())
+
+        thread = threading.Thread(target=pool.call, args=('sleep', 1.0))
+        thread.start()
+        wait_for(lambda: pool.pending == 1)
+
+        self.assertIsNone(pool.call_idle('pid'))
+        self.assertNotEqual(pool.call('pid'), os.getpid())
+        self.assertEqual(pool.rejected, 0)
+        thread.join()
+
+    def test_background_calls_never_take_the_last_slot(self):
+        self.assertIsNone(self.pool.call_idle('pid'))
+        self.assertEqual(self.pool.pending, 0)
+
+    def test_pool_restarts_after_worker_dies(self):
+        pid = self.pool.call('pid')
+        os.kill(pid, signal.SIGKILL)
+
+        with self.assertRaises(RenderPoolFull):
+            self.pool.call('pid')
+        self.assertEqual(self.pool.restarts, 1)
+        self.assertEqual(self.pool.pending, 0)
+        self.assertNotIn(self.pool.call('pid'), (pid, os.getpid()))
+
+    def test_slow_render_times_out(self):
+        self.pool.timeout = 0.1
+        with self.assertRaises(RenderPoolFull):
+            self.pool.call('sleep', 1.0)
+
+    def test_each_thread_has_its_own_random_generator(self):
+        generators = []
+        thread = threading.Thread(target=lambda: generators.append(rng()))
+        thread.start()
+        thread.join()
+
+        self.assertIs(rng(), rng())
+        self.assertIsNot(generators[0], rng())
@@ -0,0 +1,78 @@
+import unittest
+import pathlib
+import os
+import shutil
+import tempfile
+import time
+
+from watcher import DirectoryWatcher
+
+
+class TestDirectoryWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = pathlib.Path(tempfile.mkdtemp())
+        self.changes = []
+        with open(self.tmp_dir.joinpath('kept.txt'), 'w') as f:
+            f.write('Woof - Rex\n')
+        with open(self.tmp_dir.joinpath('removed.txt'), 'w') as f:
+            f.write('Bark - Fido\n')
+        self.watcher = DirectoryWatcher([self.tmp_dir],
+                                        self.changes.append,
+                                        interval=0.05)
+
+    def tearDown(self):
+        self.watcher.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_watcher_reports_nothing_when_unchanged(self):
+        self.assertEqual(self.watcher.check(), {})
+        self.assertEqual(self.changes, [])
+
+    def test_watcher_reports_added_changed_and_removed_files(self):
+        with open(self.tmp_dir.joinpath('added.txt'), 'w') as f:
+            f.write('Growl - Max\n')
+        with open(self.tmp_dir.joinpath('kept.txt'), 'a') as f:
+            f.write('Howl - Rex\n')
+        os.remove(self.tmp_dir.joinpath('removed.txt'))
+
+        self.watcher.check()
+
+        self.assertEqual(self.changes, [{self.tmp_dir: {
+            'added': ['added.txt'],
+            'removed': ['removed.txt'],
+            'changed': ['kept.txt']}}])
+        self.assertEqual(self.watcher.check(), {})
+
+    def test_watcher_retries_changes_after_callback_fails(self):
+        def reload(changes):
+            self.changes.append(changes)
+            if len(self.changes) == 1:
+                raise Exception('Half-written file')
+
+        self.watcher.callback = reload
+        with open(self.tmp_dir.joinpath('added.txt'), 'w') as f:
+            f.write('Growl - Max\n')
+
+        with self.assertRaises(Exception):
+            self.watcher.check()
+        changes = self.watcher.check()
+
+        self.assertEqual(changes[self.tmp_dir]['added'], ['added.txt'])
+        self.assertEqual(len(self.changes), 2)
+        self.assertEqual(self.watcher.check(), {})
+
+    def test_watcher_polls_in_background(self):
+        self.watcher.start()
+        with open(self.tmp_dir.joinpath('added.txt'), 'w') as f:
+            f.write('Growl - Max\n')
+
+        deadline = time.monotonic() + 5
+        while not self.changes and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(list(self.changes[0][self.tmp_dir]['added']),
+                         ['added.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
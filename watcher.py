@@ -0,0 +1,113 @@
+from typing import Callable, Dict, List, Tuple, Union
+import os
+import pathlib
+import threading
+
+# Maps a file name to its (modification time, size).
+Snapshot = Dict[str, Tuple[int, int]]
+# Maps a watched directory to its 'added', 'changed' and 'removed'
+# file names.
+Changes = Dict[pathlib.Path, Dict[str, List[str]]]
+
+
+class DirectoryWatcher():
+    """ Watches directories for added, changed and removed files by
+    polling, comparing snapshots of each file's modification time and
+    size. It needs no OS file notification services.
+
+    When files change, the callback is called with the changes in
+    each directory that changed. Polling runs on a background daemon
+    thread between start() and stop(), or check() can be called
+    directly.
+    """
+
+    def __init__(self,
+                 directories: List[Union[str, pathlib.Path]],
+                 callback: Callable[[Changes], None],
+                 interval: float = 5.0) -> None:
+        """ Construct a new DirectoryWatcher, taking the first snapshot
+        of each directory.
+
+        :param directories: the directories to watch
+        :param callback: called with the changes when files change
+        :param interval: the polling interval in seconds
+        """
+        self.directories = [pathlib.Path(d) for d in directories]
+        self.callback = callback
+        self.interval = interval
+        self.snapshots = {d: self.snapshot(d) for d in self.directories}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def snapshot(directory: pathlib.Path) -> Snapshot:
+        """ Take a snapshot of the files in a directory.
+
+        :param directory: the directory
+        :return: the modification time and size of each file
+        """
+        snapshot = {}
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return snapshot
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    st = entry.stat()
+                    snapshot[entry.name] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                continue
+        return snapshot
+
+    def check(self) -> Changes:
+        """ Compare each directory with its last snapshot, and call
+        the callback if any files were added, changed or removed.
+
+        The new snapshots are only kept once the callback returns, so
+        if it raises, the same changes are reported again by the next
+        check.
+
+        :return: the changes in each directory that changed
+        """
+        changes = {}
+        snapshots = {}
+        for directory in self.directories:
+            old = self.snapshots[directory]
+            new = self.snapshot(directory)
+            diff = {'added': sorted(new.keys() - old.keys()),
+                    'removed': sorted(old.keys() - new.keys()),
+                    'changed': sorted(name for name in new.keys() & old.keys()
+                                      if new[name] != old[name])}
+            if any(diff.values()):
+                changes[directory] = diff
+            snapshots[directory] = new
+
+        if changes:
+            self.callback(changes)
+        self.snapshots.update(snapshots)
+        return changes
+
+    def start(self) -> None:
+        """ Start polling on a background daemon thread. """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='DirectoryWatcher',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """ Stop polling and wait for the background thread to end. """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """ Poll until stopped, reporting but surviving errors. """
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f'Watcher Error:  {e}')